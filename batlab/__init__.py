@@ -1,11 +1,24 @@
+from . import aio
 from . import batlabclass
 from . import batlabutil
 from . import batpool
 from . import channel
 from . import constants
+from . import devicecache
 from . import encoder
 from . import func
+from . import hotplug
+from . import impedance
 from . import logger
 from . import packet
+from . import parser
+from . import rawlog
+from . import reactor
 from . import settings
+from . import shadow
+from . import simulator
+from . import snapshot
+from . import sweep
+from . import thermistor
+from . import transaction
 
@@ -0,0 +1,188 @@
+from batlab.constants import *
+import batlab.batlabclass
+
+import asyncio
+import datetime
+import logging
+import math
+
+class AsyncBatlab:
+    """asyncio front end for one Batlab.
+
+    The register functions are coroutines built on the same transaction engine as ``Batlab``, so many of them can be awaited at once without a thread per call. On event loops that can watch file descriptors, the serial port is read by the event loop itself and the ``Batlab`` receiver thread is stopped. Otherwise the receiver thread keeps reading and completes the futures from there.
+
+    Cancelling a coroutine (for example with ``asyncio.wait_for``) cancels the register transactions it is waiting on, so they are not re-sent.
+
+    Attributes:
+        batlab: The underlying ``Batlab`` instance. Its blocking methods must not be called from the event loop.
+        loop: The event loop the instance is attached to
+        nonblocking: True if the event loop reads the serial port, False if the receiver thread does
+    """
+    def __init__(self,bat,loop=None):
+        self.batlab = bat
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.nonblocking = False
+        self.fd = None
+        self.tick = None
+        if not bat.error:
+            self.attach()
+
+    @classmethod
+    async def connect(cls,port,logger=None,settings=None,window=4):
+        """Opens the Batlab on ``port``. The one-time initialization runs in the default executor so the event loop is not blocked.
+
+        Returns:
+            An ``AsyncBatlab`` instance. Check its ``error`` attribute before use, as with ``Batlab``.
+        """
+        loop = asyncio.get_event_loop()
+        bat = await loop.run_in_executor(None,batlab.batlabclass.Batlab,port,logger,settings,window)
+        return cls(bat,loop)
+
+    @property
+    def sn(self):
+        return self.batlab.sn
+
+    @property
+    def ver(self):
+        return self.batlab.ver
+
+    @property
+    def port(self):
+        return self.batlab.port
+
+    @property
+    def error(self):
+        return self.batlab.error
+
+    def attach(self):
+        """Moves reading of the serial port onto the event loop, if the loop and the port allow it."""
+        if self.batlab.reactor is not None: # a Reactor already reads the port without blocking anyone
+            return False
+        try:
+            fd = self.batlab.ser.fileno()
+        except Exception:
+            return False
+        if not self.batlab.release_reader():
+            return False
+        try:
+            self.loop.add_reader(fd,self._readable)
+        except NotImplementedError: # e.g. the Windows proactor loop - restart the receiver thread instead
+            self.batlab.start_reader()
+            return False
+        self.fd = fd
+        self.nonblocking = True
+        self._tick()
+        return True
+
+    def disconnect(self):
+        """Closes the serial port and fails every outstanding transaction."""
+        self._detach()
+        self.batlab.disconnect()
+        self.batlab._abort()
+
+    def _detach(self):
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            self.fd = None
+        if self.tick is not None:
+            self.tick.cancel()
+            self.tick = None
+
+    def _readable(self):
+        try:
+            data = self.batlab.ser.read(max(1,self.batlab.ser.in_waiting))
+        except Exception:
+            data = b''
+        if not data: # readable but nothing to read - the port went away
+            logging.warning("Batlab on " + str(self.port) + " stopped responding")
+            self._detach()
+            self.batlab._abort()
+            return
+        self.batlab.receive(data)
+
+    def _tick(self):
+        self.batlab.expire()
+        self.tick = self.loop.call_later(self.batlab.timeout / 4,self._tick)
+
+    def _wrap(self,txn):
+        return asyncio.wrap_future(txn,loop=self.loop)
+
+    async def read(self,namespace,addr,cached=True):
+        """Queries a Batlab register. See ``Batlab.read``.
+
+        Returns:
+            A ``packet`` instance containing the read data.
+        """
+        return await self._wrap(self.batlab.read_async(namespace,addr,cached))
+
+    async def read_many(self,regs):
+        """Reads a list of (namespace, addr) registers in one burst. See ``Batlab.read_many``.
+
+        Returns:
+            A list of ``packet`` instances in the same order as ``regs``.
+        """
+        return await asyncio.gather(*[self._wrap(txn) for txn in self.batlab.read_many_async(regs)])
+
+    async def write(self,namespace,addr,value):
+        """Writes the value ``value`` to a Batlab register. See ``Batlab.write``.
+
+        Returns:
+            A 'write' packet.
+        """
+        return await self._wrap(self.batlab.write_async(namespace,addr,value))
+
+    async def write_verify(self,namespace,addr,value):
+        """Writes a register and reads it back, retrying if they do not match. See ``Batlab.write_verify``.
+
+        Returns:
+            Returns True if results match, Returns False if timeout condition occurred
+        """
+        if addr == CURRENT_SETPOINT and namespace < 4:
+            if value > 575:
+                value = 575
+            if value < 0:
+                value = 0
+            await self.write(namespace,addr,0) #If you are going to change the current setpoint, it is best to first set it back to 0
+            await asyncio.sleep(0.01)
+        await self.write(namespace,addr,value)
+        await asyncio.sleep(0.005)
+        tmp = (await self.read(namespace,addr,cached=False)).data
+        ctr = 0
+        while(not (tmp == value)):
+            print(datetime.datetime.now()," - Register Write Error - Retrying",self.sn,namespace,addr,tmp,value)
+            await asyncio.sleep(0.015)
+            await self.write(namespace,addr,value)
+            await asyncio.sleep(0.015)
+            tmp = (await self.read(namespace,addr,cached=False)).data
+            await asyncio.sleep(0.015)
+            ctr += 1
+            if (ctr > 10):
+                print("Unable to Write Register - CRITICAL FAILURE")
+                return False
+        return True
+
+    async def set_current(self,cell,current):
+        """A macro for setting the CURRENT_SETPOINT to a certain current for a given cell."""
+        return await self.write(cell,CURRENT_SETPOINT,int((current/5.0)*640))
+
+    async def charge(self,cell):
+        """A macro for taking a charge measurement. See ``Batlab.charge``."""
+        set,ch,cl,chp = [p.data for p in await self.read_many([(UNIT,SETTINGS),(cell,CHARGEH),(cell,CHARGEL),(cell,CHARGEH)])]
+        if math.isnan(set) or math.isnan(ch) or math.isnan(cl) or math.isnan(chp):
+            return float('nan')
+        if chp == ch:
+            return self.batlab._charge(set,ch,cl)
+        cl = (await self.read(cell,CHARGEL)).data
+        if math.isnan(cl):
+            return float('nan')
+        return self.batlab._charge(set,chp,cl)
+
+    async def impedance(self,cell,settle=2.0):
+        """A macro for taking an impedance measurement on a particular cell. See ``Batlab.impedance_async``. Cancelling the coroutine restores the previous mode of the cell."""
+        return await self._wrap(self.batlab.impedance_async(cell,settle))
+
+    async def impedance_all(self,cells=None,settle=2.0):
+        """A macro for taking an impedance measurement on several cells at once. See ``Batlab.impedance_all``."""
+        if cells is None:
+            cells = [CELL0,CELL1,CELL2,CELL3]
+        return await self._wrap(self.batlab.impedance_async(list(cells),settle))
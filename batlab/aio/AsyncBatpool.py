@@ -0,0 +1,105 @@
+import batlab.batpool
+import batlab.logger
+import batlab.settings
+from .AsyncBatlab import AsyncBatlab
+
+import asyncio
+import collections
+import logging
+
+BatpoolEvent = collections.namedtuple('BatpoolEvent',['kind','port','batlab'])
+BatpoolEvent.__doc__ = """A plug or unplug event from ``AsyncBatpool``. ``kind`` is 'connected' or 'disconnected' and ``batlab`` is the ``AsyncBatlab`` instance."""
+
+class AsyncBatpool:
+    """asyncio counterpart of ``Batpool``. Watches the USB ports for Batlabs and delivers connect and disconnect events as an async iterator.
+
+    Example:
+        async with AsyncBatpool() as pool:
+            async for event in pool:
+                if event.kind == 'connected':
+                    print(await event.batlab.read(UNIT,VCC))
+
+    Attributes:
+        batpool: Dictionary of ``AsyncBatlab`` instances by Serial Port Addresses (e.g. COM5)
+        logger: A Logger object that manages access to a log filename
+        settings: A Settings object that contains test settings imported from a JSON file
+        interval: Seconds between scans of the serial ports
+        ports: Function returning the list of ports to connect to. Defaults to the Batlabs found over USB.
+    """
+    def __init__(self,logger=None,settings=None,interval=0.5,ports=None):
+        self.batpool = dict()
+        self.logger = logger if logger is not None else batlab.logger.Logger()
+        self.settings = settings if settings is not None else batlab.settings.Settings()
+        self.interval = interval
+        self.ports = ports if ports is not None else batlab.batpool.get_ports
+        self.events = None
+        self.task = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self,*exc):
+        await self.quit()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.events is None:
+            self.start()
+        event = await self.events.get()
+        if event is None:
+            self.events.put_nowait(None) # keep later iterations stopped as well
+            raise StopAsyncIteration
+        return event
+
+    def start(self):
+        """Starts scanning the serial ports. Must be called from a running event loop."""
+        if self.task is None:
+            self.events = asyncio.Queue()
+            self.task = asyncio.ensure_future(self._scan())
+
+    async def quit(self):
+        """Stops scanning, disconnects every Batlab and ends the event iteration."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for port in list(self.batpool.keys()):
+            self._remove(port)
+        if self.events is not None:
+            self.events.put_nowait(None)
+        await asyncio.get_event_loop().run_in_executor(None,self.logger.close) # write out the last log lines
+
+    def _remove(self,port):
+        bat = self.batpool.pop(port)
+        bat.disconnect()
+        self.events.put_nowait(BatpoolEvent('disconnected',port,bat))
+
+    async def _connect(self,port):
+        bat = await AsyncBatlab.connect(port,self.logger,self.settings)
+        if bat.error: #something went wrong. try again on the next scan
+            bat.disconnect()
+            logging.warning("AsyncBatpool - Batlab init error on " + str(port))
+            return
+        self.batpool[port] = bat
+        self.events.put_nowait(BatpoolEvent('connected',port,bat))
+
+    async def _scan(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            try:
+                portlist = await loop.run_in_executor(None,self.ports)
+                for port in list(self.batpool.keys()):
+                    if port not in portlist:
+                        self._remove(port)
+                await asyncio.gather(*[self._connect(port) for port in portlist if port not in self.batpool])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception('Exception on AsyncBatpool...Continuing')
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,2 @@
+from .AsyncBatlab import AsyncBatlab
+from .AsyncBatpool import AsyncBatpool, BatpoolEvent
@@ -1,9 +1,17 @@
 from batlab.constants import *
 import batlab.channel
+import batlab.impedance
 import batlab.packet
+import batlab.parser
+import batlab.shadow
+import batlab.snapshot
+import batlab.thermistor
+import batlab.transaction
 
 import serial
-from time import sleep
+from time import sleep, time
+import collections
+import concurrent.futures
 import datetime
 import os
 import re
@@ -27,31 +35,78 @@ class Batlab:
     The class represents one 'Batlab' unit connected over the USB serial port. The batpool class automatically creates the ``batlab`` instances when a Batlab is plugged in, and destroyed once unplugged. If a Batlab instance is supplied with a port name on creation, it will automatically connect to the port. Otherwise, the user will need to call the ``connect`` method.
 
     Attributes:
-        port: Holds serial port name
+        port: Holds serial port name, or a pyserial URL such as ``batlabsim://`` for a simulated Batlab
         is_open: Corresponds to pyserial ``is_open``
         B: List of 'B' temperature calibration constants for each cell
         R: List of 'R' temperature calibration constants for each cell
+        thermistors[4]: ``Thermistor`` lookup tables built from R and B at connect time for each cell
         logger: Logger object that handles file IO
         settings: Settings object that contains test settings loaded from a JSON file
         channel[4]: 4-list of ``Channel`` objects. Each channel can manage a test run on it.
+        window: Maximum number of register transactions allowed in flight on the serial link at once
+        txqueue: ``Scheduler`` holding the transactions waiting for a window slot. Mode changes and watchdog resets go first, then safety measurements, then everything else, then bootloading and calibration writes.
+        timeout: Seconds to wait for a response before a transaction is re-sent
+        retry_count: Number of transaction re-sends since the connection was opened
+        unmatched: Number of response packets that did not belong to any in-flight transaction
+        parser: ``Parser`` that splits the received byte stream into packets. ``parser.dropped`` counts bytes lost to resynchronization.
+        stream[4]: Latest stream packet received for each cell
+        stream_received[4]: Number of stream packets received for each cell
+        stream_lost[4]: Estimated number of stream packets lost for each cell, from gaps in the arrival times
+        stream_period[4]: Running estimate of the seconds between stream packets for each cell
+        reactor: Optional ``Reactor`` that reads the serial port and runs the channel test steps instead of dedicated threads
+        cache: Optional ``DeviceCache`` that remembers the calibration constants by serial number, so reconnecting skips most of the register reads
+        cached: True if the calibration constants of the current connection came from ``cache``
+        watchdog_interval: Seconds between the WATCHDOG_TIMER keep-alive writes. The firmware stops current flow if the watchdog is not reset for about 30 seconds.
+        watchdog_period: Seconds a channel running a test may go without stepping before the keep-alive writes are withheld, so that the firmware watchdog stops a test whose control loop has hung or died
+        shadow: ``Shadow`` of the calibration and configuration registers, which answers repeated reads and skips redundant writes without using the serial link. None if disabled.
     """
-    def __init__(self,port=None,logger=None,settings=None):
+    READ_RETRIES = 50
+    WRITE_RETRIES = 20
+
+    def __init__(self,port=None,logger=None,settings=None,window=4,reactor=None,cache=None,shadow=True):
         self.initialized = False
         self.error = False
         self.sn = ''
         self.ver = ''
         self.port = port
         self.is_open = False
-        self.qstream = queue.Queue() # Queue of stream packets
-        self.qresponse = queue.Queue() # Queue of response packets
+        self.qstream = queue.Queue(256) # Queue of stream packets, oldest dropped when full
+        self.stream = [None,None,None,None] # Latest stream packet for each cell
+        self.stream_received = [0,0,0,0]
+        self.stream_lost = [0,0,0,0]
+        self.stream_period = [None,None,None,None]
+        self.stream_cond = threading.Condition()
         self.killevt = threading.Event()
+        self.readerevt = threading.Event() # Set to hand the serial port over to another reader, e.g. an asyncio event loop
+        self.reader = None
         self.B = [3380,3380,3380,3380]
         self.R = [10000,10000,10000,10000]
+        self.thermistors = [None,None,None,None]
         self.setpoints = [256,256,256,256]
         self.logger = logger
         self.settings = settings
-        self.critical_write = threading.Lock()
-        self.critical_read = threading.Lock()
+        self.window = window
+        self.reactor = reactor
+        self.cache = cache
+        self.cached = False
+        self.shadow = batlab.shadow.Shadow() if shadow else None
+        self.timeout = 0.1
+        self.watchdog_interval = 5.0
+        self.watchdog_period = 30.0
+        self.watchdog_stalled = False # True while keep-alives are withheld because a channel stopped stepping
+        self.watchdog_last = None # time of the last keep-alive, None until connected
+        self.txlock = threading.Lock()
+        self.txqueue = batlab.transaction.Scheduler() # Transactions waiting for a free window slot, by priority class
+        self.inflight = dict() # Deques of in-flight transactions by (namespace, addr, write)
+        self.inflight_count = 0
+        self.retry_count = 0
+        self.unmatched = 0
+        self.impedances = [] # Impedance measurements waiting for their cells to settle
+        self.zlatest = [None,None,None,None] # Latest Impedance measurement of each cell
+        self.latches = 0 # Number of operations that need the measurement registers latched by LOCK
+        self.latch_time = None
+        self.latch_txn = None # LOCK_LOCKED write of the current latch
+        self.latchlock = threading.RLock()
         self.critical_section = threading.Lock()
         self.channel = None
         self.bootloader = False
@@ -62,19 +117,18 @@ class Batlab:
         self.initialized = True
 
     def connect(self):
-        """Connects to serial port in ``port`` variable. Spins off a receiver thread to receive incoming packets and add them to a message queue."""
+        """Connects to serial port in ``port`` variable. Spins off a receiver thread to receive incoming packets and add them to a message queue, or hands the port to ``reactor`` if one was given."""
         try:
-            self.ser = serial.Serial(None,38400,timeout=2,writeTimeout=0)
-            self.ser.port = self.port
+            self.ser = serial.serial_for_url(self.port,38400,timeout=0.05,writeTimeout=0,do_not_open=True) # also accepts pyserial URLs such as batlabsim://
             self.ser.close()
             self.ser.open()
         except:
             logging.warning("Could not connect to port")
             return -1
         self.is_open = self.ser.is_open
-        thread = threading.Thread(target=self.thd_read) #start receiver thread
-        thread.daemon = True
-        thread.start()
+        self.parser = batlab.parser.Parser()
+        if self.reactor is None or not self.reactor.add_batlab(self):
+            self.start_reader()
         #print("batlab:",thread.getName())
         if self.read(0x05,0x01).value() == 257: #then we're not in the bootloader
             # self.write(UNIT,SETTINGS,SET_TRIM_OUTPUT)  -- no longer do this because it is buggy in V3 Firmware.
@@ -83,31 +137,47 @@ class Batlab:
             self.write(CELL1,MODE,MODE_IDLE)
             self.write(CELL2,MODE,MODE_IDLE)
             self.write(CELL3,MODE,MODE_IDLE)
-            self.R[0] = self.read(0x00,0x16).data
-            self.R[1] = self.read(0x01,0x16).data
-            self.R[2] = self.read(0x02,0x16).data
-            self.R[3] = self.read(0x03,0x16).data
-            self.B[0] = self.read(0x00,0x17).data
-            self.B[1] = self.read(0x01,0x17).data
-            self.B[2] = self.read(0x02,0x17).data
-            self.B[3] = self.read(0x03,0x17).data
-            self.setpoints[0] = self.read(0x00,CURRENT_SETPOINT).data
-            self.setpoints[1] = self.read(0x01,CURRENT_SETPOINT).data
-            self.setpoints[2] = self.read(0x02,CURRENT_SETPOINT).data
-            self.setpoints[3] = self.read(0x03,CURRENT_SETPOINT).data
-            a = self.read(0x04,0x00).data
-            b = self.read(0x04,0x01).data
-            self.sn = str(a + b*65536)
+            regs = [(UNIT,SERIAL_NUM),(UNIT,DEVICE_ID),(UNIT,FIRMWARE_VER),(CELL0,TEMP_CALIB_R),(CELL0,TEMP_CALIB_B)]
+            regs += [(cell,CURRENT_SETPOINT) for cell in range(0,4)]
+            if self.cache is None: # no cache to check against - read all of the constants in the same burst
+                regs += [(cell,TEMP_CALIB_R) for cell in range(1,4)] + [(cell,TEMP_CALIB_B) for cell in range(1,4)]
+            data = [p.data for p in self.read_many(regs)]
+            a,b,ver,r0,b0 = data[0:5]
+            self.setpoints = data[5:9]
             if(math.isnan(a) or math.isnan(b)):
                 logging.warning("Serial Number retrieval failed. Trying Again")
-                a = self.read(0x04,0x00).data
-                b = self.read(0x04,0x01).data
-            
-            self.ver = str(self.read(0x04,0x02).data)
-            
+                a = self.read(UNIT,SERIAL_NUM).data
+                b = self.read(UNIT,DEVICE_ID).data
+            self.sn = str(a + b*65536)
+            self.ver = str(ver)
+            self.cached = False
+            if self.cache is None:
+                self.R = [r0] + data[9:12]
+                self.B = [b0] + data[12:15]
+            else:
+                entry = None
+                if not (math.isnan(a) or math.isnan(b)):
+                    entry = self.cache.validate(self.sn,ver,r0,b0)
+                if entry is not None:
+                    self.R = list(entry['R'])
+                    self.B = list(entry['B'])
+                    self.cached = True
+                    if self.shadow is not None:
+                        for cell in range(0,4):
+                            self.shadow.store(cell,TEMP_CALIB_R,self.R[cell])
+                            self.shadow.store(cell,TEMP_CALIB_B,self.B[cell])
+                else:
+                    data = [p.data for p in self.read_many([(cell,TEMP_CALIB_R) for cell in range(1,4)] + [(cell,TEMP_CALIB_B) for cell in range(1,4)])]
+                    self.R = [r0] + data[0:3]
+                    self.B = [b0] + data[3:6]
+                    if not [x for x in self.R + self.B + [ver,a,b] if math.isnan(x)]:
+                        self.cache.put(self.sn,ver,self.R,self.B)
+            self.thermistors = [batlab.thermistor.table(self.R[cell],self.B[cell]) for cell in range(0,4)] # build the temperature tables now rather than on the first sample
+
             if int(self.ver) > 3:
                 self.write_verify(UNIT,SETTINGS,SET_WATCHDOG_TIMER) #this setting is only meaningful if the firmware version is 4 or greater.
                 self.write(UNIT,WATCHDOG_TIMER,WDT_RESET)
+            self.watchdog_last = time() # from now on ``expire`` keeps the watchdog happy
                 
         else:
             logging.info("The Batlab is in the bootloader")
@@ -120,6 +190,8 @@ class Batlab:
             for ch in self.channel:
                 ch.killevt.set()
         self.killevt.set()
+        if self.reactor is not None:
+            self.reactor.remove_batlab(self)
         self.ser.close()
 
     def set_port(self,port):
@@ -130,79 +202,87 @@ class Batlab:
         except:
             return 0
 
-    def read(self,namespace,addr):
+    def read(self,namespace,addr,timeout=None,cached=True,priority=None):
         """Queries a Batlab register specified by the given namespace and register address. The communication architecture spec with all of the namespace and register names, functions, and values can be found in the Batlab Programmer's User Manual.
 
+        Args:
+            timeout: Optional number of seconds to wait before giving up. By default the call returns once the transaction engine has answered or exhausted its retries.
+            cached: If False, always read the register from the Batlab instead of answering from ``shadow``
+            priority: Optional priority class (``PRIO_CONTROL`` ... ``PRIO_BULK``) to override the default for this register
+
         Returns:
             A ``packet`` instance containing the read data.
         """
-        q = batlab.packet.Packet()
+        return self._result(self.read_async(namespace,addr,cached,priority),timeout)
+
+    def read_async(self,namespace,addr,cached=True,priority=None):
+        """Queues a register read without waiting for it.
+
+        Returns:
+            A ``Transaction`` future whose result is the ``packet`` containing the read data.
+        """
+        txn = self._read_txn(namespace,addr,cached,priority)
+        if not txn.done():
+            self._submit(txn)
+        return txn
+
+    def read_many(self,regs,timeout=None):
+        """Reads a list of registers in one burst. All of the request frames are queued at once, so they go out in as few serial writes as the transaction window allows instead of one round-trip per register.
+
+        Args:
+            regs: List of (namespace, addr) tuples
+            timeout: Optional number of seconds to wait for the whole batch
+
+        Returns:
+            A list of ``packet`` instances in the same order as ``regs``. A register that could not be read gets an invalid packet with NaN data without affecting the others.
+        """
+        deadline = None if timeout is None else time() + timeout
+        return [self._result(txn,None if deadline is None else max(0,deadline - time())) for txn in self.read_many_async(regs)]
+
+    def read_many_async(self,regs,priority=None):
+        """Queues reads of a list of (namespace, addr) registers without waiting for them.
+
+        Returns:
+            A list of ``Transaction`` futures in the same order as ``regs``.
+        """
+        txns = [self._read_txn(namespace,addr,priority=priority) for (namespace,addr) in regs]
+        self._submit(*[txn for txn in txns if not txn.done()])
+        return txns
+
+    def _read_txn(self,namespace,addr,cached=True,priority=None):
+        txn = batlab.transaction.Transaction(namespace,addr,retries=self.READ_RETRIES,priority=priority)
         if not (namespace in NAMESPACE_LIST):
             print("Namespace Invalid")
-            q.valid = False
-            q.data = float('nan')
-            return q
-        if (not namespace == 0x05) and self.bootloader == True:
+            txn.complete(self._failpacket(txn))
+        elif (not namespace == 0x05) and self.bootloader == True:
             print("Reg Read not vaild when Batlab is in Bootloader")
-            q.valid = False
-            q.data = float('nan')
-            return q
-        try:
-            with self.critical_read:
-                outctr = 0
-                exceptctr = 0
-                while(self.ser.is_open):
-                    try:
-                        self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                        self.ser.write(namespace.to_bytes(1,byteorder='big'))
-                        self.ser.write(addr.to_bytes(1,byteorder='big'))
-                        self.ser.write((0x00).to_bytes(1,byteorder='big'))
-                        self.ser.write((0x00).to_bytes(1,byteorder='big'))
-                        self.ser.flush()
-                        ctr = 0
-                        while(self.qresponse.qsize() == 0 and ctr < 50):
-                            sleep(0.001)
-                            ctr = ctr + 1
-                        while(self.qresponse.qsize() > 0):
-                            q = self.qresponse.get()
-                        if( (q.addr == addr and q.namespace == namespace) ): #or outctr > 20 ):
-                            return q
-                        if outctr > 50:
-                            print("<<thdBatlab:read fail - flushing write buffer with packet start code")
-                            self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                            self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                            self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                            self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                            self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                            q.valid = False
-                            q.data = float('nan')
-                            return q
-                        outctr = outctr + 1
-                    except:
-                        if exceptctr > 20:
-                            #print('Exception on Batlab read...Continuing')
-                            #traceback.print_exc()
-                            break
-                        exceptctr += 1
-                        sleep(0.005)
-                        continue
-                q.valid = False
-                q.data = float('nan')
-                return q
-        except:
-            q.valid = False
-            q.data = float('nan')
-            return q
+            txn.complete(self._failpacket(txn))
+        elif cached and self.shadow is not None:
+            p = self.shadow.get(namespace,addr)
+            if p is not None: # answered locally
+                txn.complete(p)
+        return txn
 
-    def write(self,namespace,addr,value):
+    def write(self,namespace,addr,value,timeout=None,priority=None):
         """Writes the value ``value`` to the register address ``addr`` in namespace ``namespace``. This is the general register write function for the Batlab.
 
+        Args:
+            timeout: Optional number of seconds to wait before giving up. By default the call returns once the transaction engine has answered or exhausted its retries.
+            priority: Optional priority class (``PRIO_CONTROL`` ... ``PRIO_BULK``) to override the default for this register
+
         Returns:
             A 'write' packet.
         """
-        failresponse = batlab.packet.Packet()
-        failresponse.valid = False
-        failresponse.data = float('nan')
+        return self._result(self.write_async(namespace,addr,value,priority),timeout)
+
+    def write_async(self,namespace,addr,value,priority=None):
+        """Queues a register write without waiting for it.
+
+        Returns:
+            A ``Transaction`` future whose result is the 'write' packet.
+        """
+        failresponse = batlab.transaction.Transaction(namespace,addr,write=True)
+        failresponse.complete(self._failpacket(failresponse))
         if not (namespace in NAMESPACE_LIST):
             print("Namespace Invalid")
             return failresponse
@@ -228,49 +308,124 @@ class Batlab:
         # make sure we cant turn on the current compensation control loop in firmware
         if addr == SETTINGS and namespace == UNIT:
             value &= ~0x0003
+        if self.shadow is not None:
+            if self.shadow.holds(namespace,addr,value): # the register already holds the value - skip the round trip
+                txn = batlab.transaction.Transaction(namespace,addr,value,write=True)
+                txn.complete(self.shadow.get(namespace,addr,write=True))
+                return txn
+            self.shadow.invalidate(namespace,addr) # unknown until the Batlab echoes the write back
+        txn = batlab.transaction.Transaction(namespace,addr,value,write=True,retries=self.WRITE_RETRIES,priority=priority)
+        self._submit(txn)
+        return txn
 
+    # Transaction engine - keeps up to ``window`` requests in flight on the serial link.
+    # Futures are always completed after ``txlock`` is released so that done-callbacks may submit new transactions.
+    def _result(self,txn,timeout):
         try:
-            with self.critical_write:
-                q = None
-                outctr = 0
-                exceptctr = 0
-                namespace = int(namespace)
-                addr = int(addr)
-                value = int(value)
-                while(self.ser.is_open):
-                    try:
-                        self.ser.write((0xAA).to_bytes(1,byteorder='big'))
-                        self.ser.write(namespace.to_bytes(1,byteorder='big'))
-                        self.ser.write((addr | 0x80).to_bytes(1,byteorder='big'))
-                        self.ser.write(value.to_bytes(2, byteorder='little',signed=True))
-                        self.ser.flush()
-                        ctr = 0
-                        while(self.qresponse.qsize() == 0 and ctr < 50):
-                            sleep(0.001)
-                            ctr = ctr + 1
-                        while(self.qresponse.qsize() > 0):
-                            q = self.qresponse.get()
-                        if( q.addr == addr and q.namespace == namespace ):
-                            return q
-                        if( outctr > 20 ):
-                            q.valid = False
-                            q.data = float('nan')
-                            return q
-                        outctr = outctr + 1
-                    except:
-                        if exceptctr > 20:
-                            #print('Exception on Batlab write...Continuing')
-                            #traceback.print_exc()
-                            break
-                        exceptctr += 1
-                        sleep(0.005)
+            return txn.result(timeout)
+        except concurrent.futures.TimeoutError:
+            txn.cancel()
+            return self._failpacket(txn)
+
+    def _failpacket(self,txn):
+        return batlab.packet.ResponsePacket(txn.namespace,txn.addr,float('nan'),txn.write,valid=False)
+
+    def _submit(self,*txns):
+        with self.txlock:
+            if not (self.killevt.is_set() or not self.ser.is_open):
+                self.txqueue.extend(txns)
+                self._pump()
+                return
+        for txn in txns:
+            txn.complete(self._failpacket(txn))
+
+    def _pump(self):
+        """Sends queued transactions while there are free slots in the window. Caller must hold ``txlock``."""
+        frames = []
+        now = time()
+        while True:
+            txn = self.txqueue.pop(self.inflight_count,self.window,self.inflight) # one write per register in flight
+            if txn is None:
+                break
+            if txn.cancelled():
+                continue
+            txn.deadline = now + self.timeout
+            self.inflight.setdefault(txn.key,collections.deque()).append(txn)
+            self.inflight_count += 1
+            frames.append(txn.frame())
+        if frames:
+            try:
+                self.ser.write(b''.join(frames))
+            except:
+                pass # the frames stay in flight; they time out and get re-sent by _expire
+
+    def _complete(self,p):
+        """Hands a response packet to the oldest in-flight transaction with a matching (namespace, addr, write) key.
+
+        Only one write per register is in flight at a time, and the Batlab echoes the value it was sent. A write echo with some other value is a late answer to an earlier write of the register (or a garbled frame) and is dropped, so it cannot complete the newer write before the Batlab has seen it.
+        """
+        with self.txlock:
+            key = (p.namespace,p.addr,p.write == True)
+            pending = self.inflight.get(key)
+            if not pending or (p.write and p.data != COMMAND_ERROR and p.data != pending[0].value & 0xFFFF):
+                self.unmatched += 1
+                return
+            txn = pending.popleft()
+            if not pending:
+                del self.inflight[key]
+            self.inflight_count -= 1
+            self._pump()
+        if self.shadow is not None:
+            self.shadow.update(p,txn.value if txn.write else None)
+        txn.complete(p)
+
+    def _expire(self):
+        """Re-sends in-flight transactions whose response is overdue, and fails the ones that are out of retries."""
+        failed = []
+        with self.txlock:
+            if self.inflight_count == 0:
+                return
+            now = time()
+            resend = []
+            for key in list(self.inflight.keys()):
+                pending = self.inflight[key]
+                while pending and pending[0].deadline <= now:
+                    txn = pending.popleft()
+                    self.inflight_count -= 1
+                    txn.attempts += 1
+                    if txn.cancelled():
                         continue
-                q.valid = False
-                q.data = float('nan')
-                return q
-        except:
-            return failresponse
-            
+                    if txn.attempts <= txn.retries and self.ser.is_open and not self.killevt.is_set():
+                        self.retry_count += 1
+                        resend.append(txn)
+                    else:
+                        failed.append(txn)
+                if not pending:
+                    del self.inflight[key]
+            if [txn for txn in failed if not txn.write]:
+                print("<<thdBatlab:read fail - flushing write buffer with packet start code")
+                try:
+                    self.ser.write(bytes([0xAA] * 5))
+                except:
+                    pass
+            self.txqueue.requeue(resend)
+            self._pump()
+        for txn in failed:
+            txn.complete(self._failpacket(txn))
+
+    def _abort(self):
+        """Fails every queued and in-flight transaction. Used when the receiver thread stops."""
+        with self.txlock:
+            failed = list(self.txqueue)
+            for pending in self.inflight.values():
+                failed.extend(pending)
+            self.inflight.clear()
+            self.inflight_count = 0
+            self.txqueue.clear()
+        for txn in failed:
+            txn.complete(self._failpacket(txn))
+        self._collect_impedances(True) # their register accesses fail right away, which finishes the handles
+
     def write_verify(self,namespace,addr,value):
         """Writes the value ``value`` to the register address ``addr`` in namespace ``namespace``. Reads the register back and compares the result, Retries if they do not match.
 
@@ -291,7 +446,7 @@ class Batlab:
         self.write(namespace,addr,value)  
         sleep(0.005)        
         
-        tmp = self.read(namespace,addr).data
+        tmp = self.read(namespace,addr,cached=False).data
         ctr = 0
         while(not (tmp == value)):
             print(datetime.datetime.now()," - Register Write Error - Retrying",self.sn,namespace,addr,tmp,value)
@@ -299,7 +454,7 @@ class Batlab:
             sleep(0.015)
             self.write(namespace,addr,value)
             sleep(0.015)
-            tmp = self.read(namespace,addr).data
+            tmp = self.read(namespace,addr,cached=False).data
             sleep(0.015)
             ctr += 1
             if (ctr > 10):
@@ -307,13 +462,51 @@ class Batlab:
                 return False
         return True
 
-    def get_stream(self):
-        """Retrieve stream packet from queue."""
+    def get_stream(self,cell=None):
+        """Retrieve stream packet from queue. If ``cell`` is given, returns the latest stream packet for that cell instead, without consuming it."""
+        if cell is not None:
+            return self.stream[cell]
         q = None
         while self.qstream.qsize() > 0:
             q = self.qstream.get()
         return q
 
+    def wait_stream(self,cell,count,timeout):
+        """Blocks until more than ``count`` stream packets have been received for ``cell``, or ``timeout`` seconds pass.
+
+        Returns:
+            The number of stream packets received for the cell so far.
+        """
+        with self.stream_cond:
+            self.stream_cond.wait_for(lambda: self.stream_received[cell] > count,timeout)
+            return self.stream_received[cell]
+
+    def _stream(self,p):
+        """Files a stream packet under its cell and keeps the loss statistics."""
+        cell = p.namespace
+        last = self.stream[cell]
+        if last is not None:
+            gap = p.timestamp - last.timestamp
+            period = self.stream_period[cell]
+            if period is not None and gap > 1.5 * period:
+                self.stream_lost[cell] += int(round(gap / period)) - 1
+            elif gap > 0: # packets parsed from the same chunk share a timestamp and say nothing about the period
+                self.stream_period[cell] = gap if period is None else period + (gap - period) / 8.0
+        with self.stream_cond:
+            self.stream[cell] = p
+            self.stream_received[cell] += 1
+            self.stream_cond.notify_all()
+        if self.reactor is not None:
+            self.reactor.stream_arrived(self,cell)
+        try:
+            self.qstream.put_nowait(p) #Add the packet to the queue
+        except queue.Full:
+            try:
+                self.qstream.get_nowait()
+            except queue.Empty:
+                pass
+            self.qstream.put_nowait(p)
+
     # Macros
     def set_current(self,cell,current):
         """A macro for setting the CURRENT_SETPOINT to a certain current for a given cell."""
@@ -328,51 +521,137 @@ class Batlab:
         return self.read(0x04,0x02).data
     
     def impedance(self,cell):
-        """A macro for taking an impedance measurement on a particular cell."""
-        mode = self.read(cell,MODE).data #get previous state
-        # start impedance measurment
-        self.write(cell,MODE,MODE_IMPEDANCE)
-        sleep(2)
-        # collect results
-        self.write(UNIT,LOCK,LOCK_LOCKED)
-        imag = self.read(cell,CURRENT_PP).ascurrent()
-        vmag = self.read(cell,VOLTAGE_PP).asvoltage()
-        self.write(UNIT,LOCK,LOCK_UNLOCKED)
-        
-        if mode == MODE_DISCHARGE or mode == MODE_CHARGE or mode == MODE_IDLE or mode == MODE_IMPEDANCE or mode == MODE_STOPPED or mode == MODE_NO_CELL or mode == MODE_BACKWARDS:
-            self.write(cell,MODE,mode) #restore previous state
-            nowmode = self.read(cell,MODE)
-            while nowmode == MODE_IMPEDANCE and mode != MODE_IMPEDANCE:
-                self.write(cell,MODE,mode) #restore previous state
-                nowmode = self.read(cell,MODE)
-        z = 0.0   
+        """A macro for taking an impedance measurement on a particular cell. Blocks for about 2 seconds while the cell settles; see ``impedance_async`` for a version that does not."""
+        return self.impedance_async(cell).result()
+
+    def impedance_all(self,cells=None):
+        """A macro for taking an impedance measurement on several cells at once. All of the cells settle together and are latched under a single LOCK, so this takes about as long as ``impedance`` on one cell.
+
+        Args:
+            cells: List of cells to measure. Defaults to all four.
+
+        Returns:
+            A list of impedances in Ohms in the order of ``cells``, NaN for cells that could not be measured.
+        """
+        if cells is None:
+            cells = [CELL0,CELL1,CELL2,CELL3]
+        return self.impedance_async(list(cells)).result()
+
+    def impedance_async(self,cells,settle=2.0):
+        """Starts an impedance measurement on a particular cell, or a list of cells, without waiting for it.
+
+        The cells are switched to MODE_IMPEDANCE and left to settle for ``settle`` seconds, after which ``expire`` reads the results and restores the previous modes. Other register traffic keeps flowing in the meantime.
+
+        Returns:
+            An ``Impedance`` handle, a ``concurrent.futures.Future`` whose result is the impedance in Ohms (NaN on failure), or a list of them if ``cells`` is a list.
+        """
+        return batlab.impedance.Impedance(self,cells,settle).start()
+
+    def _wait_impedance(self,z):
+        with self.txlock:
+            self.impedances.append(z)
+
+    def _collect_impedances(self,everything=False):
+        """Collects the results of the impedance measurements whose cells have settled, or of all of them."""
+        with self.txlock:
+            if not self.impedances:
+                return
+            due = [z for z in self.impedances if everything or z.ready() or z.done()]
+            self.impedances = [z for z in self.impedances if z not in due]
+        for z in due:
+            z.collect()
+
+    def _impedance(self,vmag,imag):
         if math.isnan(imag) or math.isnan(vmag):
-            z = float('nan')
-        elif imag < 0.000001:
-            z = 0
-        else:
-            z = vmag / imag
+            return float('nan')
+        if imag < 0.000001:
+            return 0
+        return vmag / imag
 
-        return z
-    
     def charge(self,cell):
         """A macro for taking a charge measurement that handles the case if the charge register rolls over in between high and low reads"""
-        set = self.read(UNIT,SETTINGS).data
+        set,counts = self.charge_counts(cell)
+        if math.isnan(counts):
+            return float('nan')
+        return self._charge(set,counts >> 16,counts & 0xFFFF)
+
+    def charge_counts(self,cell):
+        """Reads the raw charge counter of a cell, handling rollover between the high and low reads like ``charge``.
+
+        Returns:
+            Tuple of the UNIT SETTINGS register, which sets the resolution of the counter, and the counter value CHARGEH * 65536 + CHARGEL. Both are NaN if a read failed.
+        """
+        set,ch,cl,chp = [p.data for p in self.read_many([(UNIT,SETTINGS),(cell,CHARGEH),(cell,CHARGEL),(cell,CHARGEH)])]
+        if math.isnan(set) or math.isnan(ch) or math.isnan(cl) or math.isnan(chp):
+            return (float('nan'),float('nan'))
+        if chp != ch:
+            cl = self.read(cell,CHARGEL).data
+            if math.isnan(cl):
+                return (float('nan'),float('nan'))
+        return (set,(chp << 16) + cl)
+
+    def _charge(self,settings,chargeh,chargel):
         multiplier = 6.0
-        if not (set & SET_CH0_HI_RES == 0):
+        if not (settings & SET_CH0_HI_RES == 0):
             multiplier = 1.0
-        ch = self.read(cell,CHARGEH).data
-        cl = self.read(cell,CHARGEL).data
-        chp = self.read(cell,CHARGEH).data
-        if math.isnan(ch) or math.isnan(cl) or math.isnan(chp):
-            return float('nan')
-        if chp == ch:
-            data = (ch << 16) + cl
-            return ((multiplier * data / 2**15 ) * 4.096 / 9.765625)
-        cl = self.read(cell,CHARGEL).data
-        data = (chp << 16) + cl
+        data = (chargeh << 16) + chargel
         return ((multiplier * data / 2**15 ) * 4.096 / 9.765625)
 
+    def snapshot(self,cells=None,timeout=None):
+        """Reads every measurement register of the requested cells as one coherent sample.
+
+        The unit is latched with LOCK, the registers of all of the cells are read in a single pipelined burst, and the unit is unlocked again. All of the values, including the two halves of the charge counter, come from the same instant, so no re-reads are needed to handle charge rollover.
+
+        Args:
+            cells: List of cells to read. Defaults to all four.
+            timeout: Optional number of seconds to wait for each register before giving up
+
+        Returns:
+            A ``Snapshot`` record. Values that could not be read are NaN.
+        """
+        if cells is None:
+            cells = [CELL0,CELL1,CELL2,CELL3]
+        regs = [(UNIT,VCC),(UNIT,SETTINGS)] + [(cell,reg) for cell in cells for reg in batlab.snapshot.SNAPSHOT_REGS]
+        latch = self._latch()
+        try:
+            ts = self.latch_time
+            self._result(latch,timeout) # the reads must not overtake the LOCK write
+            packets = [self._result(txn,timeout) for txn in self.read_many_async(regs,PRIO_SAFETY)]
+        finally:
+            self._unlatch()
+        vcc = packets[0].asvcc() if packets[0].valid else float('nan')
+        settings = packets[1].data
+        records = []
+        for n,cell in enumerate(cells):
+            mode,err,status,v,i,t,ch,cl,dty = packets[2 + n * len(batlab.snapshot.SNAPSHOT_REGS):2 + (n + 1) * len(batlab.snapshot.SNAPSHOT_REGS)]
+            if math.isnan(settings) or math.isnan(ch.data) or math.isnan(cl.data):
+                q = float('nan')
+            else:
+                q = self._charge(settings,ch.data,cl.data)
+            records.append(batlab.snapshot.CellSnapshot(cell,mode.data,err.data,status.data,v.asvoltage(),i.ascurrent(),t.astemperature_c(self.R,self.B),q,dty.data))
+        return batlab.snapshot.Snapshot(ts,self.sn,vcc,tuple(records))
+
+    def _latch(self):
+        """Latches the measurement registers with LOCK. Operations that overlap share one LOCK, which is released by the last ``_unlatch``.
+
+        The LOCK writes go out at ``PRIO_SAFETY``. A LOCK_LOCKED write can still be held behind the LOCK_UNLOCKED write of the previous latch, which the reads of other registers are not, so the reads of latched registers must only be queued once the returned write is done.
+
+        Returns:
+            The ``Transaction`` of the LOCK_LOCKED write, shared by the overlapping operations.
+        """
+        with self.latchlock:
+            self.latches += 1
+            if self.latches == 1:
+                self.latch_time = time()
+                self.latch_txn = self.write_async(UNIT,LOCK,LOCK_LOCKED,PRIO_SAFETY)
+            return self.latch_txn
+
+    def _unlatch(self):
+        with self.latchlock:
+            self.latches -= 1
+            if self.latches == 0:
+                self.write_async(UNIT,LOCK,LOCK_UNLOCKED,PRIO_SAFETY)
+
     def firmware_bootload(self,filename):
         """Writes the firmware image given by the specified filename to the Batlab. This may take a few minutes."""
         # Check to make sure image is at least the right size
@@ -389,6 +668,8 @@ class Batlab:
         print("Entering Bootloader")
         self.write(UNIT,BOOTLOAD,0x0000)
         self.bootloader = True
+        if self.shadow is not None:
+            self.shadow.clear() # the registers come back from the new firmware
         sleep(2)
         # load the image onto the batlab
         with open(filename, "rb") as f:
@@ -473,7 +754,8 @@ class Batlab:
             print("File was missing or otherwise could not be read")
             return False
         valctr = 0
-        
+        if self.cache is not None:
+            self.cache.forget(self.sn)
         
         
         #write the serial number
@@ -516,55 +798,76 @@ class Batlab:
         valctr += 1
 
 
-    # Reading thread - parses incoming packets and adds them to queues
+    def start_reader(self):
+        """Spins off the receiver thread that reads the serial port."""
+        self.readerevt.clear()
+        self.reader = threading.Thread(target=self.thd_read) #start receiver thread
+        self.reader.daemon = True
+        self.reader.start()
+
+    def release_reader(self):
+        """Stops the receiver thread without failing any transactions, so that another reader can take over the serial port. The new reader must pass received bytes to ``receive`` and call ``expire`` periodically.
+
+        Returns:
+            True if the receiver thread stopped.
+        """
+        self.readerevt.set()
+        if self.reader is not None and self.reader is not threading.current_thread():
+            self.reader.join(1.0)
+            return not self.reader.is_alive()
+        return True
+
+    def receive(self,data):
+        """Parses received bytes and hands the packets to the transaction engine or the stream queue."""
+        verbose = logging.getLogger().isEnabledFor(logging.INFO)
+        for p in self.parser.feed(data):
+            if verbose:
+                p.print_packet()
+            if p.type == 'RESPONSE':
+                self._complete(p) #Hand the packet to the transaction waiting for it
+            else:
+                self._stream(p)
+
+    def expire(self):
+        """Re-sends overdue transactions, collects settled impedance measurements and sends the watchdog keep-alive when it is due. Must be called at least every ``timeout`` seconds by whoever is reading the serial port.
+
+        The keep-alive is only sent while every channel running a test has stepped within ``watchdog_period`` seconds (see ``channels_alive``). If a test loop hangs or dies, the firmware watchdog runs out and stops the current flow.
+        """
+        self._expire()
+        self._collect_impedances()
+        if self.watchdog_last is not None and time() - self.watchdog_last >= self.watchdog_interval and not self.bootloader:
+            if not self.channels_alive():
+                if not self.watchdog_stalled:
+                    print("Warning: a test on Batlab",self.sn,"stopped responding - no longer resetting the watchdog timer")
+                self.watchdog_stalled = True
+                return
+            self.watchdog_stalled = False
+            self.watchdog_last = time()
+            self.write_async(UNIT,WATCHDOG_TIMER,WDT_RESET) #If firmware version is < 3, this command will not do anything
+
+    def channels_alive(self):
+        """True if every channel running a test has run its test step within the last ``watchdog_period`` seconds."""
+        if self.channel is None:
+            return True
+        now = time()
+        for ch in self.channel:
+            if ch.test_state != TS_IDLE and now - ch.heartbeat > self.watchdog_period:
+                return False
+        return True
+
+    # Reading thread - reads the serial port and feeds the received bytes to ``receive``
     def thd_read(self):
         while True:
+            if self.readerevt.is_set(): #another reader has taken over the serial port
+                return
             if self.killevt.is_set(): #stop the thread if the batlab object goes out of scope
+                self._abort()
                 return
-            val = None
             try:
-                val = self.ser.read()
+                data = self.ser.read(max(1,self.ser.in_waiting)) # block for one byte at most, then take whatever is buffered
             except:
+                self._abort()
                 return
-            if(val):
-                inbuf = []
-                ctr = 0
-                byte = ord(val)
-                if(byte == 0xAA): #Command Response Byte 1: 0xAA
-                    while (len(inbuf) < 4 and ctr < 20):
-                        for b in self.ser.read():
-                            inbuf.append(b)
-                        ctr = ctr + 1
-                    if ctr == 20:
-                        continue
-                    p = batlab.packet.Packet()
-                    p.timestamp = datetime.datetime.now()
-                    p.type = 'RESPONSE'
-                    p.namespace = inbuf[0]
-                    if((inbuf[1] & 0x80)): #Command Response Byte 3:  w/~r + addr
-                        p.write = True
-                    p.addr = inbuf[1] & 0x7F
-                    p.data = inbuf[2] + inbuf[3]*256 #data payload
-                    self.qresponse.put(p) #Add the packet to the queue
-                    p.print_packet()
-                elif(byte == 0xAF): #stream packet Byte 1: 0xAF
-                    while len(inbuf) < 12 and ctr < 20:
-                        for b in self.ser.read():
-                            inbuf.append(b)
-                        ctr = ctr + 1
-                    if ctr == 20:
-                        continue
-                    p = batlab.packet.Packet()
-                    p.timestamp = datetime.datetime.now()
-                    p.namespace = inbuf[0]
-                    if(inbuf[1] == 0):
-                        p.type = 'STREAM'
-                        p.mode = inbuf[2] + inbuf[3] * 256
-                        p.status = inbuf[4] + inbuf[5] * 256
-                        p.temp = inbuf[6] + inbuf[7] * 256
-                        p.current = inbuf[8] + inbuf[9] * 256
-                        p.voltage = inbuf[10] + inbuf[11] * 256
-                    self.qstream.put(p) #Add the packet to the queue
-                    p.print_packet()
-                else:
-                    logging.warning("<<thdBatlab:Packet Loss Detected>>")
+            self.expire()
+            if data:
+                self.receive(data)
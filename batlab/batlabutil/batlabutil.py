@@ -5,6 +5,8 @@ import logging
 import batlab.batpool
 import batlab.func
 import batlab.encoder
+import batlab.logger
+import batlab.rawlog
 from batlab.constants import *
 import threading
 
@@ -116,10 +118,11 @@ def batlab_parse_cmd(cmd,bp):
                 fhandle.seek(0) #reset cursor back to beginning of file
                 print('Results File will be written to testResults/',bp.settings.logfile)
                 # Print the Header to the CSV file dictated by this settings file
-                logfile_headerstr = '"' + fhandle.read().replace('"','""') + '"' + ',,,,,,,,,,,,,,,,,,,'
-                bp.logger.log(logfile_headerstr,bp.settings.logfile)
-                logfile_headerstr = "Cell Name,Batlab SN,Channel,Timestamp (s),Voltage (V),Current (A),Temperature (C),Impedance (Ohm),Energy (J),Charge (Coulombs),Test State,Test Type,Charge Capacity (Coulombs),Energy Capacity (J),Avg Impedance (Ohm),delta Temperature (C),Avg Current (A),Avg Voltage,Runtime (s),VCC (V)"
+                logfile_headerstr = '"' + fhandle.read().replace('"','""') + '"' + ',' * (len(batlab.logger.LOG_SCHEMA) - 1)
                 bp.logger.log(logfile_headerstr,bp.settings.logfile)
+                bp.logger.log(batlab.logger.LOG_HEADER,bp.settings.logfile)
+                if bp.settings.raw_logging:
+                    bp.logger.log(batlab.rawlog.RAW_HEADER,bp.settings.raw_logfile)
 
     if p[0] == 'view' and len(p) > 1:
         if p[1] == 'settings':
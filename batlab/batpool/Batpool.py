@@ -1,7 +1,8 @@
 import threading
 import logging
 import serial.tools.list_ports
-from time import sleep
+from time import sleep, time
+import concurrent.futures
 
 try:
     # Python 2.x
@@ -13,8 +14,22 @@ except ImportError:
 import batlab.logger
 import batlab.settings
 import batlab.batlabclass
+import batlab.devicecache
+import batlab.hotplug
 import traceback
 
+def get_ports():
+    """Returns the serial port names of the Batlabs plugged in over USB."""
+    portinfos = serial.tools.list_ports.comports()
+    ports = []
+    for portinfo in portinfos:
+        logging.info(portinfo)
+        logging.info(portinfo.device + ' ' + str(portinfo.vid) + ' ' + str(portinfo.pid))
+        if(portinfo.vid == 0x04D8 and portinfo.pid == 0x000A):
+            logging.info("found Batlab on "+portinfo.device)
+            ports.append(portinfo.device)
+    return ports
+
 # Manage a pool of connected batlabs by maintaining a list of plugged-in systems
 class Batpool:
     """Manage a pool of connected batlabs by maintaining a list of plugged-in systems.
@@ -29,51 +44,129 @@ class Batpool:
         batactive: Serial port of active Batlab
         logger: A Logger object that manages access to a log filename
         settings: A Settings object that contains test settings imported from a JSON file
+        reactor: Optional ``Reactor`` that drives all of the Batlabs from one thread instead of a receiver thread and four channel threads each
+        hotplug: ``Hotplug`` listener that wakes the manager thread when a Batlab is plugged in or unplugged, or None to poll the serial ports every ``poll_interval`` seconds
+        poll_interval: Seconds between scans of the serial ports when kernel hotplug events are not available
+        rescan_interval: Seconds between scans of the serial ports when hotplug events are available, in case an event was missed
+        initpool: Bounded pool of worker threads that initialize newly found Batlabs concurrently
+        initializing: Dictionary of pending initialization futures by Serial Port Addresses
+        init_timeout: Seconds to wait for newly found Batlabs before reporting the pool ready without the ones that hang
+        new_ports: Serial Port Addresses of the newly found Batlabs that the next 'Batpool ready' message reports on
+        new_time: Time the first of ``new_ports`` was found
+        ready_time: Seconds it took to bring the last group of newly found Batlabs online
+        cache: ``DeviceCache`` shared by the Batlabs in the pool, so units that re-enumerate or come back after a restart reconnect quickly. Off unless one is passed in, or True for a ``DeviceCache`` in the default location.
     """
-    def __init__(self):
+    def __init__(self,reactor=None,hotplug=True,init_workers=8,cache=None):
         self.msgqueue = queue.Queue()
         self.batpool = dict()
         self.batlocks = dict()
         self.batactive = ''
+        self.reactor = reactor
+        self.hotplug = batlab.hotplug.Hotplug() if hotplug else None
+        self.poll_interval = 0.5
+        self.rescan_interval = 30.0
+        self.initpool = concurrent.futures.ThreadPoolExecutor(max_workers=init_workers)
+        self.initializing = dict()
+        self.init_timeout = 15.0
+        self.new_ports = []
+        self.new_time = None
+        self.wakeevt = threading.Event()
+        self.ready_time = None
+        self.cache = batlab.devicecache.DeviceCache() if cache is True else (cache or None)
         self.quitevt = threading.Event()
+        self.logger = batlab.logger.Logger()
+        self.settings = batlab.settings.Settings()
         thread = threading.Thread(target=self.batpool_mgr)
         thread.daemon = True
         thread.start()
         logging.info("batpool:",thread.getName())
-        self.logger = batlab.logger.Logger()
-        self.settings = batlab.settings.Settings()
 
     def get_ports(self):
-        portinfos = serial.tools.list_ports.comports()
-        ports = []
-        for portinfo in portinfos:
-            logging.info(portinfo)
-            logging.info(portinfo.device + ' ' + str(portinfo.vid) + ' ' + str(portinfo.pid))
-            if(portinfo.vid == 0x04D8 and portinfo.pid == 0x000A):
-                logging.info("found Batlab on "+portinfo.device)
-                ports.append(portinfo.device)
-        return ports
+        return get_ports()
+
+    def wait_for_change(self,retry=False):
+        """Blocks until the set of plugged-in Batlabs may have changed. With kernel hotplug events this waits for an event, otherwise it sleeps for ``poll_interval``.
+
+        Args:
+            retry: True if a Batlab failed to initialize and should be retried after ``poll_interval`` even without an event
+        """
+        if self.hotplug is None:
+            self.wakeevt.wait(self.poll_interval)
+            self.wakeevt.clear()
+        elif self.hotplug.kernel_events and not retry:
+            self.hotplug.wait(self.rescan_interval)
+        else:
+            self.hotplug.wait(self.poll_interval)
+
+    def wake(self):
+        """Makes the manager thread run its next pass right away, e.g. when an initialization finished. May be called from any thread."""
+        self.wakeevt.set()
+        if self.hotplug is not None:
+            self.hotplug.wake()
+
+    def init_batlab(self,port):
+        """Creates and connects the ``Batlab`` on ``port``. Runs on the ``initpool`` workers."""
+        return batlab.batlabclass.Batlab(port,self.logger,self.settings,reactor=self.reactor,cache=self.cache)
+
+    def add_batlab(self,port,future,portlist):
+        """Adds the Batlab from a finished initialization to the pool.
+
+        Returns:
+            False if the initialization failed and should be retried.
+        """
+        try:
+            bat = future.result()
+        except Exception:
+            print("Batpool - Batlab init error on " + port)
+            traceback.print_exc()
+            return False
+        if bat.error == True or port not in portlist: #something went wrong or it was unplugged in the meantime. delete this instance and try again later
+            try:
+                bat.disconnect()
+            except Exception:
+                pass
+            if bat.error == True:
+                print("Batpool - Batlab init error. Deleting instance")
+                return False
+            return True
+        self.batlocks[port] = threading.Lock()
+        self.batpool[port] = bat
+        self.msgqueue.put('Batlab on ' + port + ' connected')
+        if self.batactive == '':
+            self.batactive = port
+            self.msgqueue.put('Batlab on ' + port + ' set as the Active Batlab')
+        return True
 
     def batpool_mgr(self):
         while(True):
             try:
+                retry = False
                 portlist = self.get_ports()
-                for port in portlist:
-                    if port not in self.batpool:
-                        self.batlocks[port] = threading.Lock()
-                        self.batpool[port] = batlab.batlabclass.Batlab(port,self.logger,self.settings)
-                        while(self.batpool[port].initialized == False):
-                            sleep(0.01)
-                        if self.batpool[port].error == True: #something went wrong. delete this instance and try again later
-                            self.batpool[port].disconnect()
-                            del self.batpool[port]
-                            del self.batlocks[port]
-                            print("Batpool - Batlab init error. Deleting instance")
-                            continue
-                        self.msgqueue.put('Batlab on ' + port + ' connected')
-                        if self.batactive == '':
-                            self.batactive = port
-                            self.msgqueue.put('Batlab on ' + port + ' set as the Active Batlab')
+                # initialize newly found Batlabs concurrently - one that hangs only holds up its own worker
+                new = [port for port in portlist if port not in self.batpool and port not in self.initializing]
+                if new and not self.new_ports:
+                    self.new_time = time()
+                for port in new:
+                    self.initializing[port] = self.initpool.submit(self.init_batlab,port)
+                    self.initializing[port].add_done_callback(lambda future: self.wake())
+                    self.new_ports.append(port)
+                # never block on the initializations here, so that unplugged Batlabs are removed right away
+                for port,future in sorted(self.initializing.items()):
+                    if future.done():
+                        del self.initializing[port]
+                        if not self.add_batlab(port,future,portlist):
+                            retry = True
+                if self.new_ports:
+                    pending = [port for port in self.new_ports if port in self.initializing]
+                    if not pending or time() - self.new_time >= self.init_timeout:
+                        for port in pending:
+                            self.msgqueue.put('Batlab on ' + port + ' is not responding - still initializing')
+                        self.ready_time = time() - self.new_time
+                        ready = len([port for port in self.new_ports if port in self.batpool])
+                        self.msgqueue.put('Batpool ready - ' + str(ready) + ' of ' + str(len(self.new_ports)) + ' new Batlabs initialized in ' + '{:.2f}'.format(self.ready_time) + ' s')
+                        self.new_ports = []
+                if self.initializing:
+                    retry = True # poll until the pending initializations finish
                 for port in list(self.batpool.keys()):
                     if port not in portlist:
                         self.batpool[port].disconnect()
@@ -88,7 +181,7 @@ class Batpool:
                             del self.batpool[port]
                         del self.batlocks[port]
                     return
-                sleep(0.5)
+                self.wait_for_change(retry)
             except:
                 logging.info('Exception on Batpool...Continuing')
                 traceback.print_exc()
@@ -107,4 +200,6 @@ class Batpool:
 
     def quit(self):
         self.quitevt.set() # tries to tell all of the Batlabs to stop the tests
+        self.wake()
         sleep(0.5)
+        self.logger.close() # write out the last log lines
@@ -1 +1 @@
-from .Batpool import Batpool
+from .Batpool import Batpool, get_ports
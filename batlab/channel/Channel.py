@@ -1,8 +1,10 @@
 from batlab.constants import *
 import batlab.encoder
 import batlab.func
+import batlab.logger
+import batlab.rawlog
 
-from time import sleep
+from time import sleep, time
 import datetime
 import threading
 from copy import deepcopy
@@ -26,6 +28,12 @@ class Channel:
         test_type: You can use this to specify a Cycle Test or a simple discharge test
         test_state: State machine variable for test state. Note that the test state machine is launched in another thread and continuously runs.
         settings: Settings object containing the test settings
+        streaming: True while the test is sampled from stream packets (``streamEnable`` setting) instead of register reads
+        setpoint_writes_skipped: Number of control loop passes that left the firmware current setpoint unchanged and so did not write it
+        zpending: ``Impedance`` handle of the impedance measurement to log next, or None. The test state machine waits while it runs.
+        zused: The last ``Impedance`` handle logged, so that a measurement shared with other cells is only logged once
+        resume_time: Time before which ``step`` only waits, set after a 'level 2' log entry, or None
+        heartbeat: Time the test step last ran. The Batlab only resets the firmware watchdog while the channels running tests keep stepping.
     """
     def __init__(self,bat,slot):
         self.bat = bat
@@ -42,8 +50,19 @@ class Channel:
         self.settings = self.bat.settings
         self.state = 'IDLE'
         self.timeout_time = None
+        self.streaming = False # True while the cell is reporting through stream packets
+        self.stream_seen = 0
+        self.setpoint_writes_skipped = 0
+        self.zpending = None
+        self.zlog = None # log record of the pending impedance measurement, filled in once it is done
+        self.zused = None
+        self.resume_time = None
+        self.heartbeat = time()
 
         self.critical_section = threading.Lock()
+        if self.bat.reactor is not None: # the reactor runs the test steps on its worker pool
+            self.bat.reactor.add_channel(self)
+            return
         thread = threading.Thread(target=self.thd_channel)
         thread.daemon = True
         thread.start()
@@ -70,11 +89,15 @@ class Channel:
 
     def end_test(self):
         self.test_state = TS_IDLE
+        z = self.bat.zlatest[self.slot]
+        if z is not None:
+            z.cancel()
         self.bat.write(self.slot,MODE,MODE_STOPPED)
 
     def start_test(self,cellname=None,test_type=None,timeout_time=None):
         """Initialize the test state machine and start a test on this Batlab channel. First sets the Batlab to the settings in the ``settings`` data member."""
         self.settings = deepcopy(self.bat.settings)
+        self.heartbeat = time()
 
         if cellname is not None:
             self.name = cellname
@@ -85,8 +108,9 @@ class Channel:
         
         #print the header for the individual cell logfiles if needed
         if self.settings.individual_cell_logs != 0:
-            logfile_headerstr = "Cell Name,Batlab SN,Channel,Timestamp (s),Voltage (V),Current (A),Temperature (C),Impedance (Ohm),Energy (J),Charge (Coulombs),Test State,Test Type,Charge Capacity (Coulombs),Energy Capacity (J),Avg Impedance (Ohm),delta Temperature (C),Avg Current (A),Avg Voltage,Runtime (s),VCC (V)"
-            self.bat.logger.log(logfile_headerstr,self.settings.cell_logfile + self.name + '.csv')
+            self.bat.logger.log(batlab.logger.LOG_HEADER,self.settings.cell_logfile + self.name + '.csv')
+            if self.settings.raw_logging:
+                self.bat.logger.log(batlab.rawlog.RAW_HEADER,self.logfile())
 
         # Initialize the test settings
         self.bat.write(self.slot,MODE,MODE_IDLE)
@@ -105,6 +129,13 @@ class Channel:
         if self.settings.constant_voltage_enable == True: #if we're doing constant voltage charging, we need to have current resolution down to the small range
             self.bat.write_verify(UNIT,ZERO_AMP_THRESH,batlab.encoder.Encoder(0.05).ascurrent())
 
+        # stream telemetry - the cell reports its mode, temperature, current and voltage on its own
+        self.streaming = False
+        if self.settings.stream_enable:
+            self.bat.write_verify(self.slot,REPORT_INTERVAL,self.settings.stream_report_interval)
+            self.stream_seen = self.bat.stream_received[self.slot]
+            self.streaming = True
+
         # Actually start the test
         if(self.test_type == TT_CYCLE):
             self.bat.write_verify(self.slot,CURRENT_SETPOINT,0)
@@ -152,21 +183,27 @@ class Channel:
 
 
     def log_lvl2(self,type):
-        """Logs 'level 2' test data to the log file and resets the voltage and current average and resets the charge counter back to zero."""
-        # Cell Name,Batlab SN,Channel,Timestamp (s),Voltage (V),Current (A),Temperature (C),Impedance (Ohm),Energy (J),Charge (Coulombs),Test State,Test Type,Charge Capacity (Coulombs),Energy Capacity (J),Avg Impedance (Ohm),delta Temperature (C),Avg Current (A),Avg Voltage,Runtime (s),VCC
-        state = l_test_state[self.test_state]
-        runtime = datetime.datetime.now() - self.last_lvl2_time
-        self.last_lvl2_time = datetime.datetime.now()
-        logstr = str(self.name) + ',' + str(self.bat.sn) + ',' + str(self.slot) + ',' + str(datetime.datetime.now()) + ',,,,,,,' + ',' + type + ',' + '{:.4f}'.format(self.q) + ',' + '{:.4f}'.format(self.e) + ',' + '{:.4f}'.format(self.zavg) + ',' + '{:.4f}'.format(self.deltat) + ',' + '{:.4f}'.format(self.iavg) + ',' + '{:.4f}'.format(self.vavg) + ',' + str(runtime.total_seconds()) + ','
-        self.bat.logger.log(logstr,self.settings.logfile)
-        # print(logstr)
+        """Logs 'level 2' test data to the log file and resets the voltage and current average and resets the charge counter back to zero. The next test step runs 2 seconds later."""
+        now = datetime.datetime.now()
+        runtime = now - self.last_lvl2_time
+        self.last_lvl2_time = now
+        record = batlab.logger.Level2Record(self.name,self.bat.sn,self.slot,now,type,self.q,self.e,self.zavg,self.deltat,self.iavg,self.vavg,runtime.total_seconds())
+        self.bat.logger.log(record,self.settings.logfile)
         # print('Test Completed: Batlab',self.bat.sn,', Channel',self.slot)
         self.vcnt = 0
         self.icnt = 0
         self.zcnt = 0
         self.temperature0 = self.bat.read(self.slot,TEMPERATURE).astemperature_c(self.bat.R,self.bat.B)
         self.bat.write(self.slot,CHARGEH,0) #writing to chargeh automatically clears chargel
-        sleep(2)
+        self.resume_time = time() + 2.0 # pause the test without holding up the worker or the Batlab lock
+
+    def stream_sample(self):
+        """Returns the latest stream packet for this channel if a new one arrived since the last call, or None if the sample has to be taken with register reads."""
+        count = self.bat.stream_received[self.slot]
+        if count == self.stream_seen:
+            return None
+        self.stream_seen = count
+        return self.bat.stream[self.slot]
 
     def state_machine_cycletest(self,mode,v):
         if self.test_state == TS_PRECHARGE:
@@ -361,142 +398,215 @@ class Channel:
                 self.test_state = TS_IDLE
                 print('Test Completed: Batlab',self.bat.sn,', Channel',self.slot,', Time:',datetime.datetime.now())
 
-    def thd_channel(self):
-        while(True):
-            try:
-                if self.killevt.is_set(): #stop the thread if the batlab object goes out of scope
-                    return
-                if self.bat.settings is None:
-                    sleep(1)
-                    continue
-                if self.bat.logger is None:
-                    sleep(1)
-                    continue
-                if self.bat.bootloader == True:
-                    sleep(1)
-                    continue
-            except:
-                sleep(1)
-                continue
-            try:
-                self.state = l_test_state[self.test_state]
-                ts = datetime.datetime.now()
-                
-                
-                with self.bat.critical_section:
-                    #patch for current compensation problem in firmware versions <= 3
-                    #fix is to move the current compensation control loop to software and turn it off in hardware.
-                    mode = self.bat.read(self.slot,MODE).asmode()
-                    i = self.bat.read(self.slot,CURRENT).ascurrent()
+    def step(self):
+        """Runs one pass of the test manager: the software current control loop, the watchdog reset, the measurements and the test state machine.
+
+        Returns:
+            Seconds to wait before the next pass, or None if the next pass should run as soon as the next stream packet arrives.
+        """
+        self.heartbeat = time()
+        try:
+            if self.bat.settings is None or self.bat.logger is None or self.bat.bootloader == True:
+                return 1
+        except:
+            return 1
+        if self.resume_time is not None:
+            wait = self.resume_time - time()
+            if wait > 0:
+                return wait
+            self.resume_time = None
+        try:
+            z = self.bat.zlatest[self.slot]
+            if z is not None and not z.done(): # the cell is in MODE_IMPEDANCE - leave it alone until the measurement is done
+                return 0.1
+            if self.zpending is not None:
+                self.log_impedance()
+            self.state = l_test_state[self.test_state]
+            ts = datetime.datetime.now()
+            
+            
+            with self.bat.critical_section:
+                #patch for current compensation problem in firmware versions <= 3
+                #fix is to move the current compensation control loop to software and turn it off in hardware.
+                if self.streaming and self.test_state == TS_IDLE: # test is over - turn the stream back off
+                    self.bat.write(self.slot,REPORT_INTERVAL,0)
+                    self.streaming = False
+                sample = self.stream_sample() if self.streaming else None
+                if sample is not None:
+                    pmode,pi = sample.field('mode'),sample.field('current')
                     p = self.bat.read(self.slot,CURRENT_SETPOINT)
-                    op = p.assetpoint() # actual operating point
-                    op_raw = p.data
-                    sp_raw = self.bat.setpoints[self.slot] #current setpoint
-                    sp = sp_raw / 128.0
-                    if mode == 'MODE_CHARGE' or mode == 'MODE_DISCHARGE':
-                        #print(mode,self.slot,i,op,sp)
-                        if i > 0 and (sp >= 0.35 or i < 0.37):
-                            if i < (sp - 0.01):
-                                op_raw += 1
-                            elif i > (sp + 0.01):
-                                op_raw -= 1
-                        if i > 4.02:
+                else:
+                    pmode,pi,p = self.bat.read_many([(self.slot,MODE),(self.slot,CURRENT),(self.slot,CURRENT_SETPOINT)])
+                mode = pmode.asmode()
+                i = pi.ascurrent()
+                op = p.assetpoint() # actual operating point
+                op_raw = p.data
+                sp_raw = self.bat.setpoints[self.slot] #current setpoint
+                sp = sp_raw / 128.0
+                if mode == 'MODE_CHARGE' or mode == 'MODE_DISCHARGE':
+                    #print(mode,self.slot,i,op,sp)
+                    if i > 0 and (sp >= 0.35 or i < 0.37):
+                        if i < (sp - 0.01):
+                            op_raw += 1
+                        elif i > (sp + 0.01):
                             op_raw -= 1
-                        if sp > 4.5:
-                            op_raw = 575
-                        if op_raw < self.settings.constant_voltage_stepsize and sp_raw > 0: #make sure that some amount of trickle current is flowing even if our setpoint is close to 0
-                            op_raw = self.settings.constant_voltage_stepsize
-                        if op_raw > 575 and sp_raw <= 575: #If for some reason we read a garbage op_raw, then don't make that our new setpoint
-                            op_raw = sp_raw
-                        if not math.isnan(op_raw):
-                            # writes to the firmware setpoitn will update the software setpoint, so we need to restore the software setpoint after we write 
-                            self.bat.write(self.slot,CURRENT_SETPOINT,op_raw)
-                            self.bat.setpoints[self.slot] = sp_raw
-                            
-                    #reset the batlab watchdog timer (shuts off current flow if it reaches 0 --- 256 to 0 in about 30 seconds)
-                    self.bat.write(UNIT,WATCHDOG_TIMER,WDT_RESET) #If firmware version is < 3, this command will not do anything
-
-                    # actual test manager stuff --- take measurements and control test state machine 
-                    if self.test_state != TS_IDLE:
-                        # take the measurements
-                        v = self.bat.read(self.slot,VOLTAGE).asvoltage()
-                        self.vcnt += 1
-                        self.vavg += (v - self.vavg) / self.vcnt
-                        i = self.bat.read(self.slot,CURRENT).ascurrent()
-                        self.icnt += 1
-                        self.iavg += (i - self.iavg) / self.icnt
-                        t = self.bat.read(self.slot,TEMPERATURE).astemperature_c(self.bat.R,self.bat.B)
+                    if i > 4.02:
+                        op_raw -= 1
+                    if sp > 4.5:
+                        op_raw = 575
+                    if op_raw < self.settings.constant_voltage_stepsize and sp_raw > 0: #make sure that some amount of trickle current is flowing even if our setpoint is close to 0
+                        op_raw = self.settings.constant_voltage_stepsize
+                    if op_raw > 575 and sp_raw <= 575: #If for some reason we read a garbage op_raw, then don't make that our new setpoint
+                        op_raw = sp_raw
+                    if not math.isnan(op_raw) and op_raw != p.data: # only write the firmware setpoint when the control loop moved it
+                        # writes to the firmware setpoitn will update the software setpoint, so we need to restore the software setpoint after we write 
+                        self.bat.write(self.slot,CURRENT_SETPOINT,op_raw)
+                        self.bat.setpoints[self.slot] = sp_raw
+                    elif not math.isnan(op_raw):
+                        self.setpoint_writes_skipped += 1
+                        
+                # the batlab watchdog timer is reset by the Batlab itself every ``watchdog_interval`` seconds, as long as ``heartbeat`` keeps up
+
+                # actual test manager stuff --- take measurements and control test state machine 
+                if self.test_state != TS_IDLE:
+                    # take the measurements
+                    logging_due = (ts - self.last_lvl1_time).total_seconds() > self.settings.reporting_period
+                    if sample is not None: # stream mode - only VCC has to be polled on every sample
+                        pv,pt = sample.field('voltage'),sample.field('temp')
+                        pvc = self.bat.read(UNIT,VCC)
+                        perr = None
+                        pdty = self.bat.read(self.slot,DUTY) if logging_due else None
+                    else:
+                        pv,pi,pt,pmode,perr,pdty,pvc = self.bat.read_many([(self.slot,VOLTAGE),(self.slot,CURRENT),(self.slot,TEMPERATURE),(self.slot,MODE),(self.slot,ERROR),(self.slot,DUTY),(UNIT,VCC)])
+                    v = pv.asvoltage()
+                    self.vcnt += 1
+                    self.vavg += (v - self.vavg) / self.vcnt
+                    i = pi.ascurrent()
+                    self.icnt += 1
+                    self.iavg += (i - self.iavg) / self.icnt
+                    t = pt.astemperature_c(self.bat.R,self.bat.B)
+                    if self.settings.raw_logging and logging_due:
+                        qset,qraw = self.bat.charge_counts(self.slot)
+                        q = float('nan') if math.isnan(qraw) else self.bat._charge(qset,qraw >> 16,qraw & 0xFFFF)
+                    elif sample is None or logging_due or pmode.data == MODE_STOPPED: # in stream mode the charge is only needed for the logs
                         q = self.bat.charge(self.slot) #self.bat.read(self.slot,CHARGEH).data * 65536 + self.bat.read(self.slot,CHARGEL).data
-                        e = q * self.vavg
-                        mode = self.bat.read(self.slot,MODE).data
-                        err = self.bat.read(self.slot,ERROR).data
-                        dty = self.bat.read(self.slot,DUTY).data
+                    else:
+                        q = self.q
+                    e = q * self.vavg
+                    mode = pmode.data
+                    err = perr.data if perr is not None else None
+                    dty = pdty.data if pdty is not None else None
+                    
+                    #take VCC measurement - cannot safely continue test if VCC is too low
+                    vc  = pvc.asvcc()
+                    if not math.isnan(vc):
+                        if vc < 4.35:
+                            print("Warning: VCC on",self.bat.sn,"is dangerously low - consider using more robust powered hub")
+                        if vc < 4.1 and self.vcc < 4.1:
+                            self.bat.write_verify(self.slot,MODE,MODE_STOPPED)
+                            self.test_state = TS_IDLE
+                            print('Test Aborted due to low VCC: Batlab',self.bat.sn,', Channel',self.slot,', Time:',datetime.datetime.now())
+                        self.vcc = vc
                         
-                        #take VCC measurement - cannot safely continue test if VCC is too low
-                        vc  = self.bat.read(UNIT,VCC).asvcc()
-                        if not math.isnan(vc):
-                            if vc < 4.35:
-                                print("Warning: VCC on",self.bat.sn,"is dangerously low - consider using more robust powered hub")
-                            if vc < 4.1 and self.vcc < 4.1:
-                                self.bat.write_verify(self.slot,MODE,MODE_STOPPED)
-                                self.test_state = TS_IDLE
-                                print('Test Aborted due to low VCC: Batlab',self.bat.sn,', Channel',self.slot,', Time:',datetime.datetime.now())
-                            self.vcc = vc
-                            
-                            
-                        # detect voltage measurement inconsistency hardware problem that was found on a couple of batlabs
-                        if not math.isnan(v) and not math.isnan(i):
-                            if self.iprev > 0.05 and self.vprev > 0.5:
-                                if math.fabs(i - self.iprev) < 0.05:
-                                    if self.vprev - v > 0.2:
-                                        self.verrorcnt += 1
-                                        print("Warning: unexpected voltage jump detected on Batlab",self.bat.sn," Channel",self.slot,', Time:',datetime.datetime.now())
-                                        if self.verrorcnt > 5:
-                                            self.bat.write_verify(self.slot,MODE,MODE_STOPPED)
-                                            self.test_state = TS_IDLE
-                                            print('Test Aborted due to voltage measurement inconsistency. Possible hardware problem with: Batlab',self.bat.sn,', Channel',self.slot,', Time:',datetime.datetime.now())                       
-                            self.iprev = i
-                            self.vprev = v
-
-                        self.q = q
-                        self.e = e
-                        self.deltat = t - self.temperature0
-                        state = l_test_state[self.test_state]
-
-                        # log the results
-                        if (ts - self.last_lvl1_time).total_seconds() > self.settings.reporting_period:
-                            self.last_lvl1_time = datetime.datetime.now()
-                            if (ts - self.last_impedance_time).total_seconds() > self.settings.impedance_period and self.settings.impedance_period > 0 and self.trickle_engaged == False:
-                                z = self.bat.impedance(self.slot)
-                                if math.isnan(z):
-                                    z = self.zavg
-                                    print("error in impedance measurement...using previous result")
-                                self.last_impedance_time = datetime.datetime.now()
-                                self.zcnt += 1
-                                self.zavg += (z - self.zavg) / self.zcnt
-                                logstr = str(self.name) + ',' + str(self.bat.sn) + ',' + str(self.slot) + ',' + str(ts) + ',' + '{:.4f}'.format(self.vprev) + ',' + '{:.4f}'.format(self.iprev) + ',' + '{:.4f}'.format(t) + ',' + '{:.4f}'.format(z) + ',' + '{:.4f}'.format(e) + ',' + '{:.4f}'.format(q) + ',' + state + ',,,,,,,' + ',,' + '{:.4f}'.format(self.vcc) + ',' + str(op_raw) + ',' + str(sp_raw) + ',' + str(dty)
-                            else:
-                                logstr = str(self.name) + ',' + str(self.bat.sn) + ',' + str(self.slot) + ',' + str(ts) + ',' + '{:.4f}'.format(v) + ',' + '{:.4f}'.format(i) + ',' + '{:.4f}'.format(t) + ',,' + '{:.4f}'.format(e) + ',' + '{:.4f}'.format(q) + ',' + state + ',,,,,,,' + ',,' + '{:.4f}'.format(self.vcc) + ',' + str(op_raw) + ',' + str(sp_raw) + ',' + str(dty)
-                            
-                            if self.settings.individual_cell_logs == 0:
-                                self.bat.logger.log(logstr,self.settings.logfile)
-                            else:
-                                self.bat.logger.log(logstr,self.settings.cell_logfile + self.name + '.csv')
                         
+                    # detect voltage measurement inconsistency hardware problem that was found on a couple of batlabs
+                    if not math.isnan(v) and not math.isnan(i):
+                        if self.iprev > 0.05 and self.vprev > 0.5:
+                            if math.fabs(i - self.iprev) < 0.05:
+                                if self.vprev - v > 0.2:
+                                    self.verrorcnt += 1
+                                    print("Warning: unexpected voltage jump detected on Batlab",self.bat.sn," Channel",self.slot,', Time:',datetime.datetime.now())
+                                    if self.verrorcnt > 5:
+                                        self.bat.write_verify(self.slot,MODE,MODE_STOPPED)
+                                        self.test_state = TS_IDLE
+                                        print('Test Aborted due to voltage measurement inconsistency. Possible hardware problem with: Batlab',self.bat.sn,', Channel',self.slot,', Time:',datetime.datetime.now())                       
+                        self.iprev = i
+                        self.vprev = v
+
+                    self.q = q
+                    self.e = e
+                    self.deltat = t - self.temperature0
+                    state = l_test_state[self.test_state]
+
+                    # log the results
+                    if logging_due:
+                        self.last_lvl1_time = datetime.datetime.now()
+                        if self.settings.raw_logging: # raw register values - decoded later by batlab.rawlog
+                            record = batlab.rawlog.RawRecord(self.name,self.bat.sn,self.slot,time(),state,mode,pv.data,pi.data,pt.data,qraw,qset,pvc.data,None,None,op_raw,sp_raw,dty,self.bat.R[self.slot],self.bat.B[self.slot])
+                        else:
+                            record = batlab.logger.Level1Record(self.name,self.bat.sn,self.slot,ts,v,i,t,None,e,q,state,self.vcc,op_raw,sp_raw,dty)
+                        if (ts - self.last_impedance_time).total_seconds() > self.settings.impedance_period and self.settings.impedance_period > 0 and self.trickle_engaged == False:
+                            # the measurement takes a couple of seconds - the line is logged by log_impedance once it is done, and the state machine runs again after that
+                            self.zpending = self.shared_impedance()
+                            self.zlog = record if self.settings.raw_logging else record._replace(voltage=self.vprev,current=self.iprev)
+                            return 0.1
+                        self.bat.logger.log(record,self.logfile())
+                    
+
+                    # actually run the test state machine - decides what to do next
+                    self.state_machine_cycletest(mode,v)
+
+        except:
+            print('Exception on Channel',self.slot,self.name,'...Continuing test')
+            traceback.print_exc()
+            return 2
+        if self.streaming:
+            return None
+        if self.settings.reporting_period < 0.5:
+            return 0.51
+        elif self.settings.reporting_period < 1.0:
+            return 0.01 + self.settings.reporting_period
+        return 1.01
+
+    def shared_impedance(self):
+        """Returns the impedance measurement to log for this cell.
+
+        The sine generator is shared by the whole Batlab, so cells are measured together: if another channel measured this cell within the last half impedance period, that measurement is used. Otherwise a new one is started for this cell and for every other cell whose impedance is due within half a period.
+        """
+        z = self.bat.zlatest[self.slot]
+        if z is not None and z is not self.zused and z.done_time is not None and not z.cancelled() and time() - z.done_time < self.settings.impedance_period / 2.0:
+            return z
+        cells = [self.slot]
+        now = datetime.datetime.now()
+        for ch in self.bat.channel:
+            if ch is not self and ch.test_state != TS_IDLE and ch.zpending is None and ch.trickle_engaged == False and ch.settings.impedance_period > 0:
+                if (now - ch.last_impedance_time).total_seconds() > ch.settings.impedance_period / 2.0:
+                    cells.append(ch.slot)
+        return self.bat.impedance_async(sorted(cells))
+
+    def log_impedance(self):
+        """Logs the result of the finished impedance measurement in ``zpending``."""
+        z = self.zpending
+        self.zpending = None
+        self.zused = z
+        if z.cancelled(): # the test was ended in the meantime
+            return
+        z = z.impedance(self.slot)
+        if math.isnan(z):
+            z = self.zavg
+            print("error in impedance measurement...using previous result")
+        self.last_impedance_time = datetime.datetime.now()
+        self.zcnt += 1
+        self.zavg += (z - self.zavg) / self.zcnt
+        if self.settings.raw_logging:
+            i = self.zused.cells.index(self.slot)
+            record = self.zlog._replace(current_pp=self.zused.imag_raw[i],voltage_pp=self.zused.vmag_raw[i])
+        else:
+            record = self.zlog._replace(impedance=z)
+        self.bat.logger.log(record,self.logfile())
 
-                        # actually run the test state machine - decides what to do next
-                        self.state_machine_cycletest(mode,v)
-
-                sleep(0.01)
-                if self.settings.reporting_period < 0.5:
-                    sleep(0.5)
-                elif self.settings.reporting_period < 1.0:
-                    sleep(self.settings.reporting_period)
-                else:
-                    sleep(1)
+    def logfile(self):
+        """Returns the file the 'level 1' lines of this channel are logged to, which depends on the ``individualCellLogs`` and ``rawLogging`` settings."""
+        if self.settings.individual_cell_logs == 0:
+            return self.settings.raw_logfile if self.settings.raw_logging else self.settings.logfile
+        return self.settings.cell_logfile + self.name + ('_raw.csv' if self.settings.raw_logging else '.csv')
 
-            except:
-                sleep(2)
-                print('Exception on Channel',self.slot,self.name,'...Continuing test')
-                traceback.print_exc()
-                continue
+    def thd_channel(self):
+        while(True):
+            if self.killevt.is_set(): #stop the thread if the batlab object goes out of scope
+                return
+            delay = self.step()
+            if delay is None: # wake up as soon as the next stream packet arrives
+                self.bat.wait_stream(self.slot,self.stream_seen,1.0)
+            else:
+                sleep(delay)
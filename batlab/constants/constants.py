@@ -134,6 +134,13 @@ LOCK_UNLOCKED          = 0x0000
 
 COMMAND_ERROR          = 257
 
+# register traffic priority classes, highest first
+PRIO_CONTROL           = 0 # mode changes (stop) and watchdog resets
+PRIO_SAFETY            = 1 # measurements the safety cutoffs depend on, setpoint changes
+PRIO_LOGGING           = 2 # everything else, e.g. reads that only feed the logs
+PRIO_BULK              = 3 # bootloading and calibration writes
+PRIO_LIST = ['PRIO_CONTROL','PRIO_SAFETY','PRIO_LOGGING','PRIO_BULK']
+
 # test manager constants
 TT_DISCHARGE = 0
 TT_CYCLE = 1
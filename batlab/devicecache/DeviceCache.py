@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+class DeviceCache:
+    """Remembers the calibration constants of each Batlab on disk, keyed by serial number.
+
+    ``Batlab.connect`` normally reads the thermistor constants of all four cells every time a unit is plugged in. With a cache it only reads the serial number, firmware version and the constants of cell 0; if those match the cached entry, the rest of the constants are taken from the cache. A mismatch (e.g. after a firmware update or ``calibration_recover``) falls back to the full read and refreshes the entry.
+
+    Attributes:
+        filename: JSON file holding the cache. Defaults to ``~/.batlab/devicecache.json``
+        entries: Dictionary of cached entries by serial number string. Each entry holds ``ver`` (firmware version), ``R`` and ``B`` (4-lists of thermistor constants).
+        hits: Number of connections that used a cached entry
+        misses: Number of connections that had to read all of the constants
+    """
+    def __init__(self,filename=None):
+        if filename is None:
+            filename = os.path.join(os.path.expanduser('~'),'.batlab','devicecache.json')
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.entries = dict()
+        try:
+            with open(self.filename,'r') as f:
+                self.entries = json.load(f)
+        except (IOError,OSError,ValueError):
+            pass
+
+    def get(self,sn):
+        """Returns the cached entry for serial number ``sn``, or None."""
+        with self.lock:
+            return self.entries.get(str(sn))
+
+    def validate(self,sn,ver,r0,b0):
+        """Returns the cached entry for ``sn`` if it matches the firmware version and cell 0 thermistor constants just read from the Batlab, or None. Counts the hit or miss."""
+        entry = self.get(sn)
+        if entry is not None and entry.get('ver') == ver and entry.get('R',[None])[0] == r0 and entry.get('B',[None])[0] == b0:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self,sn,ver,R,B):
+        """Stores the constants read from Batlab ``sn`` and saves the cache file."""
+        with self.lock:
+            self.entries[str(sn)] = {'ver': ver, 'R': list(R), 'B': list(B)}
+            self._save()
+
+    def forget(self,sn):
+        """Drops the entry for ``sn``, e.g. after its calibration constants were rewritten."""
+        with self.lock:
+            if self.entries.pop(str(sn),None) is not None:
+                self._save()
+
+    def _save(self):
+        tmp = None
+        try:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # a unique temporary file, so two processes sharing the cache never write into each other's file
+            with tempfile.NamedTemporaryFile('w',dir=directory or '.',prefix='.devicecache-',suffix='.tmp',delete=False) as f:
+                tmp = f.name
+                json.dump(self.entries,f,indent=2,sort_keys=True)
+            os.replace(tmp,self.filename) # readers never see a half-written file
+        except (IOError,OSError):
+            logging.warning("Could not save device cache to " + self.filename)
+            if tmp is not None and os.path.exists(tmp):
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
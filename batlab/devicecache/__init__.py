@@ -0,0 +1 @@
+from .DeviceCache import DeviceCache
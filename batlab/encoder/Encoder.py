@@ -1,5 +1,7 @@
 import math
 
+import batlab.thermistor
+
 class Encoder:
     """Essentially the opposite of the Packet class. Takes a human-readable measurement or command and converts it to the raw Batlab register value."""
     def __init__(self,data):
@@ -40,16 +42,7 @@ class Encoder:
             Rdiv: 'R' calibration value needed to interpret temp
             B: 'B' calibration value needed to interpret temp
         """
-        To = 25 + 273.15
-        Ro = 10000
-        F = (self.data - 32) / 1.8 # F in this case is the temperature in celsius :)
-        F = 1/(F + 273.15)
-        R = math.exp((F - (1 / To)) * B) * Ro
-        if (R > 0 and Rdiv > 0):
-            R = (2**15)/(((1/R)*Rdiv) + 1)
-        else:
-            R = -100 # dummy value
-        return int(R)
+        return batlab.thermistor.table(Rdiv,B).raw((self.data - 32) / 1.8)
     
     def c_astemperature(self,Rdiv,B):
         """Represents temperature data as temperature in C.
@@ -58,14 +51,4 @@ class Encoder:
             Rdiv: 'R' calibration value needed to interpret temp
             B: 'B' calibration value needed to interpret temp
         """
-    
-        To = 25 + 273.15
-        Ro = 10000
-        F = self.data
-        F = 1/(F + 273.15)
-        R = math.exp((F - (1 / To)) * B) * Ro
-        if (R > 0 and Rdiv > 0):
-            R = (2**15)/(((1/R)*Rdiv) + 1)
-        else:
-            R = -100 # dummy value
-        return int(R)
+        return batlab.thermistor.table(Rdiv,B).raw(self.data)
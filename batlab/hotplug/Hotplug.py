@@ -0,0 +1,132 @@
+import logging
+import os
+import select
+import socket
+from time import time
+
+NETLINK_KOBJECT_UEVENT = 15
+
+class Hotplug:
+    """Waits for Batlabs to be plugged in or unplugged.
+
+    On Linux the kernel announces every device that comes or goes with a uevent on a netlink socket, the same feed udev listens to. ``Hotplug`` listens on that socket and only wakes up for USB serial ports with the Batlab VID/PID, so the serial ports are enumerated when something actually changed instead of twice a second. Where netlink is not available (Windows, macOS, or a sandbox without netlink), ``wait`` simply sleeps and the caller keeps polling.
+
+    Attributes:
+        vid: USB vendor ID to watch for
+        pid: USB product ID to watch for
+        kernel_events: True if kernel hotplug events are being received, False if the caller has to poll
+        events: Number of relevant hotplug events received
+    """
+    def __init__(self,vid=0x04D8,pid=0x000A):
+        self.vid = vid
+        self.pid = pid
+        self.events = 0
+        self.sock = None
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        try:
+            self.sock = socket.socket(socket.AF_NETLINK,socket.SOCK_DGRAM,NETLINK_KOBJECT_UEVENT)
+            self.sock.bind((0,1)) # multicast group 1 carries the kernel uevents
+            self.sock.setblocking(False)
+        except (AttributeError,OSError):
+            logging.info("Hotplug events not available - polling serial ports")
+            if self.sock is not None:
+                self.sock.close()
+            self.sock = None
+        self.kernel_events = self.sock is not None
+
+    def wait(self,timeout,settle=0.1):
+        """Blocks until a Batlab may have been plugged in or unplugged, ``wake`` is called, or ``timeout`` seconds pass. Without kernel events this just sleeps for ``timeout``.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+            settle: After an event, keep collecting events for this many seconds so that the burst of uevents from one plug-in results in one rescan
+
+        Returns:
+            True if a relevant hotplug event arrived.
+        """
+        fds = [self.wakeup_r] if self.sock is None else [self.wakeup_r,self.sock]
+        deadline = time() + timeout
+        found = False
+        while True:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return found
+            readable = select.select(fds,[],[],remaining)[0]
+            if self.wakeup_r in readable:
+                self._drain(self.wakeup_r)
+                return found
+            if self.sock in readable and self._receive():
+                if not found:
+                    found = True
+                    deadline = min(deadline,time() + settle)
+
+    def wake(self):
+        """Makes a pending or the next ``wait`` return immediately. May be called from any thread."""
+        try:
+            self.wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.wakeup_r.close()
+        self.wakeup_w.close()
+
+    def _drain(self,sock):
+        try:
+            while sock.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _receive(self):
+        """Reads the queued uevents. Returns True if any of them concerns a matching USB serial port."""
+        relevant = False
+        while True:
+            try:
+                msg = self.sock.recv(8192)
+            except BlockingIOError:
+                return relevant
+            except OSError: # ENOBUFS - events were lost, so assume the worst and rescan
+                return True
+            if self.relevant(self.parse(msg)):
+                self.events += 1
+                relevant = True
+
+    @staticmethod
+    def parse(msg):
+        """Splits a kernel uevent ("add@/devices/...\\0ACTION=add\\0SUBSYSTEM=tty\\0...") into a dict of its environment."""
+        env = dict()
+        for field in msg.split(b'\0')[1:]:
+            key,sep,value = field.partition(b'=')
+            if sep:
+                env[key.decode('ascii','replace')] = value.decode('utf-8','replace')
+        return env
+
+    def relevant(self,env):
+        """True if the uevent ``env`` is a USB serial port coming or going that could be a Batlab."""
+        devpath = env.get('DEVPATH','')
+        if env.get('SUBSYSTEM') != 'tty' or '/usb' not in devpath:
+            return False
+        if env.get('ACTION') != 'add':
+            return env.get('ACTION') == 'remove' # the device is gone from sysfs, so its IDs cannot be checked
+        ids = self.usb_ids(devpath)
+        return ids is None or ids == (self.vid,self.pid)
+
+    @staticmethod
+    def usb_ids(devpath):
+        """Looks up the (vid, pid) of the USB device above ``devpath`` in sysfs, or returns None if they cannot be found."""
+        path = '/sys' + devpath
+        while len(path) > len('/sys/devices'):
+            try:
+                with open(os.path.join(path,'idVendor')) as f:
+                    vid = int(f.read(),16)
+                with open(os.path.join(path,'idProduct')) as f:
+                    pid = int(f.read(),16)
+                return (vid,pid)
+            except (IOError,OSError,ValueError):
+                path = os.path.dirname(path)
+        return None
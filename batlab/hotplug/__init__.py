@@ -0,0 +1 @@
+from .Hotplug import Hotplug
@@ -0,0 +1,192 @@
+from batlab.constants import *
+
+import concurrent.futures
+import threading
+from time import time
+
+RESTORABLE_MODES = [MODE_DISCHARGE,MODE_CHARGE,MODE_IDLE,MODE_IMPEDANCE,MODE_STOPPED,MODE_NO_CELL,MODE_BACKWARDS]
+RESTORE_TRIES = 10 # times the previous mode is written before giving up on a cell
+
+class Impedance(concurrent.futures.Future):
+    """Handle for an impedance measurement running on one or more cells of a ``Batlab``.
+
+    The measurement goes through the same steps as the old blocking ``Batlab.impedance`` macro, without holding up the calling thread:
+
+    1. ``start`` reads the cell modes and switches the cells to MODE_IMPEDANCE.
+    2. The handle waits ``settle`` seconds. ``Batlab.expire`` picks it up once ``ready_time`` has passed.
+    3. ``collect`` latches the measurement registers with LOCK and, once the LOCK write is done, reads CURRENT_PP and VOLTAGE_PP.
+    4. The registers are unlocked and the previous modes are restored. Each cell's MODE is read back and written again while it still reads MODE_IMPEDANCE.
+
+    The sine generator settings are shared by the whole Batlab, so measuring several cells at once costs a single settle time and a single LOCK. The Batlab keeps serving other channels the whole time.
+
+    Like a ``Transaction``, the handle is a ``concurrent.futures.Future``. Its result is the impedance in Ohms, or a list of impedances in the order of ``cells`` if a list of cells was given. A cell whose register accesses failed reads NaN. Cancelling the handle before it is done restores the previous modes right away.
+
+    Attributes:
+        bat: The Batlab the cells belong to
+        cells: List of cells (slots) being measured
+        settle: Seconds to leave the cells in MODE_IMPEDANCE before reading the results
+        state: 'READING_MODE', 'SETTLING', 'COLLECTING', 'RESTORING', 'DONE' or 'CANCELLED'
+        modes: Cell modes before the measurement, restored at the end (None for cells that could not be read)
+        ready_time: Time after which the results can be collected, None until the cells are in MODE_IMPEDANCE
+        done_time: Time the measurement finished, None until then
+        imag: Peak-to-peak current of the sine for each cell, in Amps
+        vmag: Peak-to-peak voltage of the sine for each cell, in Volts
+        imag_raw: CURRENT_PP register value for each cell, NaN if it was not read
+        vmag_raw: VOLTAGE_PP register value for each cell, NaN if it was not read
+    """
+    def __init__(self,bat,cells,settle=2.0):
+        concurrent.futures.Future.__init__(self)
+        self.bat = bat
+        self.single = not isinstance(cells,(list,tuple))
+        self.cells = [cells] if self.single else list(cells)
+        self.settle = settle
+        self.state = 'READING_MODE'
+        self.modes = [None for cell in self.cells]
+        self.ready_time = None
+        self.done_time = None
+        self.imag = [float('nan') for cell in self.cells]
+        self.vmag = [float('nan') for cell in self.cells]
+        self.imag_raw = [float('nan') for cell in self.cells]
+        self.vmag_raw = [float('nan') for cell in self.cells]
+        self.restoring = 0 # cells whose mode is still being restored
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the measurement. Returns the handle itself."""
+        for cell in self.cells:
+            self.bat.zlatest[cell] = self
+        txns = self.bat.read_many_async([(cell,MODE) for cell in self.cells])
+        self._when_all(txns,lambda: self._modes_read(txns))
+        return self
+
+    def ready(self):
+        """True once the cells have settled and the results can be collected."""
+        return self.ready_time is not None and time() >= self.ready_time
+
+    def impedance(self,cell):
+        """Impedance of one of the measured cells in Ohms, NaN if it failed or the measurement is not done."""
+        if not self.done() or self.cancelled() or cell not in self.cells:
+            return float('nan')
+        i = self.cells.index(cell)
+        return self.bat._impedance(self.vmag[i],self.imag[i])
+
+    def _when_all(self,txns,callback):
+        # Calls ``callback`` once every transaction is done. Transactions can complete out of order when one is resent, and a done-callback runs on the receiver thread, so it must never wait for the others.
+        remaining = [len(txns)]
+        def done(txn):
+            with self.lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                callback()
+        for txn in txns:
+            txn.add_done_callback(done)
+
+    def _advance(self,old,new):
+        with self.lock:
+            if self.state != old:
+                return False # cancelled in the meantime
+            self.state = new
+            return True
+
+    def _modes_read(self,txns):
+        for i,txn in enumerate(txns):
+            p = txn.result()
+            if p.valid:
+                self.modes[i] = p.data
+        if not [mode for mode in self.modes if mode is not None]:
+            if self._advance('READING_MODE','RESTORING'):
+                self._finish()
+            return
+        if self._advance('READING_MODE','SETTLING'):
+            switches = [self.bat.write_async(cell,MODE,MODE_IMPEDANCE) for (cell,mode) in zip(self.cells,self.modes) if mode is not None]
+            self._when_all(switches,lambda: self._switched(switches))
+
+    def _switched(self,switches):
+        if not [txn for txn in switches if txn.result().valid]:
+            if self._advance('SETTLING','RESTORING'):
+                self._restore(False)
+            return
+        self.ready_time = time() + self.settle
+        self.bat._wait_impedance(self)
+
+    def collect(self):
+        """Reads the results. Called by ``Batlab.expire`` once the handle is ``ready``."""
+        if not self._advance('SETTLING','COLLECTING'):
+            return
+        cells = [cell for (cell,mode) in zip(self.cells,self.modes) if mode is not None]
+        latch = self.bat._latch() # one latch for all of the cells
+        latch.add_done_callback(lambda txn: self._read_results(cells))
+
+    def _read_results(self,cells):
+        txns = self.bat.read_many_async([(cell,reg) for cell in cells for reg in (CURRENT_PP,VOLTAGE_PP)],PRIO_SAFETY)
+        self._when_all(txns,lambda: self._collected(cells,txns))
+
+    def _collected(self,cells,txns):
+        if not self._advance('COLLECTING','RESTORING'):
+            return
+        for n,cell in enumerate(cells):
+            i = self.cells.index(cell)
+            self.imag_raw[i] = txns[2*n].result().data
+            self.vmag_raw[i] = txns[2*n+1].result().data
+            self.imag[i] = txns[2*n].result().ascurrent()
+            self.vmag[i] = txns[2*n+1].result().asvoltage()
+        self._restore(True)
+
+    def _restore(self,unlock):
+        if unlock:
+            self.bat._unlatch()
+        restore = [(cell,mode) for (cell,mode) in zip(self.cells,self.modes) if mode in RESTORABLE_MODES]
+        if not restore:
+            self._finish()
+            return
+        self.restoring = len(restore)
+        for (cell,mode) in restore:
+            self._restore_mode(cell,mode,RESTORE_TRIES)
+
+    def _restore_mode(self,cell,mode,tries):
+        write = self.bat.write_async(cell,MODE,mode) #restore previous state
+        write.add_done_callback(lambda txn: self._check_mode(cell,mode,tries))
+
+    def _check_mode(self,cell,mode,tries):
+        readback = self.bat.read_async(cell,MODE,cached=False)
+        readback.add_done_callback(lambda txn: self._mode_restored(cell,mode,tries,txn.result()))
+
+    def _mode_restored(self,cell,mode,tries,p):
+        stuck = mode != MODE_IMPEDANCE and (not p.valid or p.data == MODE_IMPEDANCE)
+        if self.bat.killevt.is_set(): # disconnected - nothing left to restore
+            stuck = False
+        if stuck and tries > 1:
+            self._restore_mode(cell,mode,tries - 1)
+            return
+        if stuck:
+            print("Warning: could not restore the mode of Batlab",self.bat.sn,"cell",cell,"after the impedance measurement")
+        with self.lock:
+            self.restoring -= 1
+            last = self.restoring == 0
+        if last:
+            self._finish()
+
+    def _finish(self):
+        with self.lock:
+            if self.state == 'CANCELLED':
+                return
+            self.state = 'DONE'
+        self.done_time = time()
+        z = [self.bat._impedance(vmag,imag) for (vmag,imag) in zip(self.vmag,self.imag)]
+        try:
+            self.set_result(z[0] if self.single else z)
+        except Exception:
+            pass
+
+    def cancel(self):
+        """Stops the measurement and puts the cells back in their previous modes. Returns False if the measurement already finished."""
+        with self.lock:
+            if self.state in ('RESTORING','DONE','CANCELLED'):
+                return False
+            switched = self.state in ('SETTLING','COLLECTING')
+            unlock = self.state == 'COLLECTING'
+            self.state = 'CANCELLED'
+        if switched:
+            self._restore(unlock)
+        return concurrent.futures.Future.cancel(self)
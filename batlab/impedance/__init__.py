@@ -0,0 +1 @@
+from .Impedance import Impedance
@@ -1,5 +1,9 @@
+import atexit
+from collections import OrderedDict
+import logging
+import os
 import threading
-from time import sleep
+from time import time
 
 try:
     # Python 2.x
@@ -8,26 +12,162 @@ except ImportError:
     # Python 3.x
     import queue as queue
 
+FSYNC_NEVER = 'never' # leave it to the operating system when the data reaches the disk
+FSYNC_FLUSH = 'flush' # fsync every file written by a batch
+FSYNC_CLOSE = 'close' # fsync files when their handles are closed
+
 class Logger:
-    """Manages access to files for writing test log information."""
-    
-    # cell name,batlab name,channel,timestamp,voltage,current,temperature,impedance,energy,charge
-    def __init__(self):
+    """Manages access to files for writing test log information.
+
+    Lines or log records (``Level1Record``, ``Level2Record``, ``RawRecord``) are queued by ``log`` and written by a worker thread. The worker turns records into lines with ``formatter``, so that the sampling threads only have to queue a small object. It collects the queued lines by file and writes each file's lines with a single buffered write once ``flush_size`` characters are waiting or the oldest line has waited ``flush_interval`` seconds. Files stay open between batches: the ``max_open`` most recently used handles are kept, and the least recently used one is closed when another file is needed.
+
+    Attributes:
+        max_open: Number of file handles kept open
+        flush_size: Number of queued characters that triggers a write
+        flush_interval: Seconds a line may wait in the queue before it is written
+        fsync: When the written data is forced to disk: ``FSYNC_NEVER``, ``FSYNC_FLUSH`` or ``FSYNC_CLOSE``
+        formatter: Function that turns a record into a line. The default calls the ``csv`` method of the record.
+        opens: Number of times a file was opened
+        writes: Number of batched writes
+    """
+
+    def __init__(self,max_open=16,flush_size=65536,flush_interval=1.0,fsync=FSYNC_NEVER,formatter=None):
+        self.max_open = max_open
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.formatter = formatter if formatter is not None else (lambda record: record.csv())
+        self.opens = 0
+        self.writes = 0
         self.msgqueue = queue.Queue()
-        thread = threading.Thread(target=self.thd_logger)
-        thread.daemon = True
-        thread.start()
-        #print("logger:",thread.getName())
+        self.handles = OrderedDict() # filename -> open file, least recently used first
+        self.pending = OrderedDict() # filename -> list of lines waiting to be written
+        self.pending_size = 0
+        self.pending_time = None # time the oldest pending line was queued
+        self.lock = threading.Lock()
+        self.thread = None
+        self._start()
+        atexit.register(self.close,5.0)
+
+    def _start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.thd_logger)
+                self.thread.daemon = True
+                self.thread.start()
+                #print("logger:",thread.getName())
 
     def log(self,logstring,filename):
-        """Writes entry 'logstring' into file 'filename'."""
-        self.msgqueue.put([logstring,filename])
+        """Writes entry 'logstring' into file 'filename'. 'logstring' is a line, or a record that is formatted in the logger thread."""
+        self.msgqueue.put((filename,logstring))
+        if self.thread is None: # closed - start the worker again
+            self._start()
+
+    def flush(self,timeout=None):
+        """Writes everything logged so far to the files and waits until it is done. Returns False if ``timeout`` seconds passed first."""
+        return self._request(False,timeout)
+
+    def close(self,timeout=None):
+        """Writes everything logged so far, closes all of the files and stops the worker thread. Called at interpreter exit. The logger can still be used afterwards; the next ``log`` starts a new worker."""
+        return self._request(True,timeout)
+
+    def _request(self,close,timeout):
+        if self.thread is None:
+            return True
+        if self.thread is threading.current_thread():
+            raise RuntimeError('cannot wait for the logger from the logger thread')
+        done = threading.Event()
+        self.msgqueue.put((None,(done,close)))
+        if self.thread is None: # the worker stopped in the meantime
+            self._start()
+        return done.wait(timeout)
 
     def thd_logger(self):
         while(True):
-            while(self.msgqueue.qsize() > 0):
-                q = self.msgqueue.get()
-                logfile = open(q[1],'a+')
-                logfile.write(q[0] + '\n')
-                logfile.close()
-            sleep(0.1)
+            timeout = None
+            if self.pending_time is not None:
+                timeout = max(0,self.pending_time + self.flush_interval - time())
+            try:
+                q = self.msgqueue.get(True,timeout)
+            except queue.Empty:
+                q = None
+            requests = []
+            while q is not None: # take everything that is queued in one go
+                if q[0] is None:
+                    requests.append(q[1])
+                else:
+                    self._queue(q[0],q[1])
+                try:
+                    q = self.msgqueue.get_nowait()
+                except queue.Empty:
+                    q = None
+            if requests or self.pending_size >= self.flush_size or (self.pending_time is not None and time() - self.pending_time >= self.flush_interval):
+                self._write_pending()
+            closing = [close for (done,close) in requests if close]
+            if closing:
+                self._close_all()
+                with self.lock:
+                    self.thread = None
+            for (done,close) in requests:
+                done.set()
+            if closing:
+                if self.msgqueue.qsize() > 0: # logged while closing
+                    self._start()
+                return
+
+    def _queue(self,filename,logstring):
+        if not isinstance(logstring,str):
+            try:
+                logstring = self.formatter(logstring)
+            except Exception as e:
+                logging.warning("Could not format log record {!r}: {}".format(logstring,e))
+                return
+        lines = self.pending.get(filename)
+        if lines is None:
+            lines = self.pending[filename] = []
+        lines.append(logstring + '\n')
+        self.pending_size += len(logstring) + 1
+        if self.pending_time is None:
+            self.pending_time = time()
+
+    def _write_pending(self):
+        for (filename,lines) in self.pending.items():
+            try:
+                logfile = self._handle(filename)
+                logfile.write(''.join(lines))
+                logfile.flush()
+                if self.fsync == FSYNC_FLUSH:
+                    os.fsync(logfile.fileno())
+                self.writes += 1
+            except (IOError,OSError) as e:
+                logging.warning("Could not write {} lines to {}: {}".format(len(lines),filename,e))
+                self._close(filename)
+        self.pending = OrderedDict()
+        self.pending_size = 0
+        self.pending_time = None
+
+    def _handle(self,filename):
+        logfile = self.handles.pop(filename,None)
+        if logfile is None:
+            while len(self.handles) >= max(1,self.max_open):
+                self._close(next(iter(self.handles)))
+            logfile = open(filename,'a+')
+            self.opens += 1
+        self.handles[filename] = logfile # most recently used
+        return logfile
+
+    def _close(self,filename):
+        logfile = self.handles.pop(filename,None)
+        if logfile is None:
+            return
+        try:
+            if self.fsync == FSYNC_CLOSE:
+                logfile.flush()
+                os.fsync(logfile.fileno())
+            logfile.close()
+        except (IOError,OSError) as e:
+            logging.warning("Could not close {}: {}".format(filename,e))
+
+    def _close_all(self):
+        for filename in list(self.handles.keys()):
+            self._close(filename)
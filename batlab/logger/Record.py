@@ -0,0 +1,92 @@
+from collections import namedtuple
+
+def _text(value):
+    return str(value)
+
+def _number(value):
+    return '{:.4f}'.format(value)
+
+# The columns of a test log: header, record attribute and formatter. Records without the attribute leave the column empty.
+LOG_SCHEMA = [
+    ('Cell Name','name',_text),
+    ('Batlab SN','sn',_text),
+    ('Channel','channel',_text),
+    ('Timestamp (s)','time',_text),
+    ('Voltage (V)','voltage',_number),
+    ('Current (A)','current',_number),
+    ('Temperature (C)','temperature',_number),
+    ('Impedance (Ohm)','impedance',_number),
+    ('Energy (J)','energy',_number),
+    ('Charge (Coulombs)','charge',_number),
+    ('Test State','state',_text),
+    ('Test Type','test_type',_text),
+    ('Charge Capacity (Coulombs)','charge_capacity',_number),
+    ('Energy Capacity (J)','energy_capacity',_number),
+    ('Avg Impedance (Ohm)','avg_impedance',_number),
+    ('delta Temperature (C)','delta_temperature',_number),
+    ('Avg Current (A)','avg_current',_number),
+    ('Avg Voltage','avg_voltage',_number),
+    ('Runtime (s)','runtime',_text),
+    ('VCC (V)','vcc',_number),
+    ('Setpoint','setpoint',_text),
+    ('Target Setpoint','target',_text),
+    ('Duty','duty',_text),
+]
+LOG_HEADER = ','.join([column[0] for column in LOG_SCHEMA])
+
+def csvline(record):
+    """Formats a record as a line of a test log, with the columns of ``LOG_SCHEMA``."""
+    fields = []
+    for (header,attr,fmt) in LOG_SCHEMA:
+        value = getattr(record,attr,None)
+        fields.append('' if value is None else fmt(value))
+    return ','.join(fields)
+
+class Level1Record(namedtuple('Level1Record',['name','sn','channel','time','voltage','current','temperature','impedance','energy','charge','state','vcc','setpoint','target','duty'])):
+    """One 'level 1' sample of a running test, logged every reporting period.
+
+    Attributes:
+        name: Name of the cell
+        sn: Serial number of the Batlab
+        channel: Slot of the cell in the Batlab
+        time: ``datetime`` of the sample
+        voltage: Volts
+        current: Amps
+        temperature: Degrees C
+        impedance: Ohms, or None if no impedance measurement was made with the sample
+        energy: Joules since the last 'level 2' record
+        charge: Coulombs since the last 'level 2' record
+        state: Test state, e.g. 'TS_CHARGE'
+        vcc: Batlab supply voltage in Volts
+        setpoint: CURRENT_SETPOINT written by the software current control loop
+        target: Current setpoint of the test, in the units of CURRENT_SETPOINT
+        duty: DUTY register, or None if it was not read
+    """
+    __slots__ = ()
+
+    def csv(self):
+        """The record as a line of a test log. See ``csvline``."""
+        return csvline(self)
+
+class Level2Record(namedtuple('Level2Record',['name','sn','channel','time','test_type','charge_capacity','energy_capacity','avg_impedance','delta_temperature','avg_current','avg_voltage','runtime'])):
+    """The 'level 2' summary of one part of a test, e.g. a charge or a discharge.
+
+    Attributes:
+        name: Name of the cell
+        sn: Serial number of the Batlab
+        channel: Slot of the cell in the Batlab
+        time: ``datetime`` the part ended
+        test_type: What was summarized, e.g. 'CHARGE'
+        charge_capacity: Coulombs
+        energy_capacity: Joules
+        avg_impedance: Ohms
+        delta_temperature: Temperature rise in degrees C
+        avg_current: Amps
+        avg_voltage: Volts
+        runtime: Seconds since the last 'level 2' record
+    """
+    __slots__ = ()
+
+    def csv(self):
+        """The record as a line of a test log. See ``csvline``."""
+        return csvline(self)
@@ -1 +1,2 @@
-from .Logger import Logger
+from .Logger import Logger, FSYNC_NEVER, FSYNC_FLUSH, FSYNC_CLOSE
+from .Record import Level1Record, Level2Record, LOG_SCHEMA, LOG_HEADER, csvline
@@ -1,57 +1,48 @@
 import logging
 import math
 from batlab.constants import *
+import batlab.thermistor
 
 class Packet:
     """Holds information related to USB packets.
     
     The ``packet`` class contains a command response packet from a Batlab. Information from a batlab register read is returned to the user in a ``packet`` instance. The various methods of the packet instance allow the user to decode the raw register data into useable information.
 
+    Packets are created for every register access and every stream sample, so they use ``__slots__`` and are never changed by the decode methods. ``ResponsePacket`` and ``StreamPacket`` are the two kinds the parser produces; the ``type`` attribute tells them apart. It starts out as the ``TYPE`` of the class and can be reassigned like before.
+
     Attributes:
         valid: Bool describing if data in the packet can be trusted
-        timestamp: Time message was received
+        timestamp: Time message was received, as returned by ``time.time()``
         namespace: Namespace of the register's data this packet contains
         addr: Register address
         data: Raw register packet data (int16)
         write: True if this response packet was for a register write
+        type: 'RESPONSE' or 'STREAM'
     """
-    def __init__(self):
-        self.valid = True
-        self.timestamp = None
-        self.namespace = None
-        self.type = None
-        self.addr = None
-        self.data = None
-        self.mode = None
-        self.status = None
-        self.temp = None
-        self.voltage = None
-        self.current = None
-        self.write = None
-        self.R = [1500,1500,1500,1500]
-        self.B = [3380,3380,3380,3380]
-    def set_temps(Rlist,Blist):
-        """Deprecated."""
-        for i in range(0,4):
-            self.R[i] = Rlist[i]
-            self.B[i] = Blist[i]
-            
+    __slots__ = ('valid','timestamp','namespace','addr','data','write','type')
+    TYPE = None
+
+    def __init__(self,namespace=None,addr=None,data=None,write=None,valid=True,timestamp=None):
+        self.valid = valid
+        self.timestamp = timestamp
+        self.namespace = namespace
+        self.addr = addr
+        self.data = data
+        self.write = write
+        self.type = self.TYPE
+
     def value(self):
         """Returns the raw data if the packet is a response packet, or a list of data pieces if the packet is an extended response packet."""
-        if(self.type == 'RESPONSE'):
-            return self.data
-        else:
-            li = [self.mode,self.status,self.temp,self.current,self.voltage]
-            return li
-        
+        return self.data
+
     def asvoltage(self):
         """Represents voltage ``data`` as a floating point voltage."""
         if(math.isnan(self.data)):
             return float(('nan'))
-        if(self.data & 0x8000): # the voltage can be negative
-            self.data = -0x10000 + self.data
-        flt = float(self.data * 4.5 / 2**15)
-        return flt
+        data = self.data
+        if(data & 0x8000): # the voltage can be negative
+            data = -0x10000 + data
+        return float(data * 4.5 / 2**15)
     
     def asvcc(self):
         """Represents vss ``data`` as a floating point voltage."""
@@ -89,20 +80,6 @@ class Packet:
                 return ERR_LIST[i]
         return 'ERR_NONE'
     
-    def astemperature(self):
-        try:
-            Rdiv = self.R[self.namespace]
-            R = Rdiv / ((2**15 / self.data)-1)
-            To = 25 + 273.15
-            Ro = 10000
-            B = self.B[self.namespace] # 3380
-            Tinv = (1 / To) + (math.log(R/Ro) / B)
-            T = (1 / Tinv) - 273.15
-            T = (T * 1.8) + 32
-        except:
-            T = float('nan')
-        return T
-    
     def astemperature(self,Rlist,Blist):
         """Represents temp data as temperature in F.
 
@@ -110,19 +87,7 @@ class Packet:
             Rlist: 4 list of 'R' calibration values needed to interpret temp
             Blist: 4 list of 'B' calibration values needed to interpret temp
         """
-        try:
-            Rdiv = Rlist[self.namespace]
-            R = Rdiv / ((2**15 / self.data)-1)
-            To = 25 + 273.15
-            Ro = 10000
-            B = Blist[self.namespace] # 3380
-            Tinv = (1 / To) + (math.log(R/Ro) / B)
-            T = (1 / Tinv) - 273.15
-            T = (T * 1.8) + 32
-        
-        except:
-            T = float('nan')
-        return T
+        return batlab.thermistor.table(Rlist[self.namespace],Blist[self.namespace]).fahrenheit(self.data)
     
     def astemperature_c(self,Rlist,Blist):
         """Represents temp data as temperature in C.
@@ -131,25 +96,16 @@ class Packet:
             Rlist: 4 list of 'R' calibration values needed to interpret temp
             Blist: 4 list of 'B' calibration values needed to interpret temp
         """
-        try:
-            Rdiv = Rlist[self.namespace]
-            R = Rdiv / ((2**15 / self.data)-1)
-            To = 25 + 273.15
-            Ro = 10000
-            B = Blist[self.namespace] # 3380
-            Tinv = (1 / To) + (math.log(R/Ro) / B)
-            T = (1 / Tinv) - 273.15
-        except:
-            T = float('nan')
-        return T
+        return batlab.thermistor.table(Rlist[self.namespace],Blist[self.namespace]).celsius(self.data)
     
     def ascurrent(self):
+        """Represents current measurement as float current in Amps."""
         if(math.isnan(self.data)):
             return float(('nan'))
-        """Represents current measurement as float current in Amps."""
-        if(self.data & 0x8000): # the current can be negative
-            self.data = -0x10000 + self.data
-        return self.data * 4.096 / 2**15
+        data = self.data
+        if(data & 0x8000): # the current can be negative
+            data = -0x10000 + data
+        return data * 4.096 / 2**15
     
     def print_packet(self):
         if(self.type == 'RESPONSE'):
@@ -165,3 +121,37 @@ class Packet:
                 print('Wrote: Cell '+str(self.namespace)+', Addr '+"{0:#4X}".format(self.addr & 0x7F))
             else:
                 print('Read: Cell '+str(self.namespace)+', Addr '+"{0:#4X}".format(self.addr & 0x7F)+': '+str(self.data))
+
+class ResponsePacket(Packet):
+    """Response to a register read or write."""
+    __slots__ = ()
+    TYPE = 'RESPONSE'
+
+class StreamPacket(Packet):
+    """Extended response (stream) packet, sent by a cell on its own every REPORT_INTERVAL.
+
+    Attributes:
+        mode: Raw MODE register value
+        status: Raw STATUS register value
+        temp: Raw TEMPERATURE register value
+        current: Raw CURRENT register value
+        voltage: Raw VOLTAGE register value
+    """
+    __slots__ = ('mode','status','temp','current','voltage')
+    TYPE = 'STREAM'
+
+    def __init__(self,namespace,mode,status,temp,current,voltage,timestamp=None):
+        Packet.__init__(self,namespace,timestamp=timestamp)
+        self.mode = mode
+        self.status = status
+        self.temp = temp
+        self.current = current
+        self.voltage = voltage
+
+    def value(self):
+        """Returns the list of data pieces of the stream packet."""
+        return [self.mode,self.status,self.temp,self.current,self.voltage]
+
+    def field(self,name):
+        """Returns one field of a stream packet (``'mode'``, ``'status'``, ``'temp'``, ``'current'`` or ``'voltage'``) as a response packet, so the usual decode methods such as ``asvoltage`` can be applied to it."""
+        return ResponsePacket(self.namespace,None,getattr(self,name),timestamp=self.timestamp)
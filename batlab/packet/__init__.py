@@ -1 +1 @@
-from .Packet import Packet
+from .Packet import Packet, ResponsePacket, StreamPacket
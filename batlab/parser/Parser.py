@@ -0,0 +1,96 @@
+import struct
+from time import time
+
+import batlab.packet
+from batlab.constants import *
+
+class Parser:
+    """Splits the byte stream coming from a Batlab into packets.
+
+    The receiver thread hands the parser whatever the serial port has buffered, in chunks of any size. Bytes are appended to one reusable ``bytearray`` and complete frames are decoded in place. Response frames are 5 bytes long (0xAA, namespace, w/~r + addr, data low, data high) and stream frames are 13 bytes long (0xAF, namespace, 0x00, mode, status, temperature, current, voltage as little-endian words). Bytes that cannot start a valid frame are skipped one at a time until the parser lines up with a start code again, and are counted in ``dropped`` instead of being logged one by one.
+
+    Attributes:
+        dropped: Number of bytes discarded while resynchronizing
+        responses: Number of response frames decoded
+        streams: Number of stream frames decoded
+    """
+    RESPONSE_LEN = 5
+    STREAM_LEN = 13
+
+    def __init__(self,size=4096):
+        self.buf = bytearray(size)
+        self.start = 0 # first unparsed byte
+        self.end = 0 # one past the last received byte
+        self.dropped = 0
+        self.responses = 0
+        self.streams = 0
+
+    def reset(self):
+        """Discards any partial frame held in the buffer."""
+        self.start = 0
+        self.end = 0
+
+    def feed(self,data):
+        """Appends received bytes to the buffer and decodes every complete frame.
+
+        Returns:
+            A list of ``packet`` instances in the order they were received.
+        """
+        n = len(data)
+        if self.end + n > len(self.buf):
+            pending = self.end - self.start
+            self.buf[0:pending] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = pending
+            if self.end + n > len(self.buf):
+                self.buf.extend(bytes(self.end + n - len(self.buf)))
+        self.buf[self.end:self.end + n] = data
+        self.end += n
+        return self.parse()
+
+    def parse(self):
+        packets = []
+        buf = self.buf
+        i = self.start
+        end = self.end
+        now = None
+        while i < end:
+            byte = buf[i]
+            if byte == 0xAA: #Command Response Byte 1: 0xAA
+                if end - i < self.RESPONSE_LEN:
+                    break
+                namespace,addr,data = struct.unpack_from('<BBH',buf,i + 1)
+                if namespace not in NAMESPACE_LIST:
+                    i += 1
+                    self.dropped += 1
+                    continue
+                if now is None:
+                    now = time()
+                #Command Response Byte 3:  w/~r + addr, then the data payload
+                packets.append(batlab.packet.ResponsePacket(namespace,addr & 0x7F,data,True if addr & 0x80 else None,timestamp=now))
+                self.responses += 1
+                i += self.RESPONSE_LEN
+            elif byte == 0xAF: #stream packet Byte 1: 0xAF
+                if end - i < self.STREAM_LEN:
+                    break
+                namespace,kind,mode,status,temp,current,voltage = struct.unpack_from('<BBHHHHH',buf,i + 1)
+                if namespace > CELL3 or kind != 0:
+                    i += 1
+                    self.dropped += 1
+                    continue
+                if now is None:
+                    now = time()
+                packets.append(batlab.packet.StreamPacket(namespace,mode,status,temp,current,voltage,now))
+                self.streams += 1
+                i += self.STREAM_LEN
+            else: # not a start code - skip ahead to the next one
+                aa = buf.find(b'\xaa',i,end)
+                af = buf.find(b'\xaf',i,end)
+                nxt = min([x for x in (aa,af) if x >= 0] or [end])
+                self.dropped += nxt - i
+                i = nxt
+        if i == end:
+            i = end = 0 # buffer fully consumed, start over at the front
+        self.start = i
+        self.end = end
+        return packets
@@ -0,0 +1 @@
+from .Parser import Parser
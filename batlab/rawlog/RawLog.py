@@ -0,0 +1,156 @@
+from batlab.constants import *
+import batlab.logger
+import batlab.packet
+import batlab.thermistor
+
+from collections import namedtuple
+import datetime
+import math
+
+RAW_FIELDS = ['name','sn','channel','time','state','mode','voltage','current','temperature','charge','settings','vcc','current_pp','voltage_pp','setpoint','target','duty','R','B']
+RAW_HEADER = ','.join(RAW_FIELDS)
+TEXT_FIELDS = ['name','state']
+
+def rawline(values):
+    """Formats one raw log row. ``values`` are in the order of ``RAW_FIELDS``. None and NaN (failed reads) are written as empty fields."""
+    return ','.join(['' if (x is None or x != x) else str(x) for x in values])
+
+def _parse(field,text):
+    if field in TEXT_FIELDS:
+        return text
+    if text == '':
+        return None
+    if field == 'time':
+        return float(text)
+    return int(text)
+
+class RawRecord(namedtuple('RawRecord',RAW_FIELDS)):
+    """One sample of a raw log, as written by a ``Channel`` with the ``rawLogging`` setting enabled.
+
+    The measurements are the register values exactly as they were read from the Batlab, together with the calibration constants of the cell, so nothing is lost to rounding. The ``as*`` methods decode them into engineering units the same way ``Packet`` does, only when they are asked for. Fields that were not read are None, and decode to NaN.
+
+    Attributes:
+        name: Name of the cell
+        sn: Serial number of the Batlab
+        channel: Slot of the cell in the Batlab
+        time: Time of the sample, in seconds since the epoch
+        state: Test state, e.g. 'TS_CHARGE'
+        mode: MODE register
+        voltage: VOLTAGE register
+        current: CURRENT register
+        temperature: TEMPERATURE register
+        charge: Charge counter, CHARGEH * 65536 + CHARGEL
+        settings: UNIT SETTINGS register, which sets the resolution of the charge counter
+        vcc: UNIT VCC register
+        current_pp: CURRENT_PP register, if an impedance measurement was logged with the sample
+        voltage_pp: VOLTAGE_PP register, if an impedance measurement was logged with the sample
+        setpoint: CURRENT_SETPOINT written by the software current control loop
+        target: Current setpoint of the test, in the units of CURRENT_SETPOINT
+        duty: DUTY register
+        R: TEMP_CALIB_R constant of the cell
+        B: TEMP_CALIB_B constant of the cell
+    """
+    __slots__ = ()
+
+    def _decoded(self,field,method):
+        data = getattr(self,field)
+        if data is None:
+            return float('nan')
+        return getattr(batlab.packet.ResponsePacket(self.channel,None,data),method)()
+
+    def csv(self):
+        """The record as a line of a raw log. See ``rawline``."""
+        return rawline(self)
+
+    def timestamp(self):
+        """Time of the sample as a ``datetime``."""
+        return datetime.datetime.fromtimestamp(self.time)
+
+    def asvoltage(self):
+        """Cell voltage in Volts."""
+        return self._decoded('voltage','asvoltage')
+
+    def ascurrent(self):
+        """Cell current in Amps."""
+        return self._decoded('current','ascurrent')
+
+    def asvcc(self):
+        """Batlab supply voltage in Volts."""
+        return self._decoded('vcc','asvcc')
+
+    def assetpoint(self):
+        """Current setpoint written by the control loop, in Amps."""
+        return self._decoded('setpoint','assetpoint')
+
+    def astemperature_c(self):
+        """Cell temperature in degrees C."""
+        if self.temperature is None or self.R is None or self.B is None:
+            return float('nan')
+        return batlab.thermistor.table(self.R,self.B).celsius(self.temperature)
+
+    def astemperature(self):
+        """Cell temperature in degrees F."""
+        return self.astemperature_c() * 1.8 + 32
+
+    def ascharge(self):
+        """Charge in Coulombs. See ``Batlab.charge``."""
+        if self.charge is None:
+            return float('nan')
+        multiplier = 6.0
+        if self.settings is not None and self.settings & SET_CH0_HI_RES:
+            multiplier = 1.0
+        return (multiplier * self.charge / 2**15) * 4.096 / 9.765625
+
+    def asimpedance(self):
+        """Impedance in Ohms, NaN if the sample has no impedance measurement."""
+        vmag = self._decoded('voltage_pp','asvoltage')
+        imag = self._decoded('current_pp','ascurrent')
+        if math.isnan(vmag) or math.isnan(imag):
+            return float('nan')
+        if imag < 0.000001:
+            return 0
+        return vmag / imag
+
+def read(filename):
+    """Reads a raw log file.
+
+    Args:
+        filename: Raw log file. Header lines and anything else that is not a raw sample are skipped.
+
+    Yields:
+        A ``RawRecord`` for every sample in the file, in order. The values are decoded lazily by the record methods.
+    """
+    with open(filename,'r') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split(',')
+            if len(fields) != len(RAW_FIELDS):
+                continue
+            try:
+                yield RawRecord(*[_parse(field,text) for (field,text) in zip(RAW_FIELDS,fields)])
+            except ValueError: # the header, or a line of something else
+                continue
+
+def export(rawfile,logfile):
+    """Decodes a raw log into a log file in the regular format, with one 'level 1' line per sample.
+
+    Energy is not stored in the raw log. It is estimated as the charge times the average of the logged voltages since the test state last changed, which is what the test manager does with every sample it takes.
+
+    Args:
+        rawfile: Raw log file to read
+        logfile: File to write the decoded log to. The lines are appended, after a header line.
+    """
+    averages = dict() # (sn,channel) -> [state,number of voltages,average voltage]
+    with open(logfile,'a+') as out:
+        out.write(batlab.logger.LOG_HEADER + '\n')
+        for r in read(rawfile):
+            v = r.asvoltage()
+            q = r.ascharge()
+            avg = averages.get((r.sn,r.channel))
+            if avg is None or avg[0] != r.state:
+                avg = averages[(r.sn,r.channel)] = [r.state,0,0.0]
+            if not math.isnan(v):
+                avg[1] += 1
+                avg[2] += (v - avg[2]) / avg[1]
+            z = r.asimpedance() if r.current_pp is not None else None
+            record = batlab.logger.Level1Record(r.name,r.sn,r.channel,r.timestamp(),v,r.ascurrent(),r.astemperature_c(),z,q * avg[2],q,r.state,r.asvcc(),r.setpoint,r.target,r.duty)
+            out.write(record.csv() + '\n')
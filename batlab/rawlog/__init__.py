@@ -0,0 +1 @@
+from .RawLog import RawRecord, RAW_FIELDS, RAW_HEADER, rawline, read, export
@@ -0,0 +1,221 @@
+import concurrent.futures
+import collections
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import traceback
+from time import time
+
+class Reactor:
+    """Drives many Batlabs from one thread.
+
+    Without a reactor every ``Batlab`` runs its own receiver thread and every ``Channel`` runs its own test thread, so a pool of 40 Batlabs needs 200 threads. A ``Reactor`` instead watches the serial ports of all of its Batlabs with one selector (epoll on Linux) and keeps their transaction engines ticking from the same thread. Channel test steps run as timers on the reactor and are handed to a small shared pool of worker threads, since a step blocks on register reads that the reactor thread itself has to answer.
+
+    Pass the reactor to ``Batlab`` (or ``Batpool``) on creation. Ports that cannot be watched by a selector, such as serial ports on Windows, fall back to a receiver thread.
+
+    Attributes:
+        workers: Number of worker threads that run channel test steps
+        tick: Seconds between checks for overdue register transactions
+        steps: Number of channel test steps run so far
+        late: Running average of how late channel steps start compared to their timers, in seconds
+    """
+    def __init__(self,workers=8,tick=0.025):
+        self.workers = workers
+        self.tick = tick
+        self.steps = 0
+        self.late = 0.0
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r,selectors.EVENT_READ,None)
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.calls = collections.deque() # Calls queued for the reactor thread
+        self.timers = [] # Heap of [when, seq, fn, args]; fn is None once cancelled
+        self.seq = itertools.count()
+        self.batlabs = dict() # Batlabs by serial port file descriptor
+        self.parked = dict() # Streaming channels waiting for their next stream packet, with their timeout timers
+        self.quitevt = threading.Event()
+        self.thread = threading.Thread(target=self.thd_reactor)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def in_reactor(self):
+        """True if called from the reactor thread."""
+        return threading.current_thread() is self.thread
+
+    def call_soon(self,fn,*args):
+        """Runs ``fn(*args)`` on the reactor thread. May be called from any thread."""
+        with self.lock:
+            self.calls.append((fn,args))
+        if not self.in_reactor():
+            try:
+                self.wakeup_w.send(b'\0')
+            except OSError:
+                pass # the wakeup socket is already full, so the reactor is awake anyway
+
+    def call_later(self,delay,fn,*args):
+        """Runs ``fn(*args)`` on the reactor thread after ``delay`` seconds. Must be called from the reactor thread.
+
+        Returns:
+            A timer handle that can be passed to ``cancel``.
+        """
+        timer = [time() + delay,next(self.seq),fn,args]
+        heapq.heappush(self.timers,timer)
+        return timer
+
+    def cancel(self,timer):
+        timer[2] = None
+
+    def stop(self):
+        """Stops the reactor thread and the worker pool. Batlabs still attached stop receiving."""
+        self.quitevt.set()
+        self.call_soon(lambda: None)
+        if not self.in_reactor():
+            self.thread.join(1.0)
+        self.pool.shutdown(wait=False)
+        if not self.thread.is_alive():
+            self.selector.close()
+            self.wakeup_r.close()
+            self.wakeup_w.close()
+
+    # Batlabs
+    def add_batlab(self,bat):
+        """Starts watching the serial port of ``bat``.
+
+        Returns:
+            False if the port cannot be watched by the selector. The Batlab then has to run its own receiver thread.
+        """
+        try:
+            fd = bat.ser.fileno()
+        except Exception: # e.g. serial ports on Windows have no file descriptor
+            return False
+        self.call_soon(self._register,bat,fd)
+        return True
+
+    def remove_batlab(self,bat):
+        """Stops watching the serial port of ``bat`` and fails its outstanding transactions. Waits for the reactor thread unless called from it."""
+        done = threading.Event()
+        self.call_soon(self._unregister,bat,done)
+        if not self.in_reactor():
+            done.wait(1.0)
+
+    def _register(self,bat,fd):
+        self.batlabs[fd] = bat
+        self.selector.register(fd,selectors.EVENT_READ,bat)
+
+    def _unregister(self,bat,done=None):
+        for fd in [fd for fd,b in self.batlabs.items() if b is bat]:
+            del self.batlabs[fd]
+            try:
+                self.selector.unregister(fd)
+            except (KeyError,ValueError,OSError):
+                pass
+        for key in [key for key in self.parked if key[0] is bat]:
+            ch,timer = self.parked.pop(key)
+            self.cancel(timer)
+        bat._abort()
+        if done is not None:
+            done.set()
+
+    def _readable(self,bat):
+        try:
+            data = bat.ser.read(max(1,bat.ser.in_waiting))
+        except Exception:
+            data = b''
+        if not data: # readable but nothing to read - the port went away
+            logging.warning("Batlab on " + str(bat.port) + " stopped responding")
+            self._unregister(bat)
+            return
+        bat.receive(data)
+
+    # Channels
+    def add_channel(self,ch):
+        """Runs the test steps of channel ``ch`` on the reactor instead of in a thread of its own."""
+        self.call_soon(self._dispatch,ch,time())
+
+    def stream_arrived(self,bat,cell):
+        """Wakes the channel parked on ``cell`` of ``bat``. Called by ``Batlab`` for every stream packet."""
+        if not self.in_reactor():
+            self.call_soon(self.stream_arrived,bat,cell)
+            return
+        parked = self.parked.pop((bat,cell),None)
+        if parked is not None:
+            ch,timer = parked
+            self.cancel(timer)
+            self._dispatch(ch,time())
+
+    def _dispatch(self,ch,due):
+        if ch.killevt.is_set() or self.quitevt.is_set():
+            return
+        self.late += ((time() - due) - self.late) / 64.0
+        self.pool.submit(self._step,ch)
+
+    def _step(self,ch):
+        try:
+            delay = ch.step()
+        except Exception:
+            traceback.print_exc()
+            delay = 2
+        self.call_soon(self._reschedule,ch,delay)
+
+    def _reschedule(self,ch,delay):
+        self.steps += 1
+        if delay is not None:
+            self.call_later(delay,self._dispatch,ch,time() + delay)
+            return
+        # streaming - run again as soon as the next stream packet arrives, or after a second without one
+        if ch.bat.stream_received[ch.slot] > ch.stream_seen:
+            self._dispatch(ch,time())
+            return
+        key = (ch.bat,ch.slot)
+        self.parked[key] = (ch,self.call_later(1.0,self._unpark,key))
+
+    def _unpark(self,key):
+        parked = self.parked.pop(key,None)
+        if parked is not None:
+            self._dispatch(parked[0],time())
+
+    # Reactor thread - waits on every serial port at once and runs the timers
+    def thd_reactor(self):
+        next_tick = time()
+        while not self.quitevt.is_set():
+            try:
+                now = time()
+                timeout = next_tick - now
+                while self.timers and self.timers[0][2] is None:
+                    heapq.heappop(self.timers)
+                if self.timers:
+                    timeout = min(timeout,self.timers[0][0] - now)
+                with self.lock:
+                    if self.calls:
+                        timeout = 0
+                for key,events in self.selector.select(max(0,timeout)):
+                    if key.data is None:
+                        try:
+                            self.wakeup_r.recv(4096)
+                        except OSError:
+                            pass
+                    else:
+                        self._readable(key.data)
+                with self.lock:
+                    calls = list(self.calls)
+                    self.calls.clear()
+                for fn,args in calls:
+                    fn(*args)
+                now = time()
+                while self.timers and self.timers[0][0] <= now:
+                    when,seq,fn,args = heapq.heappop(self.timers)
+                    if fn is not None:
+                        fn(*args)
+                if now >= next_tick:
+                    for bat in list(self.batlabs.values()):
+                        bat.expire()
+                    next_tick = now + self.tick
+            except Exception:
+                logging.info('Exception on Reactor...Continuing')
+                traceback.print_exc()
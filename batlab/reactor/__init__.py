@@ -0,0 +1 @@
+from .Reactor import Reactor
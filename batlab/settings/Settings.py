@@ -30,6 +30,9 @@ class Settings:
         sineWaveMagnitude
         storageDischarge: Boolean
         storageDischargeVoltage: Volts
+        streamEnable: Boolean, sample cells from stream packets instead of polling registers
+        streamReportInterval: Value written to the cell REPORT_INTERVAL register while streaming
+        rawLogging: Boolean, log the raw register values and calibration constants of each sample to a separate raw log instead of decoded values. See ``batlab.rawlog``.
 
     """
     
@@ -75,10 +78,14 @@ class Settings:
         self.constant_voltage_sensitivity   = 1
         self.constant_voltage_stepsize      = 8
         self.constant_voltage_discharge_enable = False
+        self.stream_enable                  = False
+        self.stream_report_interval         = 1
+        self.raw_logging                    = False
 
         self.flag_ignore_safety_limits = False
         self.logfile = 'batlab-log_' + self.cell_playlist_name + '.csv'
         self.cell_logfile = 'batlab-log_' + self.cell_playlist_name + '_'
+        self.raw_logfile = 'batlab-log_' + self.cell_playlist_name + '_raw.csv'
 
     def check(self, key, value, minval ,maxval, variable):
         if self.flag_ignore_safety_limits == True:
@@ -180,9 +187,16 @@ class Settings:
                 self.constant_voltage_sensitivity = value
             if key == "constantVoltageDischargeEnable": 
                 self.constant_voltage_discharge_enable = value
+            if key == "streamEnable":
+                self.stream_enable = value
+            if key == "streamReportInterval":
+                self.stream_report_interval = value
+            if key == "rawLogging":
+                self.raw_logging = value
 
         self.logfile = 'batlab-log_' + self.cell_playlist_name + '.csv'
         self.cell_logfile = 'batlab-log_' + self.cell_playlist_name + '_'
+        self.raw_logfile = 'batlab-log_' + self.cell_playlist_name + '_raw.csv'
         self.view()
 
     def view(self):
@@ -224,3 +238,6 @@ class Settings:
         print("pulseChrgOffTime               :",self.pulse_charge_off_time          )
         print("pulseDischrgOffRate            :",self.pulse_discharge_off_rate       )
         print("individualCellLogs             :",self.individual_cell_logs           )
+        print("streamEnable                   :",self.stream_enable                  )
+        print("streamReportInterval           :",self.stream_report_interval         )
+        print("rawLogging                     :",self.raw_logging                    )
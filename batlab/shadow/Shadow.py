@@ -0,0 +1,104 @@
+from batlab.constants import *
+import batlab.packet
+
+import threading
+from time import time
+
+FOREVER = None
+
+# Calibration constants and unit identity - only change if we write them ourselves
+STATIC_CELL = [CURRENT_CALIB_OFF,CURRENT_CALIB_SCA,TEMP_CALIB_R,TEMP_CALIB_B,CURRENT_CALIB_PP,VOLTAGE_CALIB_PP,CURR_CALIB_PP_OFF,VOLT_CALIB_PP_OFF,CURR_LOWV_SCA,CURR_LOWV_OFF,CURR_LOWV_OFF_SCA]
+STATIC_UNIT = [SERIAL_NUM,DEVICE_ID,FIRMWARE_VER,VOLT_CH_CALIB_OFF,VOLT_CH_CALIB_SCA,VOLT_DC_CALIB_OFF,VOLT_DC_CALIB_SCA]
+# Test configuration - the firmware never changes these on its own, so they hold until written
+CONFIG_CELL = [REPORT_INTERVAL,VOLTAGE_LIMIT_CHG,VOLTAGE_LIMIT_DCHG,CURRENT_LIMIT_CHG,CURRENT_LIMIT_DCHG,TEMP_LIMIT_CHG,TEMP_LIMIT_DCHG]
+CONFIG_UNIT = [SETTINGS,SINE_FREQ,SINE_OFFSET,SINE_MAGDIV,ZERO_AMP_THRESH]
+
+class Shadow:
+    """Remembers the last value read from or written to each Batlab register, so that repeated reads and redundant writes do not have to go over the serial link.
+
+    Each register has a time-to-live in ``ttl``. Calibration constants and configuration registers (settings, limits, report interval) are kept until they are written; the entry is then replaced by the value the Batlab echoes back for the write, if the echo matches the value that was written. Any other echo leaves the register unknown until it is read. Registers without a ``ttl`` entry, such as the measurements, mode and current setpoint, are never cached.
+
+    Attributes:
+        ttl: Dictionary of seconds to keep each (namespace, addr) register, or ``FOREVER``. Change it with ``set_ttl``.
+        hits: Number of register reads answered from the shadow
+        skipped_writes: Number of register writes skipped because the register already held the value
+    """
+    def __init__(self):
+        self.ttl = dict()
+        for cell in [CELL0,CELL1,CELL2,CELL3]:
+            for addr in STATIC_CELL + CONFIG_CELL:
+                self.ttl[(cell,addr)] = FOREVER
+        for addr in STATIC_UNIT + CONFIG_UNIT:
+            self.ttl[(UNIT,addr)] = FOREVER
+        self.values = dict() # (value, time stored) by (namespace, addr)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.skipped_writes = 0
+
+    def set_ttl(self,namespace,addr,ttl):
+        """Sets how long register ``addr`` in ``namespace`` is kept: seconds, ``FOREVER``, or 0 to never cache it."""
+        with self.lock:
+            if ttl == 0:
+                self.ttl.pop((namespace,addr),None)
+                self.values.pop((namespace,addr),None)
+            else:
+                self.ttl[(namespace,addr)] = ttl
+
+    def _lookup(self,namespace,addr):
+        key = (namespace,addr)
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        ttl = self.ttl.get(key,0)
+        if ttl is not FOREVER and time() - entry[1] >= ttl:
+            del self.values[key]
+            return None
+        return entry[0]
+
+    def get(self,namespace,addr,write=False):
+        """Returns a response packet holding the shadowed value of a register, or None if it has to be read from the Batlab. With ``write`` the packet stands in for the echo of a skipped write."""
+        with self.lock:
+            value = self._lookup(namespace,addr)
+            if value is None:
+                return None
+            if not write:
+                self.hits += 1
+        return batlab.packet.ResponsePacket(namespace,addr,value,write)
+
+    def holds(self,namespace,addr,value):
+        """True if the register is known to hold ``value`` already. Counts the write that is skipped because of it."""
+        with self.lock:
+            if self._lookup(namespace,addr) != (value & 0xFFFF):
+                return False
+            self.skipped_writes += 1
+            return True
+
+    def update(self,p,written=None):
+        """Stores the value of a valid response packet, from a read or from the echo of a write.
+
+        Args:
+            p: Response packet
+            written: Value that was written, for the echo of a write. Echoes that do not match it (or that come without it) are not stored.
+        """
+        if not p.valid:
+            return
+        if p.write and (written is None or p.data != (written & 0xFFFF)):
+            return
+        self.store(p.namespace,p.addr,p.data)
+
+    def store(self,namespace,addr,value):
+        """Stores a register value known from elsewhere, e.g. a ``DeviceCache`` entry."""
+        key = (namespace,addr)
+        if key in self.ttl:
+            with self.lock:
+                self.values[key] = (value & 0xFFFF,time())
+
+    def invalidate(self,namespace,addr):
+        """Forgets a register, e.g. while a write to it is in flight."""
+        with self.lock:
+            self.values.pop((namespace,addr),None)
+
+    def clear(self):
+        """Forgets every register, e.g. when the Batlab reboots."""
+        with self.lock:
+            self.values.clear()
@@ -0,0 +1 @@
+from .Shadow import Shadow, FOREVER
@@ -0,0 +1,405 @@
+import collections
+import math
+import random
+import struct
+import threading
+from time import monotonic
+
+import batlab.encoder
+import batlab.packet
+from batlab.constants import *
+
+class SimulatedCell:
+    """Simple electrical and thermal model of one cell sitting in a simulated Batlab slot.
+
+    The open circuit voltage follows the state of charge, the terminal voltage adds the I*R drop, and the cell warms up with I^2*R losses and cools back towards ambient. The impedance reported for the sine measurement falls off with frequency like a simple R + R_ct model.
+
+    Attributes:
+        present: False to simulate an empty slot (MODE reads MODE_NO_CELL)
+        capacity: Capacity in Coulombs
+        soc: State of charge from 0.0 to 1.0
+        resistance: Ohmic resistance in Ohms
+        charge_transfer: Additional low-frequency resistance in Ohms
+        temperature: Cell temperature in C
+        ambient: Ambient temperature in C
+        mode: Current MODE register value
+        setpoint: Current CURRENT_SETPOINT register value
+        current: Signed current in Amps, positive while charging
+        charge: Coulombs counted since CHARGEH was last cleared
+    """
+    def __init__(self,present=True,capacity=9000.0,soc=0.5,resistance=0.05,charge_transfer=0.03,ambient=25.0):
+        self.present = present
+        self.capacity = capacity
+        self.soc = soc
+        self.resistance = resistance
+        self.charge_transfer = charge_transfer
+        self.ambient = ambient
+        self.temperature = ambient
+        self.mode = MODE_IDLE if present else MODE_NO_CELL
+        self.setpoint = 256
+        self.current = 0.0
+        self.charge = 0.0
+        self.error = 0
+        self.status = 0
+        self.impedance_since = None
+
+    def ocv(self):
+        """Open circuit voltage for the present state of charge."""
+        return 3.0 + 1.2 * self.soc - 0.6 * math.exp(-20.0 * self.soc)
+
+    def voltage(self):
+        if not self.present:
+            return 0.0
+        return self.ocv() + self.current * self.resistance
+
+    def impedance(self,freq):
+        """Impedance magnitude in Ohms at the sine frequency ``freq`` in Hz."""
+        return self.resistance + self.charge_transfer / math.sqrt(1.0 + (freq / 100.0) ** 2)
+
+class Simulator:
+    """Software model of a Batlab that speaks the real serial protocol.
+
+    The simulator decodes the 5-byte 0xAA command frames, answers them from the register map in ``batlab.constants`` and emits 0xAF stream packets for cells whose REPORT_INTERVAL register is set. Cell behaviour comes from ``SimulatedCell``: charge and discharge stop at the VOLTAGE_LIMIT_* and TEMP_LIMIT_* registers, the charge registers count Coulombs, the LOCK register latches the measurement registers, and the watchdog stops current flow if it is enabled in SETTINGS and not reset for about 30 seconds.
+
+    The link model delays every response by ``latency`` seconds, limits throughput to ``baud`` (10 bits per byte, 0 for unlimited) and drops each transferred byte with probability ``loss``. ``speed`` scales simulated time against wall-clock time, so long cycle tests can run in minutes.
+
+    A simulator is usually reached through pyserial with a URL such as ``batlabsim://rack1?sn=1234&latency=0.002&loss=0.001``, which ``Batlab`` accepts in place of a real port name. Named simulators are kept in ``Simulator.devices`` so a test can reconnect to the same device or reach into its cell models.
+
+    Attributes:
+        sn: Serial number reported in SERIAL_NUM/DEVICE_ID
+        firmware: Firmware version reported in FIRMWARE_VER
+        cells[4]: 4-list of ``SimulatedCell`` models
+        latency: Seconds between a request and the start of its response
+        baud: Link speed used to pace the response bytes (0 for unlimited)
+        loss: Probability of dropping each byte in either direction
+        speed: Simulated seconds per wall-clock second
+        vcc: Supply voltage reported in VCC
+        report_unit: Seconds of simulated time per count of the REPORT_INTERVAL register
+        requests: Number of command frames answered
+        lost_bytes: Number of bytes dropped by the link model
+    """
+    devices = dict()
+    devices_lock = threading.Lock()
+
+    IMPEDANCE_SETTLE = 1.0 # seconds in MODE_IMPEDANCE before CURRENT_PP/VOLTAGE_PP are valid
+    MEASUREMENT_REGS = [TEMPERATURE,CURRENT,VOLTAGE,CHARGEL,CHARGEH,CURRENT_PP,VOLTAGE_PP]
+
+    def __init__(self,sn=1000,firmware=4,latency=0.001,baud=38400,loss=0.0,speed=1.0,seed=None,cells=None):
+        self.sn = int(sn)
+        self.firmware = int(firmware)
+        self.latency = latency
+        self.baud = baud
+        self.loss = loss
+        self.speed = speed
+        self.vcc = 5.0
+        self.report_unit = 1.0
+        self.cells = cells if cells is not None else [SimulatedCell() for i in range(0,4)]
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.lost_bytes = 0
+        self.cond = threading.Condition()
+        self.inbuf = bytearray()
+        self.outq = collections.deque() # (wall-clock due time, bytes) in send order
+        self.link_free = 0.0 # wall-clock time at which the simulated line is idle again
+        self.link = None
+        self.thread = None
+        self.wall = monotonic()
+        self.clock = 0.0 # simulated seconds since creation
+        self.watchdog = 255.0
+        self.latched = None
+        self.unit = {SINE_FREQ:4, SETTINGS:0, SINE_OFFSET:0, SINE_MAGDIV:2, LED_MESSAGE:0, LOCK:LOCK_UNLOCKED, ZERO_AMP_THRESH:0,
+                     VOLT_CH_CALIB_OFF:0, VOLT_CH_CALIB_SCA:16384, VOLT_DC_CALIB_OFF:0, VOLT_DC_CALIB_SCA:16384}
+        self.regs = []
+        for i in range(0,4):
+            self.regs.append({REPORT_INTERVAL:0, VOLTAGE_LIMIT_CHG:batlab.encoder.Encoder(4.2).asvoltage(), VOLTAGE_LIMIT_DCHG:batlab.encoder.Encoder(2.5).asvoltage(),
+                              CURRENT_LIMIT_CHG:batlab.encoder.Encoder(4.0).ascurrent(), CURRENT_LIMIT_DCHG:batlab.encoder.Encoder(4.0).ascurrent(),
+                              TEMP_LIMIT_CHG:0, TEMP_LIMIT_DCHG:0, COMPENSATION:0, CURRENT_CALIB_OFF:0, CURRENT_CALIB_SCA:16384, TEMP_CALIB_R:10000, TEMP_CALIB_B:3380,
+                              CURRENT_CALIB_PP:16384, VOLTAGE_CALIB_PP:16384, CURR_CALIB_PP_OFF:0, VOLT_CALIB_PP_OFF:0, CURR_LOWV_SCA:16384, CURR_LOWV_OFF:0, CURR_LOWV_OFF_SCA:0})
+        self.next_stream = [None,None,None,None]
+        self.comms = dict()
+
+    @classmethod
+    def get(cls,name,**kwargs):
+        """Returns the named simulator, creating it with ``kwargs`` if it does not exist yet."""
+        with cls.devices_lock:
+            if name not in cls.devices:
+                cls.devices[name] = Simulator(**kwargs)
+            return cls.devices[name]
+
+    # Link - the host end of a socket pair is handed to the pyserial port object
+    def attach(self,sock):
+        """Starts serving the device end ``sock`` of a connection."""
+        with self.cond:
+            self.detach_locked()
+            self._advance()
+            self.link = sock
+            self.inbuf = bytearray()
+            self.outq.clear()
+            self.thread = threading.Thread(target=self.thd_device)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def detach(self):
+        with self.cond:
+            self.detach_locked()
+
+    def detach_locked(self):
+        if self.link is not None:
+            try:
+                self.link.close()
+            except:
+                pass
+            self.link = None
+            self.cond.notify_all()
+
+    def receive(self,data):
+        """Called by the port object with the bytes the host wrote."""
+        with self.cond:
+            for b in data:
+                if self.loss and self.random.random() < self.loss:
+                    self.lost_bytes += 1
+                    continue
+                self.inbuf.append(b)
+            self.cond.notify_all()
+
+    def thd_device(self):
+        while True:
+            with self.cond:
+                if self.link is None:
+                    return
+                link = self.link
+                self._advance()
+                self._handle_frames()
+                self._emit_streams()
+                now = monotonic()
+                due = []
+                while self.outq and self.outq[0][0] <= now:
+                    due.append(self.outq.popleft()[1])
+                if not due:
+                    wait = 0.1
+                    if self.outq:
+                        wait = min(wait,self.outq[0][0] - now)
+                    for t in self.next_stream:
+                        if t is not None:
+                            wait = min(wait,(t - self.clock) / self.speed)
+                    self.cond.wait(max(wait,0.0005))
+                    continue
+            for chunk in due:
+                try:
+                    link.send(chunk)
+                except (BlockingIOError,InterruptedError):
+                    self.lost_bytes += len(chunk) # host is not reading - the bytes overflow
+                except OSError:
+                    return
+
+    def _send(self,frame):
+        """Queues ``frame`` on the simulated line, after the latency and behind anything already being sent. Caller must hold ``cond``."""
+        if self.loss:
+            kept = bytearray()
+            for b in frame:
+                if self.random.random() < self.loss:
+                    self.lost_bytes += 1
+                else:
+                    kept.append(b)
+            frame = bytes(kept)
+        start = max(monotonic() + self.latency,self.link_free)
+        self.link_free = start + (len(frame) * 10.0 / self.baud if self.baud else 0.0)
+        self.outq.append((self.link_free,frame))
+
+    def _handle_frames(self):
+        buf = self.inbuf
+        i = 0
+        while len(buf) - i >= 5:
+            if buf[i] != 0xAA or buf[i + 1] not in NAMESPACE_LIST:
+                i += 1 # resynchronize on the next start code like the firmware does
+                continue
+            namespace = buf[i + 1]
+            addr = buf[i + 2] & 0x7F
+            if buf[i + 2] & 0x80:
+                value = struct.unpack_from('<H',buf,i + 3)[0]
+                data = self.write_reg(namespace,addr,value)
+                self._send(struct.pack('<BBBH',0xAA,namespace,addr | 0x80,data & 0xFFFF))
+            else:
+                data = self.read_reg(namespace,addr)
+                self._send(struct.pack('<BBBH',0xAA,namespace,addr,data & 0xFFFF))
+            self.requests += 1
+            i += 5
+        del buf[:i]
+
+    def _emit_streams(self):
+        for n in range(0,4):
+            interval = self.regs[n][REPORT_INTERVAL]
+            if interval == 0 or not self.cells[n].present:
+                self.next_stream[n] = None
+                continue
+            if self.next_stream[n] is None:
+                self.next_stream[n] = self.clock + interval * self.report_unit
+            elif self.clock >= self.next_stream[n]:
+                self._send(struct.pack('<BBBHHHHH',0xAF,n,0,self.read_reg(n,MODE),self.read_reg(n,STATUS),self.read_reg(n,TEMPERATURE),self.read_reg(n,CURRENT),self.read_reg(n,VOLTAGE)))
+                self.next_stream[n] = max(self.next_stream[n] + interval * self.report_unit,self.clock)
+
+    # Physics
+    def _advance(self):
+        """Moves the cell models forward to the present wall-clock time. Caller must hold ``cond``."""
+        now = monotonic()
+        dt = (now - self.wall) * self.speed
+        self.wall = now
+        while dt > 0:
+            step = min(dt,1.0)
+            self._step(step)
+            dt -= step
+
+    def _step(self,dt):
+        self.clock += dt
+        if self.unit[SETTINGS] & SET_WATCHDOG_TIMER:
+            self.watchdog = max(0.0,self.watchdog - dt * 256.0 / 30.0)
+        for n,cell in enumerate(self.cells):
+            regs = self.regs[n]
+            if not cell.present:
+                cell.mode = MODE_NO_CELL
+                cell.current = 0.0
+                continue
+            if self.watchdog <= 0 and cell.mode in (MODE_CHARGE,MODE_DISCHARGE):
+                cell.mode = MODE_STOPPED
+            amps = min(cell.setpoint / 128.0,4.096)
+            if cell.mode == MODE_CHARGE:
+                cell.current = amps
+            elif cell.mode == MODE_DISCHARGE:
+                cell.current = -amps
+            else:
+                cell.current = 0.0
+            cell.soc = min(1.0,max(0.0,cell.soc + cell.current * dt / cell.capacity))
+            cell.charge += abs(cell.current) * dt
+            heat = cell.current * cell.current * cell.resistance
+            cell.temperature += (heat * 0.5 - (cell.temperature - cell.ambient) * 0.01) * dt
+            v = cell.voltage()
+            if cell.mode == MODE_CHARGE:
+                if v >= self._decode(n,VOLTAGE_LIMIT_CHG,'asvoltage'):
+                    self._limit(cell,STAT_VOLTAGE_LIMIT_CHG)
+                elif regs[TEMP_LIMIT_CHG] and cell.temperature >= self._decode(n,TEMP_LIMIT_CHG,'astemperature_c'):
+                    self._limit(cell,STAT_TEMP_LIMIT_CHG)
+            elif cell.mode == MODE_DISCHARGE:
+                if v <= self._decode(n,VOLTAGE_LIMIT_DCHG,'asvoltage'):
+                    self._limit(cell,STAT_VOLTAGE_LIMIT_DCHG)
+                elif regs[TEMP_LIMIT_DCHG] and cell.temperature >= self._decode(n,TEMP_LIMIT_DCHG,'astemperature_c'):
+                    self._limit(cell,STAT_TEMP_LIMIT_DCHG)
+
+    def _limit(self,cell,flag):
+        cell.mode = MODE_STOPPED
+        cell.current = 0.0
+        cell.status |= flag
+        cell.error |= flag
+
+    def _decode(self,n,addr,method):
+        p = batlab.packet.ResponsePacket(n,addr,self.regs[n][addr])
+        if method == 'astemperature_c':
+            return p.astemperature_c([r[TEMP_CALIB_R] for r in self.regs],[r[TEMP_CALIB_B] for r in self.regs])
+        return getattr(p,method)()
+
+    # Register map
+    def _measure(self,n,addr):
+        cell = self.cells[n]
+        regs = self.regs[n]
+        if addr == TEMPERATURE:
+            return batlab.encoder.Encoder(cell.temperature).c_astemperature(regs[TEMP_CALIB_R],regs[TEMP_CALIB_B])
+        if addr == CURRENT:
+            return batlab.encoder.Encoder(abs(cell.current)).ascurrent()
+        if addr == VOLTAGE:
+            return batlab.encoder.Encoder(cell.voltage()).asvoltage()
+        if addr in (CHARGEL,CHARGEH):
+            multiplier = 1.0 if self.unit[SETTINGS] & SET_CH0_HI_RES else 6.0
+            counts = int(cell.charge * 9.765625 / 4.096 * 2**15 / multiplier) & 0xFFFFFFFF
+            return counts & 0xFFFF if addr == CHARGEL else counts >> 16
+        # CURRENT_PP / VOLTAGE_PP - only valid once the sine has settled
+        if cell.mode != MODE_IMPEDANCE or cell.impedance_since is None or self.clock - cell.impedance_since < self.IMPEDANCE_SETTLE:
+            return 0
+        ipp = 2.0 / (2 ** self.unit[SINE_MAGDIV])
+        if addr == CURRENT_PP:
+            return batlab.encoder.Encoder(ipp).ascurrent()
+        freq = self.unit[SINE_FREQ] * (10000.0 / 256.0)
+        return batlab.encoder.Encoder(ipp * cell.impedance(freq)).asvoltage()
+
+    def read_reg(self,namespace,addr):
+        """Returns the raw value of a register, as the firmware would report it."""
+        if namespace == BOOTLOADER:
+            return COMMAND_ERROR # not in the bootloader
+        if namespace == COMMS:
+            return self.comms.get(addr,0)
+        if namespace == UNIT:
+            if addr == SERIAL_NUM:
+                return self.sn & 0xFFFF
+            if addr == DEVICE_ID:
+                return self.sn >> 16
+            if addr == FIRMWARE_VER:
+                return self.firmware
+            if addr == VCC:
+                return batlab.encoder.Encoder(self.vcc).asvcc()
+            if addr == SYSTEM_TIMER:
+                return int(self.clock) & 0xFFFF
+            if addr == WATCHDOG_TIMER:
+                return int(self.watchdog)
+            return self.unit.get(addr,COMMAND_ERROR)
+        cell = self.cells[namespace]
+        if addr in self.MEASUREMENT_REGS:
+            if self.latched is not None:
+                return self.latched[namespace][addr]
+            return self._measure(namespace,addr)
+        if addr == MODE:
+            return cell.mode
+        if addr == ERROR:
+            return cell.error
+        if addr == STATUS:
+            return cell.status
+        if addr == CURRENT_SETPOINT:
+            return cell.setpoint
+        if addr == DUTY:
+            return int(abs(cell.current) / 4.096 * 1023)
+        return self.regs[namespace].get(addr,COMMAND_ERROR)
+
+    def write_reg(self,namespace,addr,value):
+        """Applies a register write and returns the value echoed in the response."""
+        if namespace == BOOTLOADER:
+            return COMMAND_ERROR
+        if namespace == COMMS:
+            self.comms[addr] = value
+            return value
+        if namespace == UNIT:
+            if addr in (SERIAL_NUM,DEVICE_ID,FIRMWARE_VER,VCC,SYSTEM_TIMER):
+                if addr == SERIAL_NUM:
+                    self.sn = (self.sn & 0xFFFF0000) | value
+                elif addr == DEVICE_ID:
+                    self.sn = (self.sn & 0xFFFF) | (value << 16)
+                return value
+            if addr == WATCHDOG_TIMER:
+                self.watchdog = float(value)
+                return value
+            if addr == LOCK:
+                if value == LOCK_LOCKED and self.latched is None:
+                    self.latched = [dict((a,self._measure(n,a)) for a in self.MEASUREMENT_REGS) for n in range(0,4)]
+                elif value == LOCK_UNLOCKED:
+                    self.latched = None
+            if addr not in self.unit and addr != BOOTLOAD:
+                return COMMAND_ERROR
+            self.unit[addr] = value
+            return value
+        cell = self.cells[namespace]
+        if addr == MODE:
+            if cell.present and value in (MODE_IDLE,MODE_CHARGE,MODE_DISCHARGE,MODE_IMPEDANCE,MODE_STOPPED):
+                if value == MODE_IMPEDANCE and cell.mode != MODE_IMPEDANCE:
+                    cell.impedance_since = self.clock
+                cell.mode = value
+                if value in (MODE_CHARGE,MODE_DISCHARGE):
+                    cell.status = 0
+        elif addr == ERROR:
+            cell.error = value
+        elif addr == STATUS:
+            cell.status = value
+        elif addr == CURRENT_SETPOINT:
+            cell.setpoint = min(max(value if value < 0x8000 else 0,0),575)
+        elif addr == CHARGEH:
+            cell.charge = 0.0 # writing CHARGEH clears both charge registers
+        elif addr in self.regs[namespace]:
+            self.regs[namespace][addr] = value
+        elif addr not in self.MEASUREMENT_REGS and addr not in (DUTY,CHARGEL):
+            return COMMAND_ERROR
+        return value
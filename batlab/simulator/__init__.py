@@ -0,0 +1,7 @@
+import serial
+
+from .Simulator import Simulator, SimulatedCell
+
+# make serial.serial_for_url('batlabsim://...') resolve to batlab.simulator.protocol_batlabsim
+if 'batlab.simulator' not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append('batlab.simulator')
@@ -0,0 +1,136 @@
+# pyserial URL handler for simulated Batlabs
+#
+# URL format:    batlabsim://[name][?option=value[&option=value...]]
+# options (applied when the named simulator is first created):
+# - sn, firmware, latency, baud, loss, speed, seed: see batlab.simulator.Simulator
+# - cells: 4 characters of 0/1 marking which slots hold a cell, e.g. cells=1101
+import select
+import socket
+import struct
+from time import monotonic
+
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialBase, SerialException, PortNotOpenError
+
+from batlab.simulator.Simulator import Simulator, SimulatedCell
+
+try:
+    import fcntl
+    import termios
+except ImportError: # not available on Windows - in_waiting falls back to a readiness check
+    fcntl = None
+
+class Serial(SerialBase):
+    """Serial port implementation that talks to a ``Simulator`` instead of hardware.
+
+    The port and the simulated device are joined by a socket pair, so the port has a real ``fileno()`` that can be handed to ``select``/``selectors`` like a serial device.
+    """
+    def __init__(self,*args,**kwargs):
+        self.sock = None
+        self.simulator = None
+        super(Serial,self).__init__(*args,**kwargs)
+
+    def open(self):
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self.simulator = self.from_url(self.port)
+        self.sock,device = socket.socketpair()
+        device.setblocking(False)
+        self.simulator.attach(device)
+        self.is_open = True
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self.simulator.detach()
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        super(Serial,self).close()
+
+    def _reconfigure_port(self,*args,**kwargs):
+        pass # baud rate, parity etc. mean nothing to the simulator
+
+    def from_url(self,url):
+        """Returns the simulator described by the URL."""
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != 'batlabsim':
+            raise SerialException('expected a string in the form "batlabsim://[name][?option=value...]": not starting with batlabsim:// ({!r})'.format(parts.scheme))
+        kwargs = dict()
+        try:
+            for option,values in urlparse.parse_qs(parts.query,True).items():
+                if option in ('sn','firmware','baud','seed'):
+                    kwargs[option] = int(values[0])
+                elif option in ('latency','loss','speed'):
+                    kwargs[option] = float(values[0])
+                elif option == 'cells':
+                    kwargs['cells'] = [SimulatedCell(present=(c == '1')) for c in values[0]]
+                else:
+                    raise ValueError('unknown option: {!r}'.format(option))
+        except ValueError as e:
+            raise SerialException('expected a string in the form "batlabsim://[name][?option=value...]": {}'.format(e))
+        name = parts.netloc + parts.path
+        if not name:
+            return Simulator(**kwargs)
+        return Simulator.get(name,**kwargs)
+
+    @property
+    def in_waiting(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        if fcntl is not None:
+            return struct.unpack('I',fcntl.ioctl(self.sock.fileno(),termios.FIONREAD,b'\0\0\0\0'))[0]
+        return 1 if select.select([self.sock],[],[],0)[0] else 0
+
+    def fileno(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self.sock.fileno()
+
+    def read(self,size=1):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytearray()
+        deadline = None if self._timeout is None else monotonic() + self._timeout
+        while len(data) < size:
+            remaining = None if deadline is None else max(0.0,deadline - monotonic())
+            try:
+                ready = select.select([self.sock],[],[],remaining)[0]
+                if not ready:
+                    break
+                chunk = self.sock.recv(size - len(data))
+            except (OSError,ValueError) as e:
+                raise SerialException('read failed: {}'.format(e))
+            if not chunk:
+                raise SerialException('simulated device disconnected')
+            data.extend(chunk)
+            if remaining == 0:
+                break
+        return bytes(data)
+
+    def write(self,data):
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        self.simulator.receive(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        if not self.is_open:
+            raise PortNotOpenError()
+        while select.select([self.sock],[],[],0)[0]:
+            if not self.sock.recv(4096):
+                break
+
+    def reset_output_buffer(self):
+        pass
@@ -0,0 +1,40 @@
+from batlab.constants import *
+
+import collections
+
+# Registers read for every cell in a snapshot, in the order they are sent
+SNAPSHOT_REGS = [MODE,ERROR,STATUS,VOLTAGE,CURRENT,TEMPERATURE,CHARGEH,CHARGEL,DUTY]
+
+class CellSnapshot(collections.namedtuple('CellSnapshot',['cell','mode','error','status','voltage','current','temperature','charge','duty'])):
+    """Measurements of one cell in a ``Snapshot``.
+
+    Attributes:
+        cell: Cell (slot) number
+        mode: Raw MODE register value
+        error: Raw ERROR register value
+        status: Raw STATUS register value
+        voltage: Cell voltage in Volts
+        current: Cell current in Amps
+        temperature: Cell temperature in degrees C
+        charge: Charge counted since the test started, in Coulombs
+        duty: Raw DUTY register value
+    """
+    __slots__ = ()
+
+class Snapshot(collections.namedtuple('Snapshot',['time','sn','vcc','cells'])):
+    """Coherent set of measurements from a ``Batlab``, read with ``Batlab.snapshot`` while the measurement registers were latched by the LOCK register. Values that could not be read are NaN.
+
+    Attributes:
+        time: Time the registers were latched, as returned by ``time.time()``
+        sn: Serial number of the Batlab
+        vcc: Supply voltage of the Batlab in Volts
+        cells: Tuple of ``CellSnapshot`` records in the order the cells were requested
+    """
+    __slots__ = ()
+
+    def cell(self,n):
+        """The ``CellSnapshot`` of cell ``n``, or None if it is not in the snapshot."""
+        for c in self.cells:
+            if c.cell == n:
+                return c
+        return None
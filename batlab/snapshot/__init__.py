@@ -0,0 +1 @@
+from .Snapshot import Snapshot, CellSnapshot, SNAPSHOT_REGS
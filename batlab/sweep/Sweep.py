@@ -0,0 +1,81 @@
+from batlab.constants import *
+
+from array import array
+import csv
+from time import time
+
+FREQ_STEP = 10000.0 / 256.0 # Hz per count of the SINE_FREQ register
+FREQ_MIN = 1 # 39.0625 Hz
+FREQ_MAX = 27 # 1054.6875 Hz
+
+def sine_freq(hz):
+    """Nearest SINE_FREQ register value for a frequency in Hz, within the range allowed by ``Settings``."""
+    return max(FREQ_MIN,min(FREQ_MAX,int(round(hz / FREQ_STEP))))
+
+class Sweep:
+    """Impedance spectroscopy sweep over one or more Batlabs.
+
+    Steps the sine generator through a list of frequencies and records the impedance magnitude of every cell at each step. SINE_FREQ is shared by all cells of a Batlab, so each step measures all of the requested cells of every Batlab at once: every Batlab gets the new frequency, then one ``Batlab.impedance_async`` measurement per Batlab runs in parallel. A step costs a single settle time however many cells and Batlabs are in the sweep.
+
+    Example::
+
+        sweep = batlab.sweep.Sweep(bp.batpool.values(),freqs=[39,78,156,312,625,1054])
+        sweep.run()
+        sweep.write_csv('screening.csv')
+
+    Attributes:
+        batlabs: List of Batlabs in the sweep
+        cells: List of cells measured on each Batlab
+        settle: Seconds each measurement is left to settle
+        freqs: ``array('d')`` of the frequencies actually swept in Hz, rounded to what SINE_FREQ can represent
+        magnitude: Dictionary of ``array('d')`` impedance magnitudes in Ohms by (serial number, cell), one per frequency. NaN where a measurement failed.
+        duration: Seconds the last ``run`` took
+    """
+    def __init__(self,batlabs,cells=None,freqs=None,settle=2.0):
+        self.batlabs = list(batlabs)
+        self.cells = [CELL0,CELL1,CELL2,CELL3] if cells is None else list(cells)
+        self.settle = settle
+        if freqs is None:
+            raw = range(FREQ_MIN,FREQ_MAX + 1)
+        else:
+            raw = sorted(set(sine_freq(hz) for hz in freqs))
+        self.raw = array('H',raw)
+        self.freqs = array('d',[n * FREQ_STEP for n in self.raw])
+        self.magnitude = dict()
+        self.duration = None
+
+    def run(self):
+        """Runs the sweep, blocking until it is done. The previous SINE_FREQ of each Batlab is restored afterwards.
+
+        Returns:
+            The ``magnitude`` dictionary.
+        """
+        start = time()
+        nan = float('nan')
+        self.magnitude = dict()
+        for bat in self.batlabs:
+            for cell in self.cells:
+                self.magnitude[(bat.sn,cell)] = array('d',[nan] * len(self.raw))
+        previous = [bat.read(UNIT,SINE_FREQ).data for bat in self.batlabs]
+        try:
+            for step,raw in enumerate(self.raw):
+                for txn in [bat.write_async(UNIT,SINE_FREQ,raw) for bat in self.batlabs]:
+                    txn.result()
+                handles = [bat.impedance_async(self.cells,self.settle) for bat in self.batlabs]
+                for bat,z in zip(self.batlabs,handles):
+                    for cell,value in zip(self.cells,z.result()):
+                        self.magnitude[(bat.sn,cell)][step] = value
+        finally:
+            for bat,raw in zip(self.batlabs,previous):
+                if raw == raw: # not NaN
+                    bat.write(UNIT,SINE_FREQ,raw)
+        self.duration = time() - start
+        return self.magnitude
+
+    def write_csv(self,filename):
+        """Writes the results with one row per cell and one column per frequency."""
+        with open(filename,'w',newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Batlab SN','Channel'] + ['{:.4f}'.format(hz) for hz in self.freqs])
+            for (sn,cell) in sorted(self.magnitude.keys()):
+                writer.writerow([sn,cell] + ['{:.6f}'.format(z) for z in self.magnitude[(sn,cell)]])
@@ -0,0 +1 @@
+from .Sweep import Sweep, sine_freq
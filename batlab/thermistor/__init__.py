@@ -0,0 +1 @@
+from .Thermistor import Thermistor, table
@@ -0,0 +1,100 @@
+from batlab.constants import *
+
+import collections
+from time import time
+
+SAFETY_CELL_REGS = [MODE,ERROR,STATUS,TEMPERATURE,CURRENT,VOLTAGE]
+CALIBRATION_CELL_REGS = [CURRENT_CALIB_OFF,CURRENT_CALIB_SCA,TEMP_CALIB_R,TEMP_CALIB_B,CURRENT_CALIB_PP,VOLTAGE_CALIB_PP,CURR_CALIB_PP_OFF,VOLT_CALIB_PP_OFF,CURR_LOWV_SCA,CURR_LOWV_OFF,CURR_LOWV_OFF_SCA]
+CALIBRATION_UNIT_REGS = [SERIAL_NUM,DEVICE_ID,VOLT_CH_CALIB_OFF,VOLT_CH_CALIB_SCA,VOLT_DC_CALIB_OFF,VOLT_DC_CALIB_SCA,BOOTLOAD]
+
+def priority(namespace,addr,write):
+    """Returns the priority class (``PRIO_CONTROL`` ... ``PRIO_BULK``) a register access gets by default."""
+    if namespace in (CELL0,CELL1,CELL2,CELL3):
+        if write and addr == MODE:
+            return PRIO_CONTROL
+        if (write and addr == CURRENT_SETPOINT) or (not write and addr in SAFETY_CELL_REGS):
+            return PRIO_SAFETY
+        if write and addr in CALIBRATION_CELL_REGS:
+            return PRIO_BULK
+    elif namespace == UNIT:
+        if write and addr == WATCHDOG_TIMER:
+            return PRIO_CONTROL
+        if not write and addr == VCC:
+            return PRIO_SAFETY
+        if write and addr in CALIBRATION_UNIT_REGS:
+            return PRIO_BULK
+    elif namespace == BOOTLOADER:
+        return PRIO_BULK
+    return PRIO_LOGGING
+
+class Scheduler:
+    """Orders the transactions waiting for a free slot in the ``Batlab`` transaction window by priority class.
+
+    Each class is served first-in first-out, and a class is only served when all higher classes are empty. A write is held back while an earlier write to the same register is still in flight, so that a re-sent write can never reach the Batlab after a newer one and leave the register holding the old value. Later accesses to a register with a held write wait behind it. One slot of the window is kept free for ``PRIO_CONTROL`` traffic (when the window has more than one slot), so a stop or watchdog reset never waits behind a window full of lower priority requests: its worst-case latency is the round trips of the ``PRIO_CONTROL`` requests queued ahead of it, no matter how busy the link is.
+
+    Attributes:
+        queues: One deque of waiting transactions per priority class
+        sent[4]: Number of transactions sent in each class
+        max_wait[4]: Longest time in seconds a transaction of each class waited for a window slot
+    """
+    def __init__(self):
+        self.queues = [collections.deque() for prio in PRIO_LIST]
+        self.sent = [0 for prio in PRIO_LIST]
+        self.max_wait = [0.0 for prio in PRIO_LIST]
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues)
+
+    def __iter__(self):
+        for q in self.queues:
+            for txn in q:
+                yield txn
+
+    def extend(self,txns):
+        """Queues new transactions at the back of their classes."""
+        now = time()
+        for txn in txns:
+            txn.queued = now
+            self.queues[txn.priority].append(txn)
+
+    def requeue(self,txns):
+        """Puts transactions that have to be re-sent back at the front of their classes, in order."""
+        for txn in reversed(txns):
+            self.queues[txn.priority].appendleft(txn)
+
+    def clear(self):
+        for q in self.queues:
+            q.clear()
+
+    def pop(self,inflight,window,busy=None):
+        """Returns the next transaction to send with ``inflight`` of ``window`` slots in use, or None if nothing may be sent now.
+
+        Args:
+            inflight: Number of window slots in use
+            window: Size of the window
+            busy: Optional collection of the keys of the transactions in flight. Writes with one of these keys are held back.
+        """
+        held = set() # (namespace,addr) of the registers with a held write
+        for prio,q in enumerate(self.queues):
+            index = 0
+            while busy and index < len(q):
+                txn = q[index]
+                if (txn.namespace,txn.addr) in held:
+                    index += 1
+                elif txn.write and txn.key in busy:
+                    held.add((txn.namespace,txn.addr))
+                    index += 1
+                else:
+                    break
+            if index < len(q):
+                limit = window if (prio == PRIO_CONTROL or window < 2) else window - 1
+                if inflight >= limit:
+                    return None
+                txn = q[index]
+                del q[index]
+                self.sent[prio] += 1
+                wait = time() - txn.queued
+                if wait > self.max_wait[prio]:
+                    self.max_wait[prio] = wait
+                return txn
+        return None
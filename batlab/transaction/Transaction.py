@@ -0,0 +1,49 @@
+import concurrent.futures
+
+from .Scheduler import priority as default_priority
+
+class Transaction(concurrent.futures.Future):
+    """Holds one register read or write request while it is queued or in flight to a Batlab.
+
+    A ``Transaction`` is a ``concurrent.futures.Future``. The receiver thread of the ``Batlab`` completes it with the response ``packet`` as soon as the matching frame arrives, or with an invalid packet once its retries are used up, so callers can block on ``result()``, poll ``done()`` or attach callbacks with ``add_done_callback()``. Cancelling a transaction that has not been answered yet stops it from being sent or re-sent.
+
+    The ``Batlab`` transaction engine allows several transactions to be outstanding on the serial link at once. Response packets are matched back to the oldest in-flight transaction with the same ``key``, which is why the key is built from the same fields the receiver thread parses out of a response frame.
+
+    Attributes:
+        namespace: Namespace of the register
+        addr: Register address
+        value: Value to write (ignored for reads)
+        write: True if this transaction is a register write
+        key: (namespace, addr, write) tuple used to match the response packet
+        retries: Number of times the request is re-sent before giving up
+        attempts: Number of times the request has timed out so far
+        deadline: Time after which the current attempt is considered lost
+        priority: Priority class (``PRIO_CONTROL`` ... ``PRIO_BULK``) that decides the order in which queued transactions are sent
+        queued: Time the transaction was first queued
+    """
+    def __init__(self,namespace,addr,value=0,write=False,retries=50,priority=None):
+        concurrent.futures.Future.__init__(self)
+        self.namespace = int(namespace)
+        self.addr = int(addr)
+        self.value = int(value)
+        self.write = write
+        self.key = (self.namespace,self.addr,write)
+        self.retries = retries
+        self.attempts = 0
+        self.deadline = None
+        self.priority = default_priority(self.namespace,self.addr,write) if priority is None else priority
+        self.queued = None
+
+    def frame(self):
+        """Encodes the request as the 5-byte command frame the Batlab expects."""
+        if self.write:
+            return bytes([0xAA,self.namespace,self.addr | 0x80]) + self.value.to_bytes(2,byteorder='little',signed=True)
+        return bytes([0xAA,self.namespace,self.addr,0x00,0x00])
+
+    def complete(self,packet):
+        """Sets ``packet`` as the result unless the transaction was already completed or cancelled."""
+        try:
+            if not self.done():
+                self.set_result(packet)
+        except Exception:
+            pass # cancelled by the caller in the meantime (InvalidStateError on Python 3.8+)
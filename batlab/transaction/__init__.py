@@ -0,0 +1,2 @@
+from .Transaction import Transaction
+from .Scheduler import Scheduler, priority
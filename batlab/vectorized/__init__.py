@@ -0,0 +1,9 @@
+"""Vectorized counterparts of the ``Packet`` and ``Encoder`` conversions for NumPy arrays of raw register values.
+
+This subpackage needs NumPy, which is an optional dependency (``pip install batlab[vectorized]``), so it is not imported by ``import batlab``. Import it explicitly::
+
+    import batlab.vectorized
+    volts = batlab.vectorized.decode.asvoltage(raw)
+"""
+from . import decode
+from . import encode
@@ -0,0 +1,97 @@
+"""Array versions of the ``Packet`` decode methods.
+
+Each function takes a NumPy array (or anything ``numpy.asarray`` accepts) of raw register values and returns a float array of the same shape. Raw values may be unsigned (0 to 65535, as read from the Batlab) or already sign-extended int16. NaN marks a failed read and stays NaN, and values that cannot be decoded come out as NaN instead of raising.
+"""
+import numpy as np
+
+from batlab.constants import *
+import batlab.thermistor
+from batlab.thermistor.Thermistor import STEP, exact_celsius
+
+def _raw(data):
+    return np.asarray(data,dtype=np.float64)
+
+def _signed(data):
+    r = _raw(data)
+    return np.where(r >= 0x8000,r - 0x10000,r) # two's complement for unsigned 16 bit input
+
+def asvoltage(data):
+    """Voltage registers in Volts. See ``Packet.asvoltage``."""
+    return _signed(data) * (4.5 / 2**15)
+
+def ascurrent(data):
+    """Current registers in Amps. See ``Packet.ascurrent``."""
+    return _signed(data) * (4.096 / 2**15)
+
+def asvcc(data):
+    """VCC register in Volts. See ``Packet.asvcc``."""
+    r = _raw(data)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.where(r > 0,(2**15 * 4.096) / r,np.nan)
+
+def asfreq(data):
+    """SINE_FREQ register in Hz. See ``Packet.asfreq``."""
+    return _raw(data) * (10000.0 / 256.0)
+
+def _thermistors(R,B,cells,shape):
+    """Yields a mask and the shared ``Thermistor`` tables for every distinct pair of calibration constants of the samples in an array of ``shape``."""
+    Rs = np.asarray(R,dtype=np.float64)
+    Bs = np.asarray(B,dtype=np.float64)
+    if cells is not None:
+        cells = np.asarray(cells,dtype=np.intp)
+        Rs = Rs[cells]
+        Bs = Bs[cells]
+    Rs = np.broadcast_to(Rs,shape)
+    Bs = np.broadcast_to(Bs,shape)
+    if Rs.ndim == 0:
+        pairs = [(float(Rs),float(Bs))]
+    else:
+        pairs = np.unique(np.stack([Rs.ravel(),Bs.ravel()],axis=1),axis=0).tolist()
+    for (r,b) in pairs:
+        if r == r and b == b: # samples with NaN constants are left out
+            yield ((Rs == r) & (Bs == b)),batlab.thermistor.table(r,b)
+
+def astemperature_c(data,R,B,cells=None):
+    """TEMPERATURE registers in degrees C. See ``Packet.astemperature_c``.
+
+    Uses the same ``batlab.thermistor`` tables and interpolation as ``Packet``, so the results are identical to converting the samples one at a time.
+
+    Args:
+        data: Raw TEMPERATURE register values
+        R: 'R' calibration constants. A single value, one per sample, or the 4-list of a Batlab if ``cells`` is given.
+        B: 'B' calibration constants, shaped like ``R``
+        cells: Optional array of the cell number of each sample, used to pick its constants from ``R`` and ``B``
+    """
+    r = _raw(data)
+    T = np.full(r.shape,np.nan)
+    for (mask,t) in _thermistors(R,B,cells,r.shape):
+        d = r[mask]
+        out = np.empty(d.shape)
+        inside = (d >= STEP) & (d < 2**15 - STEP)
+        x = d[inside]
+        n = np.floor(x / STEP).astype(np.intp)
+        table = np.frombuffer(t.celsius_table,dtype=np.float64)
+        lo = table[n]
+        out[inside] = lo + (table[n + 1] - lo) * (x - n * STEP) / STEP
+        # NaN, out of range, or in the steep end segments: the exact equation, as in ``Thermistor.celsius``
+        out[~inside] = [exact_celsius(v,t.R,t.B) for v in d[~inside].tolist()]
+        T[mask] = out
+    return T
+
+def astemperature(data,R,B,cells=None):
+    """TEMPERATURE registers in degrees F. See ``astemperature_c``."""
+    return astemperature_c(data,R,B,cells) * 1.8 + 32
+
+def ascharge(chargeh,chargel=None,settings=0):
+    """Charge counters in Coulombs. See ``Batlab.charge`` and ``func.ascharge``.
+
+    Args:
+        chargeh: CHARGEH register values, or the combined 32 bit counts if ``chargel`` is None
+        chargel: CHARGEL register values
+        settings: UNIT SETTINGS register value (or array), for the SET_CH0_HI_RES resolution flag
+    """
+    counts = _raw(chargeh)
+    if chargel is not None:
+        counts = counts * 65536 + _raw(chargel)
+    multiplier = np.where(np.asarray(settings,dtype=np.int64) & SET_CH0_HI_RES,1.0,6.0)
+    return (multiplier * counts / 2**15) * 4.096 / 9.765625
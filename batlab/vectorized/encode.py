@@ -0,0 +1,64 @@
+"""Array versions of the ``Encoder`` methods.
+
+Each function takes a NumPy array (or anything ``numpy.asarray`` accepts) of values in engineering units and returns an int64 array of raw register values, truncated toward zero like ``Encoder``. Inputs must be finite.
+"""
+import numpy as np
+
+from batlab.thermistor.Thermistor import TMIN, TMAX, TSTEP, exact_raw
+from batlab.vectorized.decode import _thermistors
+
+def _int(x):
+    return np.trunc(x).astype(np.int64)
+
+def asvoltage(volts):
+    """See ``Encoder.asvoltage``."""
+    return _int(np.asarray(volts,dtype=np.float64) * (2**15 / 4.5))
+
+def ascurrent(amps):
+    """See ``Encoder.ascurrent``."""
+    return _int(np.asarray(amps,dtype=np.float64) * ((2**15 - 1) / 4.096))
+
+def asvcc(volts):
+    """See ``Encoder.asvcc``."""
+    return _int((2**15 * 4.096) / np.asarray(volts,dtype=np.float64))
+
+def asfreq(hz):
+    """See ``Encoder.asfreq``."""
+    return _int(np.asarray(hz,dtype=np.float64) / (10000.0 / 256.0))
+
+def assetpoint(amps):
+    """See ``Encoder.assetpoint``."""
+    return _int(np.asarray(amps,dtype=np.float64) * 128)
+
+def c_astemperature(celsius,R,B,cells=None):
+    """Raw TEMPERATURE register values for temperatures in C, -100 where a temperature cannot be represented. See ``Encoder.c_astemperature``.
+
+    Uses the same ``batlab.thermistor`` tables and interpolation as ``Encoder``, so the results are identical to encoding the temperatures one at a time.
+
+    Args:
+        celsius: Temperatures in degrees C
+        R: 'R' calibration constants. A single value, one per temperature, or the 4-list of a Batlab if ``cells`` is given.
+        B: 'B' calibration constants, shaped like ``R``
+        cells: Optional array of the cell number of each temperature, used to pick its constants from ``R`` and ``B``
+    """
+    c = np.asarray(celsius,dtype=np.float64)
+    raw = np.full(c.shape,-100,dtype=np.int64)
+    for (mask,t) in _thermistors(R,B,cells,c.shape):
+        d = c[mask]
+        out = np.empty(d.shape,dtype=np.int64)
+        inside = (d >= TMIN) & (d < TMAX)
+        x = (d[inside] - TMIN) / TSTEP
+        n = np.floor(x).astype(np.intp)
+        table = np.frombuffer(t.raw_table,dtype=np.float64)
+        lo = table[n]
+        hi = table[n + 1]
+        ok = (lo >= 0) & (hi >= 0)
+        out[inside] = np.where(ok,np.trunc(np.where(ok,lo + (hi - lo) * (x - n),0)),-100)
+        # outside of the inverse table: the exact equation, as in ``Thermistor.raw``
+        out[~inside] = [int(exact_raw(v,t.R,t.B)) for v in d[~inside].tolist()]
+        raw[mask] = out
+    return raw
+
+def astemperature(fahrenheit,R,B,cells=None):
+    """Raw TEMPERATURE register values for temperatures in F. See ``c_astemperature``."""
+    return c_astemperature((np.asarray(fahrenheit,dtype=np.float64) - 32) / 1.8,R,B,cells)
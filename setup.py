@@ -17,6 +17,9 @@ setup(name='batlab',
       # Needed to include the source files from the MANIFEST
       include_package_data=True,
       install_requires=['pyserial', 'future'],
+      extras_require={
+          'vectorized': ['numpy'],
+      },
       entry_points={
           'console_scripts': [
               'batlabutil = batlab.batlabutil:batlabutil',
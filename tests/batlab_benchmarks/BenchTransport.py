@@ -0,0 +1,144 @@
+"""Transport micro-benchmarks.
+
+Drives ``Batlab.read``, ``write``, ``write_verify``, ``charge`` and ``impedance`` against a simulated Batlab (or any port or pyserial URL given with ``--port``) and reports transactions per second, latency percentiles, transaction retries and CPU time per operation. Results can be written as JSON so runs can be compared between releases::
+
+    python -m tests.batlab_benchmarks.BenchTransport --json bench.json
+    python -m tests.batlab_benchmarks.BenchTransport --port /dev/ttyACM0 --ops read,write
+"""
+import argparse
+import datetime
+import json
+import math
+import platform
+import sys, os, os.path
+import threading
+from time import monotonic, process_time
+
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import batlab
+from batlab.constants import *
+
+def percentile(samples,pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    rank = max(0,min(len(ordered) - 1,int(math.ceil(pct * len(ordered) / 100.0)) - 1))
+    return ordered[rank]
+
+def op_read(bat,n):
+    bat.read(n % 4,VOLTAGE)
+
+def op_write(bat,n):
+    bat.write(n % 4,VOLTAGE_LIMIT_CHG,batlab.encoder.Encoder(4.2).asvoltage())
+
+def op_write_verify(bat,n):
+    bat.write_verify(n % 4,VOLTAGE_LIMIT_DCHG,batlab.encoder.Encoder(2.5).asvoltage())
+
+def op_read_many(bat,n):
+    bat.read_many([(cell,reg) for cell in range(0,4) for reg in (VOLTAGE,CURRENT,TEMPERATURE)])
+
+def op_charge(bat,n):
+    bat.charge(n % 4)
+
+def op_impedance(bat,n):
+    bat.impedance(n % 4)
+
+# operation name -> (function, register transactions per call (approximate), default iterations)
+OPERATIONS = {
+    'read':         (op_read,1,2000),
+    'write':        (op_write,1,2000),
+    'write_verify': (op_write_verify,2,500),
+    'read_many':    (op_read_many,12,200),
+    'charge':       (op_charge,4,500),
+    'impedance':    (op_impedance,8,4),
+}
+
+def run(bat,name,iterations,threads):
+    """Runs one operation ``iterations`` times spread over ``threads`` threads and returns its statistics."""
+    func,txns,default = OPERATIONS[name]
+    iterations = iterations or default
+    latencies = []
+    lock = threading.Lock()
+    def worker(start):
+        local = []
+        for n in range(start,iterations,threads):
+            t = monotonic()
+            func(bat,n)
+            local.append(monotonic() - t)
+        with lock:
+            latencies.extend(local)
+    retries = bat.retry_count
+    dropped = bat.parser.dropped
+    cpu = process_time()
+    wall = monotonic()
+    workers = [threading.Thread(target=worker,args=(i,)) for i in range(0,threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    wall = monotonic() - wall
+    cpu = process_time() - cpu
+    return {
+        'operation': name,
+        'iterations': iterations,
+        'threads': threads,
+        'ops_per_sec': iterations / wall,
+        'transactions_per_sec': iterations * txns / wall,
+        'latency_p50_ms': percentile(latencies,50) * 1000,
+        'latency_p95_ms': percentile(latencies,95) * 1000,
+        'latency_p99_ms': percentile(latencies,99) * 1000,
+        'latency_max_ms': max(latencies) * 1000,
+        'retries': bat.retry_count - retries,
+        'dropped_bytes': bat.parser.dropped - dropped,
+        'cpu_ms_per_op': cpu / iterations * 1000,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batlab transport micro-benchmarks')
+    parser.add_argument('--port',default='batlabsim://?latency=0.001',help='serial port or pyserial URL (default: simulated Batlab)')
+    parser.add_argument('--ops',default='read,write,write_verify,read_many,charge,impedance',help='comma separated operations: ' + ','.join(sorted(OPERATIONS)))
+    parser.add_argument('--iterations',type=int,default=0,help='iterations per operation (default: per-operation default)')
+    parser.add_argument('--threads',type=int,default=1,help='threads issuing requests at once')
+    parser.add_argument('--window',type=int,default=4,help='Batlab transaction window')
+    parser.add_argument('--shadow',action='store_true',help='let the register shadow answer cached reads and skip redundant writes (off by default so every operation crosses the link)')
+    parser.add_argument('--json',help='write machine-readable results to this file')
+    args = parser.parse_args(argv)
+
+    bat = batlab.batlabclass.Batlab(args.port,window=args.window,shadow=args.shadow)
+    if bat.error:
+        print('Could not connect to',args.port)
+        return 1
+    results = []
+    settings = bat.read(UNIT,SETTINGS,cached=False)
+    try:
+        if settings.valid:
+            bat.write(UNIT,SETTINGS,0) # keep the watchdog out of the measurements
+        for name in args.ops.split(','):
+            result = run(bat,name.strip(),args.iterations,args.threads)
+            results.append(result)
+            print('{operation:>13}: {ops_per_sec:9.1f} ops/s {transactions_per_sec:9.1f} txn/s  p50 {latency_p50_ms:7.2f} ms  p95 {latency_p95_ms:7.2f} ms  p99 {latency_p99_ms:7.2f} ms  retries {retries:4d}  cpu {cpu_ms_per_op:6.3f} ms/op'.format(**result))
+    finally:
+        if settings.valid:
+            bat.write(UNIT,SETTINGS,settings.data) # turn the watchdog back on
+        bat.disconnect()
+    if args.json:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.datetime.now().isoformat(),
+            'port': args.port,
+            'window': args.window,
+            'shadow': args.shadow,
+            'threads': args.threads,
+            'results': results,
+        }
+        with open(args.json,'w') as f:
+            json.dump(report,f,indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import asyncio
+
+import batlab
+from batlab.constants import *
+
+class TestAsync(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.bat = None
+
+    def tearDown(self):
+        if self.bat is not None:
+            self.bat.disconnect()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self,coro):
+        return self.loop.run_until_complete(coro)
+
+    def connect(self,url):
+        self.bat = self.run_async(batlab.aio.AsyncBatlab.connect(url))
+        self.assertFalse(self.bat.error)
+        return self.bat
+
+    def test_event_loop_reads_port(self):
+        b = self.connect('batlabsim://async?sn=70000')
+        self.assertTrue(b.nonblocking)
+        self.assertFalse(b.batlab.reader.is_alive())
+        self.assertEqual(b.sn,'70000')
+
+    def test_read_write(self):
+        b = self.connect('batlabsim://')
+        limit = batlab.encoder.Encoder(4.1).asvoltage()
+        async def go():
+            await b.write(CELL1,VOLTAGE_LIMIT_CHG,limit)
+            return await asyncio.gather(b.read(CELL1,VOLTAGE_LIMIT_CHG),b.read_many([(CELL0,MODE),(UNIT,VCC)]),b.write_verify(CELL2,VOLTAGE_LIMIT_CHG,limit),b.charge(CELL0))
+        p,many,verified,charge = self.run_async(go())
+        self.assertEqual(p.data,limit)
+        self.assertEqual(many[0].data,MODE_IDLE)
+        self.assertAlmostEqual(many[1].asvcc(),5.0,places=2)
+        self.assertTrue(verified)
+        self.assertEqual(charge,0)
+
+    def test_write_verify_reads_back(self):
+        b = self.connect('batlabsim://asyncverify')
+        sim = batlab.simulator.Simulator.devices['asyncverify']
+        limit = batlab.encoder.Encoder(4.15).asvoltage()
+        self.assertTrue(self.run_async(b.write_verify(CELL2,VOLTAGE_LIMIT_CHG,limit)))
+        sim.regs[CELL2][VOLTAGE_LIMIT_CHG] = 0 # changed behind our back
+        self.assertTrue(self.run_async(b.write_verify(CELL2,VOLTAGE_LIMIT_CHG,limit)))
+        self.assertEqual(sim.regs[CELL2][VOLTAGE_LIMIT_CHG],limit)
+
+    def test_cancel_stops_resends(self):
+        b = self.connect('batlabsim://cancel')
+        batlab.simulator.Simulator.devices['cancel'].loss = 1.0 # the Batlab stops answering
+        async def go():
+            await asyncio.wait_for(b.write_verify(CELL0,VOLTAGE_LIMIT_CHG,1000),0.3)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_async(go())
+        self.run_async(asyncio.sleep(0.2))
+        self.assertEqual(b.batlab.inflight_count,0)
+        self.assertEqual(len(b.batlab.txqueue),0)
+
+    def test_batpool_events(self):
+        ports = ['batlabsim://pool']
+        async def go():
+            events = []
+            async with batlab.aio.AsyncBatpool(interval=0.05,ports=lambda: list(ports)) as pool:
+                async for event in pool:
+                    events.append((event.kind,event.port))
+                    if event.kind == 'connected':
+                        self.assertEqual((await event.batlab.read(CELL0,MODE)).data,MODE_IDLE)
+                        del ports[:]
+                    else:
+                        break
+            return events
+        self.assertEqual(self.run_async(go()),[('connected','batlabsim://pool'),('disconnected','batlabsim://pool')])
@@ -0,0 +1,50 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+from time import sleep, time
+
+import batlab
+
+class SimulatedBatpool(batlab.batpool.Batpool):
+    """Batpool that finds simulated Batlabs instead of scanning USB."""
+    ports = ['batlabsim://pool%d?sn=%d' % (n,n + 500) for n in range(0,6)] + ['batlabsim://poolhung?loss=1.0']
+
+    def get_ports(self):
+        return list(self.ports)
+
+class TestBatpool(unittest.TestCase):
+    def test_parallel_init_isolates_hung_unit(self):
+        pool = SimulatedBatpool(hotplug=False)
+        self.assertIsNone(pool.cache) # the device cache is opt-in
+        pool.init_timeout = 1.0
+        messages = []
+        deadline = time() + 10
+        while not [m for m in messages if m.startswith('Batpool ready')] and time() < deadline:
+            messages.append(pool.msgqueue.get(timeout=10))
+        pool.quit()
+        ready = [m for m in messages if m.startswith('Batpool ready')]
+        self.assertEqual(ready,['Batpool ready - 6 of 7 new Batlabs initialized in ' + '{:.2f}'.format(pool.ready_time) + ' s'])
+        self.assertIn('Batlab on batlabsim://poolhung?loss=1.0 is not responding - still initializing',messages)
+        self.assertEqual(len([m for m in messages if m.endswith(' connected')]),6)
+        self.assertLess(pool.ready_time,5.0) # reported without waiting for the hung unit's retries to run out
+
+    def test_unplug_while_initializing(self):
+        pool = SimulatedBatpool(hotplug=False)
+        pool.ports = ['batlabsim://poolgone?sn=600','batlabsim://poolstuck?loss=1.0']
+        messages = []
+        deadline = time() + 10
+        while 'Batlab on batlabsim://poolgone?sn=600 connected' not in messages and time() < deadline:
+            messages.append(pool.msgqueue.get(timeout=10))
+        start = time()
+        pool.ports = ['batlabsim://poolstuck?loss=1.0']
+        while 'Batlab on batlabsim://poolgone?sn=600 disconnected' not in messages and time() < deadline:
+            messages.append(pool.msgqueue.get(timeout=10))
+        removed = time() - start
+        self.assertIn('batlabsim://poolstuck?loss=1.0',pool.initializing) # the hung unit is still being initialized
+        pool.quit()
+        self.assertLess(removed,2.0) # not held up by init_timeout
+        self.assertFalse([m for m in messages if m.startswith('Batpool ready')])
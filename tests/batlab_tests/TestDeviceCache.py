@@ -0,0 +1,60 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import json
+import shutil
+import tempfile
+
+import batlab
+from batlab.constants import *
+
+class TestDeviceCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir,'cache','devicecache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def connect(self,url,cache):
+        b = batlab.batlabclass.Batlab(url,cache=cache)
+        self.assertFalse(b.error)
+        b.disconnect()
+        return b
+
+    def test_reconnect_uses_cache(self):
+        sim = batlab.simulator.Simulator.get('cached',sn=4242)
+        sim.regs[CELL2][TEMP_CALIB_R] = 9000
+        first = self.connect('batlabsim://cached',batlab.devicecache.DeviceCache(self.filename))
+        self.assertFalse(first.cached)
+        self.assertEqual(first.R[2],9000)
+        with open(self.filename) as f:
+            self.assertEqual(json.load(f)['4242'],{'ver': 4, 'R': first.R, 'B': first.B})
+        # a new cache object reads the file back, as after a host restart
+        cache = batlab.devicecache.DeviceCache(self.filename)
+        second = self.connect('batlabsim://cached',cache)
+        self.assertTrue(second.cached)
+        self.assertEqual((second.R,second.B,second.sn),(first.R,first.B,'4242'))
+        self.assertEqual((cache.hits,cache.misses),(1,0))
+
+    def test_changed_constants_invalidate_entry(self):
+        cache = batlab.devicecache.DeviceCache(self.filename)
+        b = batlab.batlabclass.Batlab('batlabsim://recal',cache=cache)
+        b.write(CELL0,TEMP_CALIB_B,3400)
+        b.disconnect()
+        b = self.connect('batlabsim://recal',cache)
+        self.assertFalse(b.cached)
+        self.assertEqual(b.B[0],3400)
+        self.assertEqual(cache.get(b.sn)['B'][0],3400)
+
+    def test_save_leaves_no_temporary_files(self):
+        cache = batlab.devicecache.DeviceCache(self.filename)
+        for sn in range(5):
+            cache.put(sn,4,[1,2,3,4],[5,6,7,8])
+        cache.forget(0)
+        self.assertEqual(os.listdir(os.path.dirname(self.filename)),['devicecache.json'])
+        self.assertEqual(sorted(batlab.devicecache.DeviceCache(self.filename).entries.keys()),['1','2','3','4'])
@@ -0,0 +1,49 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import threading
+from time import time
+
+import batlab
+
+def uevent(action,devpath,subsystem,**env):
+    fields = ['%s@%s' % (action,devpath),'ACTION=' + action,'DEVPATH=' + devpath,'SUBSYSTEM=' + subsystem]
+    fields += ['%s=%s' % item for item in env.items()]
+    return '\0'.join(fields).encode('ascii') + b'\0'
+
+class TestHotplug(unittest.TestCase):
+    def setUp(self):
+        self.hotplug = batlab.hotplug.Hotplug()
+
+    def tearDown(self):
+        self.hotplug.close()
+
+    def test_parse(self):
+        env = batlab.hotplug.Hotplug.parse(uevent('add','/devices/pci0000:00/usb1/1-1/1-1:1.0/tty/ttyACM0','tty',DEVNAME='ttyACM0'))
+        self.assertEqual(env['ACTION'],'add')
+        self.assertEqual(env['SUBSYSTEM'],'tty')
+        self.assertEqual(env['DEVNAME'],'ttyACM0')
+
+    def test_only_usb_serial_ports_are_relevant(self):
+        h = self.hotplug
+        usbtty = '/devices/pci0000:00/usb1/1-1/1-1:1.0/tty/ttyACM0'
+        self.assertTrue(h.relevant(h.parse(uevent('add',usbtty,'tty'))))
+        self.assertTrue(h.relevant(h.parse(uevent('remove',usbtty,'tty'))))
+        self.assertFalse(h.relevant(h.parse(uevent('change',usbtty,'tty'))))
+        self.assertFalse(h.relevant(h.parse(uevent('add','/devices/virtual/tty/ttyS0','tty'))))
+        self.assertFalse(h.relevant(h.parse(uevent('add','/devices/pci0000:00/usb1/1-1','usb',PRODUCT='4d8/a/1'))))
+
+    def test_wake_interrupts_wait(self):
+        threading.Timer(0.1,self.hotplug.wake).start()
+        start = time()
+        self.assertFalse(self.hotplug.wait(5.0))
+        self.assertLess(time() - start,2.0)
+
+    def test_wait_times_out(self):
+        start = time()
+        self.hotplug.wait(0.1)
+        self.assertGreaterEqual(time() - start,0.09)
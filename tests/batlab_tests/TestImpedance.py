@@ -0,0 +1,152 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+from time import time
+
+import batlab
+from batlab.constants import *
+
+class TestImpedance(unittest.TestCase):
+    def setUp(self):
+        self.bat = batlab.batlabclass.Batlab('batlabsim://impedance?speed=4')
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices['impedance']
+        self.bat.write(CELL1,MODE,MODE_IDLE)
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def test_does_not_block(self):
+        b = self.bat
+        start = time()
+        z = b.impedance_async(CELL1,settle=0.5)
+        self.assertLess(time() - start,0.1)
+        # the other cells are still served while cell 1 settles
+        reads = 0
+        while not z.done():
+            p = b.read(CELL0,VOLTAGE)
+            self.assertTrue(p.valid)
+            reads += 1
+        self.assertGreater(reads,10)
+        freq = self.sim.unit[SINE_FREQ] * (10000.0 / 256.0)
+        self.assertAlmostEqual(z.result(),self.sim.cells[1].impedance(freq),places=2)
+        self.assertEqual(z.state,'DONE')
+        self.assertEqual(b.read(CELL1,MODE).data,MODE_IDLE)
+        self.assertEqual(b.read(UNIT,LOCK).data,LOCK_UNLOCKED)
+
+    def test_blocking_macro(self):
+        self.assertGreater(self.bat.impedance(CELL1),0)
+        self.assertEqual(self.bat.read(CELL1,MODE).data,MODE_IDLE)
+
+    def test_cancel_restores_mode(self):
+        b = self.bat
+        z = b.impedance_async(CELL1,settle=5.0)
+        while z.ready_time is None:
+            b.read(CELL0,VOLTAGE)
+        self.assertEqual(b.read(CELL1,MODE).data,MODE_IMPEDANCE)
+        self.assertTrue(z.cancel())
+        self.assertTrue(z.cancelled())
+        self.assertEqual(b.read(CELL1,MODE).data,MODE_IDLE)
+        b.read(CELL0,VOLTAGE)
+        self.assertEqual(b.impedances,[])
+
+    def test_all_cells_one_settle(self):
+        b = self.bat
+        for cell in [CELL0,CELL2,CELL3]:
+            b.write(cell,MODE,MODE_IDLE)
+        self.sim.cells[2].resistance = 0.1
+        start = time()
+        z = b.impedance_async([CELL0,CELL1,CELL2,CELL3],settle=0.5)
+        result = z.result(5)
+        self.assertLess(time() - start,1.5) # one settle for all four cells
+        freq = self.sim.unit[SINE_FREQ] * (10000.0 / 256.0)
+        for cell in range(4):
+            self.assertAlmostEqual(result[cell],self.sim.cells[cell].impedance(freq),places=2)
+            self.assertEqual(z.impedance(cell),result[cell])
+            self.assertIs(b.zlatest[cell],z)
+            self.assertEqual(b.read(cell,MODE).data,MODE_IDLE)
+        self.assertGreater(result[2],result[1])
+        self.assertEqual(b.read(UNIT,LOCK).data,LOCK_UNLOCKED)
+
+    def test_restore_retries_until_mode_changes(self):
+        b = self.bat
+        ignored = []
+        write_reg = self.sim.write_reg
+        def drop_first_restore(namespace,addr,value): # the Batlab ignores the first attempt to leave impedance mode
+            if namespace == CELL1 and addr == MODE and value == MODE_IDLE and not ignored:
+                ignored.append(value)
+                return value
+            return write_reg(namespace,addr,value)
+        self.sim.write_reg = drop_first_restore
+        try:
+            z = b.impedance_async(CELL1,settle=0.5)
+            self.assertGreater(z.result(10),0)
+        finally:
+            del self.sim.write_reg
+        self.assertEqual(ignored,[MODE_IDLE])
+        self.assertEqual(b.read(CELL1,MODE,cached=False).data,MODE_IDLE)
+
+    def drop_responses(self,drop):
+        """Makes the simulator drop the response frames for which ``drop(namespace,addr)`` is true."""
+        send = self.sim._send
+        def lossy_send(frame):
+            if not drop(frame[1],frame[2]):
+                send(frame)
+        self.sim._send = lossy_send
+
+    def test_lost_response_is_resent(self):
+        b = self.bat
+        dropped = []
+        def drop_first(namespace,addr): # the first CURRENT_PP answer is lost, the retry gets through
+            if namespace == CELL1 and addr == CURRENT_PP and not dropped:
+                dropped.append(addr)
+                return True
+            return False
+        self.drop_responses(drop_first)
+        try:
+            z = b.impedance_async(CELL1,settle=0.5)
+            self.assertGreater(z.result(5),0)
+        finally:
+            del self.sim._send
+        self.assertEqual(dropped,[CURRENT_PP])
+        self.assertTrue(b.read(CELL0,VOLTAGE).valid)
+
+    def test_failed_reads_give_nan(self):
+        b = self.bat
+        b.timeout = 0.02 # run out of retries quickly
+        for cell in [CELL0,CELL2,CELL3]:
+            b.write(cell,MODE,MODE_IDLE)
+        self.drop_responses(lambda namespace,addr: namespace == CELL2 and addr in (CURRENT_PP,VOLTAGE_PP))
+        try:
+            z = b.impedance_async([CELL0,CELL1,CELL2,CELL3],settle=0.5)
+            result = z.result(10)
+        finally:
+            del self.sim._send
+        self.assertTrue(math.isnan(result[2]))
+        for cell in [CELL0,CELL1,CELL3]:
+            self.assertGreater(result[cell],0)
+            self.assertEqual(b.read(cell,MODE,cached=False).data,MODE_IDLE)
+        self.assertEqual(b.read(UNIT,LOCK,cached=False).data,LOCK_UNLOCKED)
+        self.assertTrue(b.read(CELL2,VOLTAGE,timeout=2).valid) # the Batlab keeps serving reads
+
+    def test_lossy_link(self):
+        b = batlab.batlabclass.Batlab('batlabsim://impedanceloss?speed=4&loss=0.01&seed=7')
+        try:
+            self.assertFalse(b.error)
+            b.timeout = 0.05
+            for cell in [CELL0,CELL1,CELL2,CELL3]:
+                b.write(cell,MODE,MODE_IDLE)
+            for n in range(3):
+                result = b.impedance_async([CELL0,CELL1,CELL2,CELL3],settle=0.5).result(20)
+                self.assertEqual(len(result),4)
+                for z in result:
+                    self.assertTrue(math.isnan(z) or z > 0)
+            self.assertTrue(b.read(CELL0,VOLTAGE,timeout=2).valid)
+            self.assertGreater(b.retry_count,0)
+        finally:
+            b.disconnect()
@@ -0,0 +1,141 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import datetime
+import shutil
+import tempfile
+from time import sleep, time
+
+import batlab
+from batlab.constants import *
+
+class TestLogger(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = [os.path.join(self.dir,'log' + str(n) + '.csv') for n in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def lines(self,filename):
+        with open(filename) as f:
+            return f.read().splitlines()
+
+    def test_batched_writes(self):
+        logger = batlab.logger.Logger(flush_interval=60.0)
+        for n in range(300):
+            logger.log(str(n),self.files[n % 3])
+        self.assertTrue(logger.flush(5.0))
+        for i,filename in enumerate(self.files):
+            self.assertEqual(self.lines(filename),[str(n) for n in range(i,300,3)])
+        self.assertEqual(logger.opens,3)
+        self.assertLessEqual(logger.writes,6)
+        logger.log('more',self.files[0])
+        self.assertTrue(logger.close(5.0))
+        self.assertEqual(self.lines(self.files[0])[-1],'more')
+        self.assertEqual(logger.opens,3) # the handle stayed open
+        self.assertEqual(len(logger.handles),0)
+
+    def test_flush_interval(self):
+        logger = batlab.logger.Logger(flush_interval=0.2)
+        logger.log('a',self.files[0])
+        start = time()
+        while not os.path.exists(self.files[0]) or not self.lines(self.files[0]):
+            self.assertLess(time() - start,5.0)
+            sleep(0.05)
+        self.assertEqual(self.lines(self.files[0]),['a'])
+        logger.close()
+
+    def test_flush_size(self):
+        logger = batlab.logger.Logger(flush_size=10,flush_interval=60.0)
+        logger.log('x' * 20,self.files[0])
+        start = time()
+        while not os.path.exists(self.files[0]) or not self.lines(self.files[0]):
+            self.assertLess(time() - start,5.0)
+            sleep(0.05)
+        logger.close()
+
+    def test_lru_handles(self):
+        logger = batlab.logger.Logger(max_open=2,fsync=batlab.logger.FSYNC_CLOSE)
+        for filename in self.files + self.files[2:]:
+            logger.log(filename,filename)
+            logger.flush()
+        self.assertEqual(list(logger.handles.keys()),self.files[1:])
+        self.assertEqual(logger.opens,3)
+        logger.log('again',self.files[0])
+        logger.flush()
+        self.assertEqual(list(logger.handles.keys()),[self.files[2],self.files[0]])
+        self.assertEqual(logger.opens,4)
+        self.assertEqual(self.lines(self.files[0]),[self.files[0],'again'])
+        self.assertEqual(self.lines(self.files[2]),[self.files[2],self.files[2]])
+        logger.close()
+
+    def test_reuse_after_close(self):
+        logger = batlab.logger.Logger(fsync=batlab.logger.FSYNC_FLUSH)
+        logger.log('a',self.files[0])
+        logger.close()
+        self.assertIsNone(logger.thread)
+        logger.log('b',self.files[0])
+        logger.close()
+        self.assertEqual(self.lines(self.files[0]),['a','b'])
+
+    def test_bad_file(self):
+        logger = batlab.logger.Logger()
+        logger.log('lost',os.path.join(self.dir,'missing','log.csv'))
+        logger.log('kept',self.files[0])
+        self.assertTrue(logger.flush(5.0))
+        self.assertEqual(self.lines(self.files[0]),['kept'])
+        logger.close()
+
+    def test_records(self):
+        ts = datetime.datetime(2020,1,2,3,4,5,600000)
+        r1 = batlab.logger.Level1Record('cell',301,2,ts,3.7,1.0,25.125,None,100.0,27.0,'TS_CHARGE',5.0,256,256,None)
+        self.assertEqual(r1.csv(),'cell,301,2,2020-01-02 03:04:05.600000,3.7000,1.0000,25.1250,,100.0000,27.0000,TS_CHARGE,,,,,,,,,5.0000,256,256,')
+        r2 = batlab.logger.Level2Record('cell',301,2,ts,'CHARGE',1000.0,3700.0,0.05,2.5,1.0,3.9,3600.5)
+        self.assertEqual(r2.csv(),'cell,301,2,2020-01-02 03:04:05.600000,,,,,,,,CHARGE,1000.0000,3700.0000,0.0500,2.5000,1.0000,3.9000,3600.5,,,,')
+        columns = len(batlab.logger.LOG_HEADER.split(','))
+        self.assertEqual(len(r1.csv().split(',')),columns)
+        self.assertEqual(len(r2.csv().split(',')),columns)
+
+        logger = batlab.logger.Logger()
+        logger.log(batlab.logger.LOG_HEADER,self.files[0])
+        logger.log(r1,self.files[0])
+        logger.log(r2,self.files[0])
+        logger.log(object(),self.files[0]) # cannot be formatted - dropped with a warning
+        logger.close()
+        self.assertEqual(self.lines(self.files[0]),[batlab.logger.LOG_HEADER,r1.csv(),r2.csv()])
+
+        logger = batlab.logger.Logger(formatter=lambda record: record.name)
+        logger.log(r1,self.files[1])
+        logger.close()
+        self.assertEqual(self.lines(self.files[1]),['cell'])
+
+    def test_channel_log(self):
+        settings = batlab.settings.Settings()
+        settings.reporting_period = 0.1
+        settings.impedance_period = 0.5
+        settings.logfile = os.path.join(self.dir,'log.csv')
+        logger = batlab.logger.Logger(flush_interval=0.1)
+        b = batlab.batlabclass.Batlab('batlabsim://loggerchannel?speed=4',logger,settings)
+        try:
+            b.channel[2].start_test('cell2',TT_DISCHARGE)
+            deadline = time() + 10
+            rows = []
+            while time() < deadline and not [row for row in rows if row[7]]:
+                sleep(0.5)
+                if os.path.exists(settings.logfile):
+                    rows = [line.split(',') for line in self.lines(settings.logfile)]
+            b.channel[2].end_test()
+        finally:
+            b.disconnect()
+            logger.close()
+        self.assertTrue(rows)
+        for row in rows:
+            self.assertEqual(len(row),len(batlab.logger.LOG_SCHEMA))
+            self.assertEqual(row[:3],['cell2',str(b.sn),'2'])
+            self.assertGreater(float(row[4]),2.5)
+        self.assertGreater(float([row for row in rows if row[7]][0][7]),0)
@@ -0,0 +1,70 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import batlab
+from batlab.constants import *
+
+RESPONSE = bytes([0xAA,0x01,VOLTAGE,0x34,0x12])
+WRITE_RESPONSE = bytes([0xAA,0x04,0x80 | WATCHDOG_TIMER,0xFF,0x00])
+STREAM = bytes([0xAF,0x02,0x00,0x03,0x00,0x00,0x00,0x10,0x27,0x00,0x08,0x00,0x70])
+
+class TestParser(unittest.TestCase):
+    def test_response_frame(self):
+        p = batlab.parser.Parser().feed(RESPONSE)[0]
+        self.assertEqual(p.type,'RESPONSE')
+        self.assertEqual((p.namespace,p.addr,p.data),(1,VOLTAGE,0x1234))
+        self.assertIsNone(p.write)
+        p.type = 'CUSTOM' # still an ordinary writable attribute
+        self.assertEqual(p.type,'CUSTOM')
+        self.assertEqual(batlab.packet.ResponsePacket(1,VOLTAGE,0).type,'RESPONSE')
+
+    def test_write_response_frame(self):
+        p = batlab.parser.Parser().feed(WRITE_RESPONSE)[0]
+        self.assertTrue(p.write)
+        self.assertEqual(p.addr,WATCHDOG_TIMER)
+
+    def test_stream_frame(self):
+        p = batlab.parser.Parser().feed(STREAM)[0]
+        self.assertEqual(p.type,'STREAM')
+        self.assertEqual(p.value(),[MODE_CHARGE,0,0x2710,0x0800,0x7000])
+
+    def test_split_chunks(self):
+        parser = batlab.parser.Parser()
+        data = RESPONSE + STREAM + WRITE_RESPONSE
+        packets = []
+        for i in range(0,len(data)):
+            packets += parser.feed(data[i:i+1])
+        self.assertEqual([p.type for p in packets],['RESPONSE','STREAM','RESPONSE'])
+        self.assertEqual(parser.dropped,0)
+
+    def test_resync_counts_dropped_bytes(self):
+        parser = batlab.parser.Parser()
+        packets = parser.feed(b'\x01\x02\x03' + RESPONSE + b'\xaa\x99' + STREAM)
+        self.assertEqual([p.type for p in packets],['RESPONSE','STREAM'])
+        self.assertEqual(parser.dropped,5)
+
+    def test_buffer_grows_and_compacts(self):
+        parser = batlab.parser.Parser(size=8)
+        packets = parser.feed(RESPONSE * 10 + RESPONSE[:2])
+        packets += parser.feed(RESPONSE[2:] + RESPONSE)
+        self.assertEqual(len(packets),12)
+
+    def test_packets_are_compact(self):
+        r,s = batlab.parser.Parser().feed(RESPONSE + STREAM)
+        self.assertIsInstance(r,batlab.packet.ResponsePacket)
+        self.assertIsInstance(s,batlab.packet.StreamPacket)
+        self.assertFalse(hasattr(r,'__dict__'))
+        self.assertFalse(hasattr(s,'__dict__'))
+        self.assertIsInstance(r.timestamp,float)
+        self.assertEqual(r.timestamp,s.timestamp)
+
+    def test_decode_does_not_modify_data(self):
+        p = batlab.packet.ResponsePacket(CELL0,CURRENT,0xF000)
+        self.assertEqual(p.ascurrent(),p.ascurrent())
+        self.assertLess(p.ascurrent(),0)
+        self.assertEqual(p.data,0xF000)
+        self.assertAlmostEqual(p.asvoltage(),-0x1000 * 4.5 / 2**15)
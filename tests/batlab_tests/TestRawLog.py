@@ -0,0 +1,85 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+import shutil
+import tempfile
+from time import sleep, time
+
+import batlab
+from batlab.constants import *
+
+class TestRawLog(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        row = ['cell a',301,2,time(),'TS_CHARGE',MODE_CHARGE,0x7000,0x1000,20000,70000,SET_CH0_HI_RES,0x8000,0x0400,0x0080,256,256,None,9000,3400]
+        filename = os.path.join(self.dir,'raw.csv')
+        with open(filename,'w') as f:
+            f.write(batlab.rawlog.RAW_HEADER + '\n')
+            f.write(batlab.rawlog.rawline(row) + '\n')
+            f.write(batlab.rawlog.rawline(row[:12] + [float('nan'),float('nan')] + row[14:]) + '\n')
+        r,rz = list(batlab.rawlog.read(filename))
+        self.assertEqual(list(r),row)
+        self.assertIsNone(rz.current_pp)
+        self.assertTrue(math.isnan(rz.asimpedance()))
+
+        p = lambda reg,data: batlab.packet.ResponsePacket(2,reg,data)
+        self.assertEqual(r.asvoltage(),p(VOLTAGE,0x7000).asvoltage())
+        self.assertEqual(r.ascurrent(),p(CURRENT,0x1000).ascurrent())
+        self.assertEqual(r.asvcc(),p(VCC,0x8000).asvcc())
+        self.assertEqual(r.assetpoint(),2.0)
+        self.assertAlmostEqual(r.astemperature_c(),p(TEMPERATURE,20000).astemperature_c([0,0,9000,0],[0,0,3400,0]),delta=0.01)
+        self.assertAlmostEqual(r.ascharge(),batlab.func.ascharge(70000) / 6.0)
+        self.assertAlmostEqual(r.asimpedance(),p(VOLTAGE_PP,0x0080).asvoltage() / p(CURRENT_PP,0x0400).ascurrent())
+        self.assertTrue(math.isnan(r._replace(temperature=None).astemperature_c()))
+
+    def test_charge_counts(self):
+        b = batlab.batlabclass.Batlab('batlabsim://rawcharge')
+        try:
+            sim = batlab.simulator.Simulator.devices['rawcharge']
+            sim.cells[1].charge = 1234.5
+            set,counts = b.charge_counts(CELL1)
+            self.assertAlmostEqual(b._charge(set,counts >> 16,counts & 0xFFFF),b.charge(CELL1))
+        finally:
+            b.disconnect()
+
+    def test_channel_raw_logging(self):
+        settings = batlab.settings.Settings()
+        settings.raw_logging = True
+        settings.reporting_period = 0.1
+        settings.impedance_period = 0.5
+        settings.raw_logfile = os.path.join(self.dir,'raw.csv')
+        settings.logfile = os.path.join(self.dir,'log.csv')
+        b = batlab.batlabclass.Batlab('batlabsim://rawchannel?speed=4',batlab.logger.Logger(),settings)
+        try:
+            b.channel[1].start_test('cell1',TT_DISCHARGE)
+            deadline = time() + 10
+            records = []
+            while time() < deadline and not [r for r in records if r.current_pp is not None]:
+                sleep(0.5)
+                if os.path.exists(settings.raw_logfile):
+                    records = list(batlab.rawlog.read(settings.raw_logfile))
+            b.channel[1].end_test()
+        finally:
+            b.disconnect()
+        self.assertTrue(records)
+        for r in records:
+            self.assertEqual((r.name,r.channel,r.R,r.B),('cell1',1,b.R[1],b.B[1]))
+            self.assertGreater(r.asvoltage(),2.5)
+        self.assertGreater([r for r in records if r.current_pp is not None][0].asimpedance(),0)
+
+        exported = os.path.join(self.dir,'export.csv')
+        batlab.rawlog.export(settings.raw_logfile,exported)
+        with open(exported) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines),len(records) + 1)
+        self.assertEqual(len(lines[1].split(',')),23)
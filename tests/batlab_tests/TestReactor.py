@@ -0,0 +1,88 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import threading
+from time import sleep, time
+
+import batlab
+from batlab.constants import *
+
+class StreamChannel:
+    """Stands in for a ``Channel`` that is sampling from stream packets."""
+    def __init__(self,bat,slot):
+        self.bat = bat
+        self.slot = slot
+        self.killevt = threading.Event()
+        self.stream_seen = 0
+        self.steps = 0
+
+    def step(self):
+        self.steps += 1
+        self.stream_seen = self.bat.stream_received[self.slot]
+        return None
+
+class TestReactor(unittest.TestCase):
+    def setUp(self):
+        self.reactor = batlab.reactor.Reactor(workers=2)
+        self.bats = []
+
+    def tearDown(self):
+        for b in self.bats:
+            b.disconnect()
+        self.reactor.stop()
+
+    def connect(self,url):
+        b = batlab.batlabclass.Batlab(url,reactor=self.reactor)
+        self.assertFalse(b.error)
+        self.bats.append(b)
+        return b
+
+    def test_many_batlabs_share_one_thread(self):
+        before = threading.active_count()
+        bats = [self.connect('batlabsim://reactor%d?sn=%d' % (n,n + 100)) for n in range(0,3)]
+        for n,b in enumerate(bats):
+            self.assertIsNone(b.reader)
+            self.assertEqual(b.sn,str(n + 100))
+            self.assertEqual(b.read(CELL0,MODE).data,MODE_IDLE)
+        # one simulator thread per device, but no receiver or channel threads
+        self.assertLessEqual(threading.active_count() - before,len(bats) + self.reactor.workers)
+        sleep(0.2)
+        self.assertGreaterEqual(self.reactor.steps,4 * len(bats))
+
+    def test_disconnect_fails_outstanding(self):
+        b = self.connect('batlabsim://reactorgone')
+        batlab.simulator.Simulator.devices['reactorgone'].loss = 1.0
+        txn = b.read_async(CELL0,MODE)
+        b.disconnect()
+        self.bats.remove(b)
+        self.assertFalse(txn.result(1.0).valid)
+
+    def test_stream_packets_wake_channel(self):
+        b = self.connect('batlabsim://reactorstream')
+        batlab.simulator.Simulator.devices['reactorstream'].report_unit = 0.02
+        ch = StreamChannel(b,CELL1)
+        self.reactor.add_channel(ch)
+        b.write(CELL1,REPORT_INTERVAL,1)
+        sleep(0.5)
+        ch.killevt.set()
+        self.assertGreater(ch.steps,10)
+
+    def test_level2_log_does_not_block(self):
+        settings = batlab.settings.Settings()
+        settings.logfile = os.devnull
+        b = batlab.batlabclass.Batlab('batlabsim://reactorlvl2',batlab.logger.Logger(),settings,reactor=self.reactor)
+        self.assertFalse(b.error)
+        self.bats.append(b)
+        ch = b.channel[0]
+        ch.start_test('cell0',TT_DISCHARGE)
+        start = time()
+        ch.log_lvl2('DISCHARGE')
+        self.assertLess(time() - start,1.0)
+        delay = ch.step() # the pause is handed back to the reactor instead of blocking a worker
+        self.assertGreater(delay,1.0)
+        self.assertLessEqual(delay,2.0)
+        ch.end_test()
@@ -0,0 +1,174 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+
+import batlab
+from batlab.constants import *
+
+class TestScheduler(unittest.TestCase):
+    def txn(self,namespace,addr,write=False):
+        return batlab.transaction.Transaction(namespace,addr,write=write)
+
+    def test_priority_classes(self):
+        prio = batlab.transaction.priority
+        self.assertEqual(prio(CELL2,MODE,True),PRIO_CONTROL)
+        self.assertEqual(prio(UNIT,WATCHDOG_TIMER,True),PRIO_CONTROL)
+        self.assertEqual(prio(UNIT,VCC,False),PRIO_SAFETY)
+        self.assertEqual(prio(CELL0,TEMPERATURE,False),PRIO_SAFETY)
+        self.assertEqual(prio(CELL0,CURRENT_SETPOINT,True),PRIO_SAFETY)
+        self.assertEqual(prio(CELL1,CHARGEH,False),PRIO_LOGGING)
+        self.assertEqual(prio(CELL1,TEMP_CALIB_R,True),PRIO_BULK)
+        self.assertEqual(prio(BOOTLOADER,BL_DATA,True),PRIO_BULK)
+        self.assertEqual(batlab.transaction.Transaction(CELL0,MODE,priority=PRIO_BULK).priority,PRIO_BULK)
+
+    def test_pop_order(self):
+        s = batlab.transaction.Scheduler()
+        bulk = self.txn(BOOTLOADER,BL_DATA,True)
+        log = self.txn(CELL0,CHARGEL)
+        temp = self.txn(CELL0,TEMPERATURE)
+        stop = self.txn(CELL0,MODE,True)
+        s.extend([bulk,log,temp,stop])
+        self.assertEqual(len(s),4)
+        self.assertEqual([s.pop(0,8) for i in range(5)],[stop,temp,log,bulk,None])
+        self.assertEqual(s.sent,[1,1,1,1])
+
+    def test_requeue_goes_first(self):
+        s = batlab.transaction.Scheduler()
+        a,b,c = [self.txn(CELL0,CHARGEL) for i in range(3)]
+        s.extend([c])
+        s.requeue([a,b])
+        self.assertEqual(list(s),[a,b,c])
+
+    def test_reserved_slot(self):
+        s = batlab.transaction.Scheduler()
+        s.extend([self.txn(CELL0,VOLTAGE)])
+        self.assertIsNone(s.pop(3,4)) # last slot is kept for control traffic
+        s.extend([self.txn(CELL0,MODE,True)])
+        self.assertEqual(s.pop(3,4).addr,MODE)
+        self.assertIsNone(s.pop(4,4))
+        self.assertEqual(s.pop(2,4).addr,VOLTAGE)
+        self.assertEqual(s.pop(0,1),None)
+
+    def test_one_write_per_register(self):
+        s = batlab.transaction.Scheduler()
+        first = self.txn(CELL0,VOLTAGE_LIMIT_CHG,True)
+        second = self.txn(CELL0,VOLTAGE_LIMIT_CHG,True)
+        readback = self.txn(CELL0,VOLTAGE_LIMIT_CHG)
+        other = self.txn(CELL1,VOLTAGE_LIMIT_CHG,True)
+        s.extend([second,readback,other])
+        busy = {first.key: [first]}
+        self.assertIs(s.pop(0,8,busy),other) # the register still has a write in flight
+        self.assertIsNone(s.pop(0,8,busy))
+        self.assertEqual([s.pop(0,8,{}),s.pop(0,8,{})],[second,readback])
+
+    def test_lossy_writes_keep_order(self):
+        bat = batlab.batlabclass.Batlab('batlabsim://lossywrites?loss=0.03&seed=3')
+        self.assertFalse(bat.error)
+        try:
+            bat.timeout = 0.02
+            sim = batlab.simulator.Simulator.devices['lossywrites']
+            for n in range(60):
+                old = bat.write_async(CELL0,VOLTAGE_LIMIT_CHG,20000 + 2 * n)
+                new = bat.write_async(CELL0,VOLTAGE_LIMIT_CHG,20001 + 2 * n)
+                self.assertTrue(old.result(30).valid)
+                self.assertTrue(new.result(30).valid)
+                # a dropped byte can garble a frame, but a re-sent older write must never land after the newer one
+                self.assertNotEqual(sim.regs[0][VOLTAGE_LIMIT_CHG],20000 + 2 * n)
+            self.assertGreater(bat.retry_count,0)
+        finally:
+            bat.disconnect()
+
+    def test_stop_overtakes_logging(self):
+        bat = batlab.batlabclass.Batlab('batlabsim://prio?latency=0.01')
+        self.assertFalse(bat.error)
+        try:
+            logging = bat.read_many_async([(CELL0,CHARGEL)] * 60)
+            stop = bat.write_async(CELL0,MODE,MODE_STOPPED)
+            self.assertEqual(stop.result(5).data,MODE_STOPPED)
+            self.assertFalse(logging[-1].done())
+            for txn in logging:
+                txn.result(10)
+            self.assertLess(bat.txqueue.max_wait[PRIO_CONTROL],bat.txqueue.max_wait[PRIO_LOGGING])
+        finally:
+            bat.disconnect()
+
+class TestWindow(unittest.TestCase):
+    """The transaction window of a ``Batlab`` over a lossy simulated link."""
+    def setUp(self):
+        self.name = 'window_' + self._testMethodName
+        self.bat = batlab.batlabclass.Batlab('batlabsim://' + self.name + '?seed=5&latency=0.005')
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices[self.name]
+        self.sim.loss = 0.02 # lossy once connected, so the bootloader check at connect gets through
+        self.bat.timeout = 0.05
+        self.pops = [] # (transaction, slots in use, keys in flight) for every transaction sent
+        pop = self.bat.txqueue.pop
+        def recording_pop(inflight,window,busy=None):
+            txn = pop(inflight,window,busy)
+            if txn is not None:
+                self.pops.append((txn,inflight,set(busy or ())))
+            return txn
+        self.bat.txqueue.pop = recording_pop
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def test_inflight_limit(self):
+        b = self.bat
+        txns = b.read_many_async([(CELL0,CHARGEL),(CELL1,CHARGEH),(CELL2,CHARGEL),(CELL3,CHARGEH)] * 20)
+        for txn in txns:
+            self.assertTrue(txn.result(30).valid)
+        slots = [inflight for (txn,inflight,busy) in self.pops]
+        self.assertLess(max(slots),b.window - 1) # the last slot is kept for control traffic
+        self.assertEqual(max(slots),b.window - 2) # but the rest of the window is used
+        self.assertEqual(b.inflight_count,0)
+        self.assertGreater(b.retry_count,0)
+
+    def test_reserved_control_slot(self):
+        b = self.bat
+        logging = b.read_many_async([(CELL0,CHARGEL)] * 80)
+        stops = [b.write_async(cell,MODE,MODE_STOPPED) for cell in [CELL0,CELL1,CELL2,CELL3]]
+        for txn in stops:
+            self.assertEqual(txn.result(30).data,MODE_STOPPED)
+        self.assertFalse(logging[-1].done()) # the stops did not wait for the logging reads
+        for txn in logging:
+            txn.result(30)
+        for (txn,inflight,busy) in self.pops:
+            if txn.priority == PRIO_CONTROL:
+                self.assertLess(inflight,b.window)
+            else:
+                self.assertLess(inflight,b.window - 1)
+        self.assertTrue([inflight for (txn,inflight,busy) in self.pops if txn.priority == PRIO_CONTROL and inflight == b.window - 1])
+
+    def test_write_held_behind_same_register(self):
+        b = self.bat
+        writes = []
+        for n in range(20):
+            writes += [b.write_async(CELL0,VOLTAGE_LIMIT_CHG,30000 + n),b.write_async(CELL0,VOLTAGE_LIMIT_DCHG,10000 + n)]
+        for txn in writes:
+            self.assertTrue(txn.result(30).valid)
+        sent = [(txn,busy) for (txn,inflight,busy) in self.pops if txn.write]
+        self.assertGreaterEqual(len(sent),len(writes))
+        for (txn,busy) in sent:
+            self.assertNotIn(txn.key,busy) # never two writes to one register in flight
+        self.assertEqual(b.read(CELL0,VOLTAGE_LIMIT_CHG,cached=False).data,30019)
+        self.assertEqual(b.read(CELL0,VOLTAGE_LIMIT_DCHG,cached=False).data,10019)
+
+    def test_retries_then_expiry(self):
+        b = self.bat
+        b.READ_RETRIES = 3
+        self.sim.loss = 1.0 # the Batlab stops answering
+        retries = b.retry_count
+        txn = b.read_async(CELL0,VOLTAGE,cached=False)
+        p = txn.result(5)
+        self.assertFalse(p.valid)
+        self.assertTrue(math.isnan(p.data))
+        self.assertEqual(txn.attempts,4) # sent once and re-sent three times
+        self.assertEqual(b.retry_count - retries,3)
+        self.assertEqual(len([t for (t,inflight,busy) in self.pops if t is txn]),4)
+        self.assertEqual(b.inflight_count,0)
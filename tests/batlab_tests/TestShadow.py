@@ -0,0 +1,76 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+from time import sleep
+
+import batlab
+from batlab.constants import *
+
+class TestShadow(unittest.TestCase):
+    def setUp(self):
+        self.bat = batlab.batlabclass.Batlab('batlabsim://shadow')
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices['shadow']
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def test_static_registers_answered_locally(self):
+        b = self.bat
+        hits = b.shadow.hits
+        self.assertEqual(b.read(CELL1,TEMP_CALIB_B).data,b.B[1])
+        self.assertEqual(b.read(UNIT,FIRMWARE_VER).data,int(b.ver))
+        self.assertEqual(b.shadow.hits,hits + 2)
+
+    def test_live_registers_not_cached(self):
+        b = self.bat
+        hits = b.shadow.hits
+        b.read(CELL0,MODE)
+        b.read(CELL0,VOLTAGE)
+        self.assertEqual(b.shadow.hits,hits)
+
+    def test_config_cached_until_written(self):
+        b = self.bat
+        limit = batlab.encoder.Encoder(4.15).asvoltage()
+        self.assertTrue(b.write_verify(CELL3,VOLTAGE_LIMIT_CHG,limit))
+        self.assertTrue(b.write_verify(CELL3,VOLTAGE_LIMIT_CHG,limit))
+        b.write(CELL3,VOLTAGE_LIMIT_CHG,limit)
+        self.assertEqual(b.shadow.skipped_writes,2)
+        self.sim.regs[CELL3][VOLTAGE_LIMIT_CHG] = 0 # changed behind our back
+        self.assertEqual(b.read(CELL3,VOLTAGE_LIMIT_CHG).data,limit)
+        self.assertEqual(b.read(CELL3,VOLTAGE_LIMIT_CHG,cached=False).data,0)
+        b.write(CELL3,VOLTAGE_LIMIT_CHG,limit)
+        self.assertEqual(self.sim.regs[CELL3][VOLTAGE_LIMIT_CHG],limit)
+
+    def test_write_verify_reads_back(self):
+        b = self.bat
+        limit = batlab.encoder.Encoder(4.15).asvoltage()
+        self.assertTrue(b.write_verify(CELL2,VOLTAGE_LIMIT_CHG,limit))
+        self.sim.regs[CELL2][VOLTAGE_LIMIT_CHG] = 0 # changed behind our back
+        self.assertTrue(b.write_verify(CELL2,VOLTAGE_LIMIT_CHG,limit))
+        self.assertEqual(self.sim.regs[CELL2][VOLTAGE_LIMIT_CHG],limit)
+
+    def test_only_matching_echoes_cached(self):
+        s = batlab.shadow.Shadow()
+        s.update(batlab.packet.ResponsePacket(CELL0,VOLTAGE_LIMIT_CHG,COMMAND_ERROR,True),1234)
+        s.update(batlab.packet.ResponsePacket(CELL0,VOLTAGE_LIMIT_DCHG,1234,True))
+        self.assertIsNone(s.get(CELL0,VOLTAGE_LIMIT_CHG))
+        self.assertIsNone(s.get(CELL0,VOLTAGE_LIMIT_DCHG))
+        s.update(batlab.packet.ResponsePacket(CELL0,VOLTAGE_LIMIT_CHG,1234,True),1234)
+        s.update(batlab.packet.ResponsePacket(CELL0,VOLTAGE_LIMIT_DCHG,999))
+        self.assertEqual(s.get(CELL0,VOLTAGE_LIMIT_CHG).data,1234)
+        self.assertEqual(s.get(CELL0,VOLTAGE_LIMIT_DCHG).data,999)
+
+    def test_ttl(self):
+        b = self.bat
+        b.shadow.set_ttl(UNIT,SETTINGS,0.05)
+        b.read(UNIT,SETTINGS)
+        hits = b.shadow.hits
+        b.read(UNIT,SETTINGS)
+        sleep(0.1)
+        b.read(UNIT,SETTINGS)
+        self.assertEqual(b.shadow.hits,hits + 1)
@@ -0,0 +1,171 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import threading
+from time import sleep, time
+
+import batlab
+from batlab.constants import *
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.bat = None
+
+    def tearDown(self):
+        if self.bat is not None:
+            self.bat.disconnect()
+
+    def connect(self,url):
+        self.bat = batlab.batlabclass.Batlab(url)
+        self.assertFalse(self.bat.error)
+        return self.bat
+
+    def test_connect_reads_unit_information(self):
+        b = self.connect('batlabsim://connect?sn=196612&firmware=4')
+        self.assertEqual(b.sn,'196612')
+        self.assertEqual(b.ver,'4')
+        self.assertEqual(b.R,[10000,10000,10000,10000])
+        self.assertEqual(b.B,[3380,3380,3380,3380])
+        self.assertFalse(b.bootloader)
+
+    def test_write_then_read(self):
+        b = self.connect('batlabsim://')
+        limit = batlab.encoder.Encoder(4.1).asvoltage()
+        self.assertEqual(b.write(CELL2,VOLTAGE_LIMIT_CHG,limit).data,limit)
+        self.assertEqual(b.read(CELL2,VOLTAGE_LIMIT_CHG).data,limit)
+        self.assertTrue(b.write_verify(CELL2,VOLTAGE_LIMIT_DCHG,batlab.encoder.Encoder(2.7).asvoltage()))
+
+    def test_read_many_fails_per_item(self):
+        b = self.connect('batlabsim://')
+        packets = b.read_many([(CELL0,MODE),(0x42,0x00),(UNIT,VCC)])
+        self.assertEqual(packets[0].data,MODE_IDLE)
+        self.assertFalse(packets[1].valid)
+        self.assertAlmostEqual(packets[2].asvcc(),5.0,places=2)
+
+    def test_empty_slot(self):
+        b = self.connect('batlabsim://?cells=1011')
+        b.write(CELL1,MODE,MODE_IDLE)
+        self.assertEqual(b.read(CELL1,MODE).data,MODE_NO_CELL)
+        self.assertEqual(b.read(CELL0,MODE).data,MODE_IDLE)
+
+    def test_charge_stops_at_voltage_limit(self):
+        b = self.connect('batlabsim://chargelimit?speed=2000')
+        b.write(UNIT,SETTINGS,0) # no watchdog - nothing resets it in this test
+        b.write(CELL0,MODE,MODE_CHARGE)
+        sleep(1.5)
+        self.assertEqual(b.read(CELL0,MODE).data,MODE_STOPPED)
+        self.assertEqual(b.read(CELL0,ERROR).aserr(),'ERR_VOLTAGE_LIMIT_CHG')
+        self.assertGreater(b.charge(CELL0),0)
+
+    def test_lossy_link_recovers(self):
+        b = self.connect('batlabsim://?loss=0.005&seed=1')
+        packets = b.read_many([(cell,TEMP_CALIB_B) for cell in range(0,4)] * 10)
+        self.assertTrue(all(p.valid for p in packets))
+        self.assertGreater(b.retry_count + b.parser.dropped,0)
+
+    def test_watchdog_keepalive(self):
+        b = self.connect('batlabsim://keepalive?speed=100')
+        b.watchdog_interval = 0.05 # the simulated watchdog runs out in 0.3 s
+        b.write(CELL0,MODE,MODE_CHARGE)
+        sleep(0.6)
+        self.assertEqual(b.read(CELL0,MODE).data,MODE_CHARGE)
+        b.watchdog_interval = 60
+        sleep(0.6)
+        self.assertEqual(b.read(CELL0,MODE).data,MODE_STOPPED)
+
+    def test_watchdog_needs_live_channels(self):
+        b = self.connect('batlabsim://heartbeat?speed=100')
+        b.watchdog_interval = 0.05
+        b.watchdog_period = 0.2
+        hang = threading.Event()
+        ch = b.channel[0]
+        ch.step = lambda: hang.wait() or 1 # the test loop of cell 0 hangs
+        try:
+            ch.test_state = TS_CHARGE
+            b.write(CELL0,MODE,MODE_CHARGE)
+            sleep(1.0)
+            self.assertTrue(b.watchdog_stalled)
+            self.assertEqual(b.read(CELL0,MODE).data,MODE_STOPPED)
+        finally:
+            ch.test_state = TS_IDLE
+            hang.set()
+
+    def test_stream_mode_samples(self):
+        logged = []
+        class RecordingLogger:
+            def log(self,entry,filename):
+                logged.append(entry)
+        settings = batlab.settings.Settings()
+        settings.stream_enable = True
+        settings.stream_report_interval = 1
+        settings.reporting_period = 0.1
+        settings.logfile = os.devnull
+        self.bat = b = batlab.batlabclass.Batlab('batlabsim://streammode',RecordingLogger(),settings)
+        self.assertFalse(b.error)
+        sim = batlab.simulator.Simulator.devices['streammode']
+        sim.report_unit = 0.05
+        polled = []
+        pop = b.txqueue.pop
+        def counting_pop(inflight,window,busy=None): # records the measurement registers the host reads
+            txn = pop(inflight,window,busy)
+            if txn is not None and txn.namespace == CELL1 and txn.addr in (VOLTAGE,CURRENT,TEMPERATURE):
+                polled.append(txn.addr)
+            return txn
+        ch = b.channel[1]
+        ch.start_test('cell1',TT_DISCHARGE)
+        try:
+            deadline = time() + 5
+            while b.stream_received[CELL1] < 5 and time() < deadline:
+                sleep(0.05)
+            b.txqueue.pop = counting_pop
+            records = len(logged)
+            sleep(1.0)
+            self.assertTrue(ch.streaming)
+            p = b.get_stream(CELL1)
+            self.assertEqual(p.type,'STREAM')
+            self.assertEqual(p.field('mode').data,MODE_DISCHARGE)
+            self.assertAlmostEqual(p.field('voltage').asvoltage(),sim.cells[1].voltage(),delta=0.02)
+            self.assertAlmostEqual(p.field('current').ascurrent(),abs(sim.cells[1].current),delta=0.05)
+            self.assertAlmostEqual(p.field('temp').astemperature_c(b.R,b.B),sim.cells[1].temperature,delta=0.5)
+            samples = [r for r in logged[records:] if isinstance(r,batlab.logger.Level1Record)]
+            self.assertGreater(len(samples),3)
+            for r in samples:
+                self.assertEqual(r.state,'DISCHARGE')
+                self.assertAlmostEqual(r.voltage,sim.cells[1].voltage(),delta=0.05)
+            self.assertEqual(polled,[]) # the measurements came from the stream packets
+        finally:
+            del b.txqueue.pop
+            ch.end_test()
+
+    def test_stream_loss_accounting(self):
+        b = self.connect('batlabsim://streamloss')
+        sim = batlab.simulator.Simulator.devices['streamloss']
+        sim.report_unit = 0.05
+        dropped = []
+        sent = []
+        send = sim._send
+        def lossy_send(frame): # every fourth stream packet of cell 2 is lost, once the period is known
+            if frame[0] == 0xAF and frame[1] == CELL2:
+                sent.append(frame)
+                if len(sent) > 5 and len(sent) % 4 == 0:
+                    dropped.append(frame)
+                    return
+            send(frame)
+        sim._send = lossy_send
+        try:
+            b.write(CELL2,REPORT_INTERVAL,1)
+            deadline = time() + 10
+            while len(sent) < 45 and time() < deadline:
+                sleep(0.05)
+            b.write(CELL2,REPORT_INTERVAL,0)
+            sleep(0.2)
+        finally:
+            del sim._send
+        self.assertEqual(b.stream_received[CELL2],len(sent) - len(dropped))
+        self.assertAlmostEqual(b.stream_lost[CELL2],len(dropped),delta=1)
+        self.assertAlmostEqual(b.stream_period[CELL2],0.05,delta=0.01)
+        self.assertEqual(b.stream_received[CELL0],0)
@@ -0,0 +1,73 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+from time import time
+
+import batlab
+from batlab.constants import *
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.bat = batlab.batlabclass.Batlab('batlabsim://snapshot')
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices['snapshot']
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def test_snapshot(self):
+        b = self.bat
+        self.sim.cells[2].charge = 1234.5
+        before = time()
+        s = b.snapshot()
+        self.assertGreaterEqual(s.time,before)
+        self.assertEqual(s.sn,b.sn)
+        self.assertEqual([c.cell for c in s.cells],[CELL0,CELL1,CELL2,CELL3])
+        self.assertAlmostEqual(s.vcc,b.read(UNIT,VCC).asvcc(),places=2)
+        c = s.cell(CELL2)
+        self.assertAlmostEqual(c.charge,1234.5,delta=1.0)
+        self.assertAlmostEqual(c.voltage,self.sim.cells[2].voltage(),places=2)
+        self.assertAlmostEqual(c.temperature,self.sim.cells[2].temperature,delta=0.5)
+        self.assertEqual(c.mode,b.read(CELL2,MODE).data)
+        self.assertIsNone(s.cell(7))
+        self.assertEqual(b.latches,0)
+        self.assertEqual(self.sim.unit[LOCK],LOCK_UNLOCKED)
+
+    def test_subset(self):
+        s = self.bat.snapshot([CELL3,CELL1])
+        self.assertEqual([c.cell for c in s.cells],[CELL3,CELL1])
+        self.assertFalse(math.isnan(s.cells[0].voltage))
+
+    def test_latch_shared_with_impedance(self):
+        b = self.bat
+        b.write(CELL0,MODE,MODE_IDLE)
+        z = b.impedance_async(CELL0,settle=1.2)
+        while not z.done():
+            b.snapshot([CELL1])
+        self.assertGreater(z.result(),0)
+        self.assertEqual(b.latches,0)
+        self.assertEqual(b.read(UNIT,LOCK).data,LOCK_UNLOCKED)
+
+    def test_back_to_back_snapshots_are_latched(self):
+        b = batlab.batlabclass.Batlab('batlabsim://snapshotorder?latency=0.02')
+        sim = batlab.simulator.Simulator.devices['snapshotorder']
+        unlatched = []
+        read_reg = sim.read_reg
+        def checked_read(namespace,addr): # records snapshot reads that reach the Batlab while it is not latched
+            if sim.latched is None:
+                unlatched.append((namespace,addr))
+            return read_reg(namespace,addr)
+        sim.read_reg = checked_read
+        try:
+            for n in range(5):
+                s = b.snapshot([CELL0,CELL1]) # the previous LOCK_UNLOCKED write is still in flight
+                self.assertFalse(math.isnan(s.cells[1].voltage))
+        finally:
+            del sim.read_reg
+            b.disconnect()
+        self.assertEqual(unlatched,[])
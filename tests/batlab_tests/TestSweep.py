@@ -0,0 +1,54 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import csv
+import shutil
+import tempfile
+
+import batlab
+from batlab.constants import *
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.bats = [batlab.batlabclass.Batlab('batlabsim://sweep%d?sn=%d&speed=8' % (n,700 + n)) for n in range(2)]
+        for b in self.bats:
+            self.assertFalse(b.error)
+            for cell in [CELL0,CELL1,CELL2,CELL3]:
+                b.write(cell,MODE,MODE_IDLE)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for b in self.bats:
+            b.disconnect()
+        shutil.rmtree(self.dir)
+
+    def test_sine_freq(self):
+        self.assertEqual(batlab.sweep.sine_freq(39),1)
+        self.assertEqual(batlab.sweep.sine_freq(5000),27)
+        self.assertEqual(batlab.sweep.sine_freq(160),4)
+
+    def test_sweep(self):
+        sim = batlab.simulator.Simulator.devices['sweep1']
+        sim.cells[3].charge_transfer = 0.1
+        sweep = batlab.sweep.Sweep(self.bats,freqs=[39,156,625,1054],settle=0.2)
+        self.assertEqual(list(sweep.raw),[1,4,16,27])
+        z = sweep.run()
+        self.assertEqual(len(z),8)
+        # four steps with one settle each, not one per cell and Batlab
+        self.assertLess(sweep.duration,4 * 0.2 + 1.5)
+        for step,hz in enumerate(sweep.freqs):
+            self.assertAlmostEqual(z[('701',CELL3)][step],sim.cells[3].impedance(hz),places=2)
+        self.assertGreater(z[('701',CELL3)][0],z[('701',CELL3)][-1])
+        for b in self.bats:
+            self.assertEqual(b.read(UNIT,SINE_FREQ,cached=False).data,4)
+            self.assertEqual(b.read(CELL2,MODE).data,MODE_IDLE)
+        filename = os.path.join(self.dir,'sweep.csv')
+        sweep.write_csv(filename)
+        with open(filename) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(len(rows),9)
+        self.assertEqual(rows[0][:3],['Batlab SN','Channel','39.0625'])
@@ -0,0 +1,49 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+
+import batlab
+from batlab.constants import *
+from batlab.thermistor.Thermistor import exact_celsius, exact_raw
+
+class TestThermistor(unittest.TestCase):
+    def test_decode_matches_equation(self):
+        t = batlab.thermistor.table(10000,3380)
+        for data in range(100,32700,97):
+            exact = exact_celsius(data,10000,3380)
+            if -40 <= exact <= 150:
+                self.assertAlmostEqual(t.celsius(data),exact,delta=0.01)
+        self.assertAlmostEqual(t.celsius(16384),25.0,places=6)
+        self.assertAlmostEqual(t.fahrenheit(16384),77.0,places=6)
+
+    def test_out_of_range(self):
+        t = batlab.thermistor.table(10000,3380)
+        for data in [0,2**15,40000,float('nan')]:
+            self.assertTrue(math.isnan(t.celsius(data)))
+        self.assertAlmostEqual(t.celsius(5),exact_celsius(5,10000,3380))
+        self.assertTrue(math.isnan(batlab.thermistor.table(float('nan'),3380).celsius(16384)))
+
+    def test_encode_matches_equation(self):
+        t = batlab.thermistor.table(9500,3435)
+        for c in [-55.5,-10.0,0.0,25.0,45.2,60.0,99.9,180.0,250.0]:
+            self.assertLessEqual(abs(t.raw(c) - int(exact_raw(c,9500,3435))),1)
+        self.assertEqual(t.raw(-300),-100)
+        self.assertEqual(batlab.thermistor.table(0,3435).raw(25.0),-100)
+
+    def test_shared_tables(self):
+        self.assertIs(batlab.thermistor.table(10000,3380),batlab.thermistor.table(10000,3380))
+        self.assertIsNot(batlab.thermistor.table(10000,3380),batlab.thermistor.table(10000,3381))
+
+    def test_packet_and_encoder(self):
+        R = [10000,9000,10000,10000]
+        B = [3380,3400,3380,3380]
+        raw = batlab.encoder.Encoder(45.0).c_astemperature(R[1],B[1])
+        p = batlab.packet.ResponsePacket(CELL1,TEMPERATURE,raw)
+        self.assertAlmostEqual(p.astemperature_c(R,B),45.0,delta=0.05)
+        self.assertAlmostEqual(p.astemperature(R,B),113.0,delta=0.1)
+        self.assertEqual(batlab.encoder.Encoder(113.0).astemperature(R[1],B[1]),raw)
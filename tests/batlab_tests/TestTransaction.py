@@ -0,0 +1,157 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import concurrent.futures
+import math
+import random
+import threading
+from time import sleep, time
+
+import batlab
+from batlab.constants import *
+
+class TestTransaction(unittest.TestCase):
+    def setUp(self):
+        self.name = 'txn_' + self._testMethodName
+        self.bat = batlab.batlabclass.Batlab('batlabsim://' + self.name + '?seed=11&latency=0.005',shadow=False)
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices[self.name]
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def test_frame(self):
+        self.assertEqual(batlab.transaction.Transaction(CELL2,VOLTAGE).frame(),bytes([0xAA,CELL2,VOLTAGE,0,0]))
+        self.assertEqual(batlab.transaction.Transaction(UNIT,LOCK,LOCK_LOCKED,write=True).frame(),bytes([0xAA,UNIT,LOCK | 0x80,LOCK_LOCKED,0]))
+
+    def test_result_timeout(self):
+        b = self.bat
+        self.sim.loss = 1.0 # the Batlab stops answering
+        txn = b.read_async(CELL0,VOLTAGE)
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            txn.result(0.05)
+        self.assertFalse(txn.done())
+        # the blocking call gives up after its timeout and stops the resends
+        start = time()
+        p = b.read(CELL1,VOLTAGE,timeout=0.1)
+        self.assertLess(time() - start,1.0)
+        self.assertFalse(p.valid)
+        self.assertTrue(math.isnan(p.data))
+        txn.cancel()
+        self.sim.loss = 0.0
+        self.assertTrue(b.read(CELL1,VOLTAGE,timeout=2).valid)
+        deadline = time() + 2
+        while b.inflight_count and time() < deadline: # cancelled requests leave the window at their next timeout
+            sleep(0.01)
+        self.assertEqual(b.inflight_count,0)
+
+    def test_callbacks(self):
+        b = self.bat
+        called = []
+        done = threading.Event()
+        def callback(txn):
+            called.append((txn,threading.current_thread() is threading.main_thread()))
+            done.set()
+        txn = b.read_async(CELL0,VOLTAGE)
+        txn.add_done_callback(callback)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(called,[(txn,False)]) # run by the receiver thread
+        self.assertTrue(txn.result().valid)
+        txn.add_done_callback(callback) # already done - runs right away
+        self.assertEqual(called[-1],(txn,True))
+
+    def test_failed_on_disconnect(self):
+        b = self.bat
+        self.sim.loss = 1.0
+        pending = b.read_many_async([(CELL0,VOLTAGE),(CELL1,MODE)])
+        write = b.write_async(CELL2,VOLTAGE_LIMIT_CHG,1234)
+        self.assertFalse([txn for txn in pending + [write] if txn.done()])
+        b.disconnect()
+        for txn in pending + [write]:
+            p = txn.result(2)
+            self.assertFalse(p.valid)
+            self.assertTrue(math.isnan(p.data))
+        after = b.read_async(CELL0,VOLTAGE) # fails right away once disconnected
+        self.assertTrue(after.done())
+        self.assertFalse(after.result().valid)
+        self.assertEqual(b.inflight_count,0)
+
+    def test_cancelled_result_ignored(self):
+        txn = batlab.transaction.Transaction(CELL0,VOLTAGE)
+        self.assertTrue(txn.cancel())
+        txn.complete(batlab.packet.ResponsePacket(CELL0,VOLTAGE,100)) # a late response does not raise
+        self.assertTrue(txn.cancelled())
+
+class TestReadMany(unittest.TestCase):
+    REGS = [VOLTAGE_LIMIT_CHG,VOLTAGE_LIMIT_DCHG,CURRENT_LIMIT_CHG,CURRENT_LIMIT_DCHG,TEMP_LIMIT_CHG,TEMP_LIMIT_DCHG]
+
+    def setUp(self):
+        self.name = 'many_' + self._testMethodName
+        self.bat = batlab.batlabclass.Batlab('batlabsim://' + self.name + '?seed=13&latency=0.005',shadow=False)
+        self.assertFalse(self.bat.error)
+        self.sim = batlab.simulator.Simulator.devices[self.name]
+        self.regs = []
+        for cell in [CELL0,CELL1,CELL2,CELL3]:
+            for n,reg in enumerate(self.REGS):
+                self.sim.regs[cell][reg] = 1000 * (cell + 1) + n # a distinct value in every register
+                self.regs.append((cell,reg))
+
+    def tearDown(self):
+        self.bat.disconnect()
+
+    def expected(self,regs):
+        return [1000 * (cell + 1) + self.REGS.index(reg) for (cell,reg) in regs]
+
+    def test_order_with_reordered_responses(self):
+        held = []
+        send = self.sim._send
+        def swapped_send(frame): # the responses leave the simulator pairwise swapped
+            if not held:
+                held.append(frame)
+                return
+            send(frame)
+            send(held.pop())
+        self.sim._send = swapped_send
+        try:
+            regs = self.regs + list(reversed(self.regs))
+            packets = self.bat.read_many(regs,timeout=10)
+        finally:
+            del self.sim._send
+        self.assertEqual([p.data for p in packets],self.expected(regs))
+        self.assertEqual([(p.namespace,p.addr) for p in packets],regs)
+
+    def test_order_under_loss(self):
+        self.bat.timeout = 0.05
+        rand = random.Random(17)
+        send = self.sim._send
+        # whole responses are lost - a lost byte can garble the data of a frame, which has no checksum
+        self.sim._send = lambda frame: None if rand.random() < 0.1 else send(frame)
+        try:
+            for n in range(5):
+                packets = self.bat.read_many(self.regs,timeout=20)
+                self.assertEqual([p.data for p in packets],self.expected(self.regs))
+        finally:
+            del self.sim._send
+        self.assertGreater(self.bat.retry_count,0)
+
+    def test_fails_per_item(self):
+        b = self.bat
+        b.timeout = 0.02
+        b.READ_RETRIES = 2
+        send = self.sim._send
+        self.sim._send = lambda frame: None if (frame[1],frame[2]) == (CELL2,TEMP_LIMIT_CHG) else send(frame)
+        try:
+            packets = b.read_many(self.regs,timeout=10)
+        finally:
+            del self.sim._send
+        for (p,reg,value) in zip(packets,self.regs,self.expected(self.regs)):
+            if reg == (CELL2,TEMP_LIMIT_CHG):
+                self.assertFalse(p.valid)
+                self.assertTrue(math.isnan(p.data))
+            else:
+                self.assertTrue(p.valid)
+                self.assertEqual(p.data,value)
@@ -0,0 +1,83 @@
+import unittest
+
+import sys, os, os.path
+rootDirectory = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..')
+if rootDirectory not in sys.path:
+    sys.path.append(rootDirectory)
+
+import math
+
+import batlab
+from batlab.constants import *
+
+try:
+    import numpy as np
+    import batlab.vectorized
+except ImportError:
+    np = None
+
+R = [10000,9000,10000,11000]
+B = [3380,3400,3380,3435]
+
+@unittest.skipIf(np is None,'NumPy is not installed')
+class TestVectorized(unittest.TestCase):
+    def scalar(self,method,data,*args,namespace=CELL0):
+        return getattr(batlab.packet.ResponsePacket(namespace,0,data),method)(*args)
+
+    def test_decode_matches_packet(self):
+        raw = [0,1,0x1234,0x7FFF,0x8000,0xF000,0xFFFF]
+        for method in ['asvoltage','ascurrent','asfreq']:
+            expected = [self.scalar(method,x) for x in raw]
+            self.assertTrue(np.allclose(getattr(batlab.vectorized.decode,method)(raw),expected))
+        self.assertTrue(np.allclose(batlab.vectorized.decode.asvcc(raw[1:]),[self.scalar('asvcc',x) for x in raw[1:]]))
+        self.assertTrue(math.isnan(batlab.vectorized.decode.asvcc([0])[0]))
+        self.assertTrue(np.allclose(batlab.vectorized.decode.asvoltage(np.array([-4096],dtype=np.int16)),[self.scalar('asvoltage',0xF000)]))
+
+    def test_temperature(self):
+        raw = np.array([20000,16384,9000,0,40000])
+        cells = np.array([0,1,3,2,1])
+        t = batlab.vectorized.decode.astemperature_c(raw,R,B,cells)
+        for i in range(3):
+            self.assertAlmostEqual(t[i],self.scalar('astemperature_c',int(raw[i]),R,B,namespace=int(cells[i])),delta=0.01)
+        self.assertTrue(np.isnan(t[3:]).all())
+        encoded = batlab.vectorized.encode.c_astemperature(t[:3],R,B,cells[:3])
+        self.assertTrue((np.abs(encoded - raw[:3]) <= 1).all())
+        self.assertEqual(list(batlab.vectorized.encode.c_astemperature([-300.0],10000,3380)),[-100])
+
+    def test_temperature_matches_scalar_exactly(self):
+        raw = np.concatenate([np.arange(0,2**15 + 64,7),[40000,float('nan')]])
+        cells = np.arange(len(raw)) % 4
+        t = batlab.vectorized.decode.astemperature_c(raw,R,B,cells)
+        f = batlab.vectorized.decode.astemperature(raw,R,B,cells)
+        for (x,c,tc,tf) in zip(raw.tolist(),cells.tolist(),t.tolist(),f.tolist()):
+            data = x if x != x else int(x)
+            for (vector,method) in [(tc,'astemperature_c'),(tf,'astemperature')]:
+                expected = self.scalar(method,data,R,B,namespace=c)
+                if math.isnan(expected):
+                    self.assertTrue(math.isnan(vector))
+                else:
+                    self.assertEqual(vector,expected)
+        celsius = np.concatenate([np.arange(-80.0,220.0,0.37),[-300.0]])
+        encoded = batlab.vectorized.encode.c_astemperature(celsius,R,B,np.arange(len(celsius)) % 4)
+        for (i,c) in enumerate(celsius.tolist()):
+            self.assertEqual(int(encoded[i]),batlab.encoder.Encoder(c).c_astemperature(R[i % 4],B[i % 4]))
+        self.assertEqual(list(batlab.vectorized.encode.c_astemperature([25.0,25.0],[10000,float('nan')],3380)),[batlab.encoder.Encoder(25.0).c_astemperature(10000,3380),-100])
+
+    def test_nan_passes_through(self):
+        v = batlab.vectorized.decode.asvoltage([float('nan'),0x1000])
+        self.assertTrue(math.isnan(v[0]))
+        self.assertAlmostEqual(v[1],self.scalar('asvoltage',0x1000))
+
+    def test_charge(self):
+        h = np.array([0,1,2])
+        l = np.array([5000,0,65535])
+        q = batlab.vectorized.decode.ascharge(h,l)
+        self.assertTrue(np.allclose(q,[batlab.func.ascharge(int(a) * 65536 + int(b)) for (a,b) in zip(h,l)]))
+        hires = batlab.vectorized.decode.ascharge(h * 65536 + l,settings=SET_CH0_HI_RES)
+        self.assertTrue(np.allclose(hires * 6.0,q))
+
+    def test_encode_matches_encoder(self):
+        values = [0.0,0.5,1.25,3.9]
+        for method in ['asvoltage','ascurrent','assetpoint']:
+            self.assertEqual(list(getattr(batlab.vectorized.encode,method)(values)),[getattr(batlab.encoder.Encoder(x),method)() for x in values])
+        self.assertEqual(list(batlab.vectorized.encode.asfreq([39.0625,1054.6875])),[1,27])
@@ -1 +1,17 @@
 from . import TestBatlabGeneral
+from . import TestParser
+from . import TestSimulator
+from . import TestAsync
+from . import TestReactor
+from . import TestHotplug
+from . import TestBatpool
+from . import TestDeviceCache
+from . import TestShadow
+from . import TestScheduler
+from . import TestImpedance
+from . import TestSweep
+from . import TestSnapshot
+from . import TestThermistor
+from . import TestVectorized
+from . import TestRawLog
+from . import TestLogger